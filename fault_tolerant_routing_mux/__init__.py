@@ -12,8 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # =============================================================================
-"""Init package."""
+"""Init package.
+
+FaultSimulator is resolved lazily on first access so that importing the package
+(e.g. from the command line entry point) does not pull in numpy.
+"""
+
+__version__ = "0.1.0"
 
-from fault_tolerant_routing_mux.core import FaultSimulator
 from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
 # from fault_tolerant_routing_mux import plotter
+
+_LAZY_ATTRIBUTES = {
+    "FaultSimulator": "fault_tolerant_routing_mux.core",
+}
+
+
+def __getattr__(name):
+    """Import heavy submodules only when one of their attributes is requested."""
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name])
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,4 @@
+"""Allow running the command line tool as python -m fault_tolerant_routing_mux."""
+from fault_tolerant_routing_mux.cli import main
+
+main()
@@ -0,0 +1,125 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Adaptive refinement of the probability grid of robustness curves.
+
+Robustness curves are flat over most of the probability range and bend sharply
+around their knee. Instead of a fine uniform grid, the sweep starts from a coarse
+grid and bisects, round after round, every interval whose curve change (difference
+between its endpoints) or curvature (distance of an endpoint to the chord of its
+neighbours) exceeds a tolerance, until no interval does or the point budget is
+spent. All the midpoints of a round are evaluated together, so evaluate can run
+them as one batch (e.g. on a SweepScheduler).
+
+The tolerance must stay above the sampling noise of the curves (about
+sqrt(rate / num_iters)), otherwise noise alone keeps triggering bisections.
+
+>>> grid = adaptive_grid(evaluate, [0, .05, .1, .15], tolerance=.01, max_points=40)
+>>> grid.p, grid.results[grid.p[1]]
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Sequence
+import numpy as np
+
+from .memristor_errors import RandomErrorGen
+
+
+class AdaptiveGrid(NamedTuple):
+    """Sorted non-uniform grid, results per point and number of refinement rounds."""
+
+    p: List[float]
+    results: Dict
+    rounds: int
+
+
+def interval_scores(p: Sequence[float], y):
+    """Return the (change, curvature) of every interval of the curves y sampled at p.
+
+    :param y: Curve values, shape (points,) or (points, curves); scores are the maximum
+              over the curves
+    :return: Two arrays of len(p) - 1 values
+    """
+    p = np.asarray(p, dtype=float)
+    y = np.asarray(y, dtype=float).reshape(p.size, -1)
+    change = np.abs(np.diff(y, axis=0)).max(axis=1)
+
+    # Distance of every interior point to the chord between its neighbours
+    curvature = np.zeros(p.size)
+    if p.size > 2:
+        w = (p[1:-1] - p[:-2]) / (p[2:] - p[:-2])
+        chord = y[:-2] + w[:, None] * (y[2:] - y[:-2])
+        curvature[1:-1] = np.abs(y[1:-1] - chord).max(axis=1)
+    # An interval is as curved as its endpoints
+    return change, np.maximum(curvature[:-1], curvature[1:])
+
+
+def adaptive_grid(evaluate: Callable, p_initial: Sequence[float], tolerance: float = .01,
+                  max_points: int = 50, metric: Callable = None, min_width: float = None):
+    """Refine p_initial where the curves change or bend more than tolerance.
+
+    :param evaluate: Callable taking a list of probabilities and returning {p: result}
+    :param metric: Curve value(s) of a result, a float or a sequence (the result itself if None)
+    :param max_points: Budget of evaluated points, including p_initial
+    :param min_width: Intervals narrower than this are never bisected
+                      (default: the smallest initial interval / 64)
+    :return: AdaptiveGrid
+    """
+    p = sorted(float(q) for q in set(p_initial))
+    if len(p) < 2:
+        raise ValueError("adaptive_grid needs at least two initial points")
+    metric = metric or (lambda result: result)
+    if min_width is None:
+        min_width = float(np.diff(p).min()) / 64
+    results = dict(evaluate(p))
+
+    rounds = 0
+    while len(p) < max_points:
+        change, curvature = interval_scores(p, [np.ravel(metric(results[q])) for q in p])
+        score = np.maximum(change, curvature)
+        candidates = np.flatnonzero((score > tolerance) & (np.diff(p) > min_width))
+        if not candidates.size:
+            break
+        # Worst intervals first when the budget does not cover them all
+        candidates = candidates[np.argsort(-score[candidates], kind="stable")]
+        midpoints = sorted((p[i] + p[i + 1]) / 2 for i in candidates[:max_points - len(p)])
+        results.update(evaluate(midpoints))
+        p = sorted(p + midpoints)
+        rounds += 1
+
+    return AdaptiveGrid(p, {q: results[q] for q in p}, rounds)
+
+
+def adaptive_standalone_sim(p_initial: Sequence[float], num_iters: int, cell_type,
+                            tolerance: float = .01, max_points: int = 50, seed: int = None):
+    """Adaptive counterpart of FaultSimulator.standalone_sim, on the bit-sliced engine.
+
+    Refines on the unusable mux and defect edge ratios and writes the same report.
+    :return: AdaptiveGrid of standalone_sim results (% unusable, % defect edges, # SA0, ...)
+    """
+    from .bitsliced import simulate_muxes
+    from .core import FaultSimulator
+
+    rng = np.random.default_rng(seed)
+
+    def evaluate(p_array):
+        return {p: simulate_muxes(12, cell_type, RandomErrorGen(pSA0=p, pSA1=p, pUD=p),
+                                  num_iters, rng).summary()
+                for p in p_array}
+
+    start = datetime.now()
+    grid = adaptive_grid(evaluate, p_initial, tolerance, max_points,
+                         metric=lambda result: result[:2])
+    sim_time = (datetime.now() - start).total_seconds()
+    FaultSimulator._write_standalone_report(cell_type, num_iters, sim_time, grid.results)
+    return grid
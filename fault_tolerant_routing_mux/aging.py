@@ -0,0 +1,152 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Event-driven simulation of memristor defects accumulating over the device lifetime.
+
+Every memristor gets a single time to failure and failure mode, drawn once with
+competing risks: the SA0, SA1 and UD failure rates add up to a Weibull lifetime
+(exponential for shape=1) and the mode is picked in proportion to its rate. Only
+memristors failing before the horizon become events. The simulation then walks
+the sorted events and re-evaluates only the muxes touched since the last sample,
+so a whole time series costs one evaluation of every mux plus one per event.
+
+A memristor that is already faulty (e.g. a production defect set by
+FaultSimulator.run_simulation) keeps its first error.
+
+>>> aging = AgingSimulator(fault_sim.muxes, rate_SA0=1e-4, rate_SA1=1e-4, rate_UD=1e-5)
+>>> series = aging.run(times=np.linspace(0, 10000, 101))
+>>> series.unusable, series.defect_edges
+"""
+from typing import NamedTuple
+import numpy as np
+
+from .memristor_errors import Errors
+
+FAILURE_MODES = (Errors.SA0, Errors.SA1, Errors.UD)
+
+
+class AgingSeries(NamedTuple):
+    """State of the muxes at each sampled time, failed_memristors only counts aging failures."""
+
+    times: np.ndarray
+    unusable: np.ndarray
+    defect_edges: np.ndarray
+    failed_memristors: np.ndarray
+
+
+class AgingSimulator():
+    """Accumulate lifetime memristor failures on a list of RoutingMux.
+
+    :param muxes: RoutingMux list, e.g. FaultSimulator.muxes, modified in place
+    :param rate_SA0, rate_SA1, rate_UD: Failure rates per memristor and time unit
+    :param shape: Weibull shape of the lifetime, 1 for a constant failure rate and
+                  above 1 for wear-out
+    :param seed: Seed or numpy Generator of the failure draws
+    """
+
+    def __init__(self, muxes, rate_SA0: float = 0., rate_SA1: float = 0., rate_UD: float = 0.,
+                 shape: float = 1., seed=None):
+        """Index the memristors of every mux."""
+        self.muxes = muxes
+        self.rates = np.array([rate_SA0, rate_SA1, rate_UD], dtype=float)
+        self.shape = shape
+        self.rng = np.random.default_rng(seed)
+        self.time = 0.
+        # Memristors of mux i are numbered memristor_offsets[i]:memristor_offsets[i + 1],
+        # cell by cell in mux.cell_list order
+        per_mux = [len(mux.cell_list) * mux.cell_list[0].num_memristors for mux in muxes]
+        self.memristor_offsets = np.concatenate(([0], np.cumsum(per_mux))).astype(np.int64)
+        self.num_memristors = int(self.memristor_offsets[-1])
+        self.events = None
+        self._unusable = None
+
+    def draw_failures(self, horizon: float):
+        """Draw the failures happening before horizon and sort them by time."""
+        total_rate = self.rates.sum()
+        if total_rate == 0:
+            times = np.zeros(0)
+            memristors = np.zeros(0, dtype=np.int64)
+        else:
+            # Weibull with characteristic life 1 / total_rate
+            times = self.rng.weibull(self.shape, self.num_memristors) / total_rate
+            memristors = np.flatnonzero(times <= horizon)
+            times = times[memristors]
+        modes = self.rng.choice(len(FAILURE_MODES), size=memristors.size,
+                                p=self.rates / total_rate if total_rate else None)
+        self.horizon = horizon
+        order = np.argsort(times, kind="stable")
+        self.events = (times[order], memristors[order],
+                       np.asarray(FAILURE_MODES)[modes[order]])
+        self._next_event = 0
+
+    def _mux_state(self, mux):
+        mux.compute_block_errors()
+        return bool(mux.get_mux_unusable()), \
+            sum(len(srcs) for srcs in mux.get_defect_edges().values())
+
+    def _apply(self, memristor, error):
+        """Fail a single memristor, return the index of its mux or None if already faulty."""
+        i = int(np.searchsorted(self.memristor_offsets, memristor, side="right")) - 1
+        mux = self.muxes[i]
+        local = memristor - int(self.memristor_offsets[i])
+        cell = mux.cell_list[local // mux.cell_list[0].num_memristors]
+        index = local % cell.num_memristors
+        if cell.get_memristor(index) != Errors.FF:
+            return None
+        cell.set_memristor(index, error)
+        return i
+
+    def run(self, times):
+        """Advance through increasing sample times and return the AgingSeries.
+
+        Failures are drawn up to the last sample time of the first call, unless
+        draw_failures was called before; later calls continue from the current time.
+        """
+        times = np.asarray(times, dtype=float)
+        if self.events is None:
+            self.draw_failures(times[-1])
+        if times[-1] > self.horizon:
+            raise ValueError(f"failures were only drawn up to t = {self.horizon}")
+        if self._unusable is None:
+            states = [self._mux_state(mux) for mux in self.muxes]
+            self._unusable = np.array([s[0] for s in states], dtype=bool)
+            self._defects = np.array([s[1] for s in states], dtype=np.int64)
+            self._unusable_count = int(self._unusable.sum())
+            self._defect_count = int(self._defects.sum())
+            self._failed = 0
+
+        event_times, memristors, errors = self.events
+        unusable = np.zeros(times.size, dtype=np.int64)
+        defect_edges = np.zeros(times.size, dtype=np.int64)
+        failed = np.zeros(times.size, dtype=np.int64)
+        for k, t in enumerate(times):
+            end = int(np.searchsorted(event_times, t, side="right"))
+            dirty = set()
+            for memristor, error in zip(memristors[self._next_event:end].tolist(),
+                                        errors[self._next_event:end].tolist()):
+                i = self._apply(memristor, error)
+                if i is not None:
+                    dirty.add(i)
+                    self._failed += 1
+            self._next_event = max(self._next_event, end)
+            for i in dirty:
+                mux_unusable, mux_defects = self._mux_state(self.muxes[i])
+                self._unusable_count += mux_unusable - int(self._unusable[i])
+                self._defect_count += mux_defects - int(self._defects[i])
+                self._unusable[i], self._defects[i] = mux_unusable, mux_defects
+            self.time = t
+            unusable[k] = self._unusable_count
+            defect_edges[k] = self._defect_count
+            failed[k] = self._failed
+        return AgingSeries(times, unusable, defect_edges, failed)
@@ -0,0 +1,269 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Batch fault injection over many rr_graphs and probability configurations.
+
+Every rr_graph of a manifest goes through three kinds of tasks submitted to one
+shared process pool:
+
+- parse: scan_rr_edges and the mux templates of templates.py (compact arrays),
+  once per rr_graph,
+- simulate: template batches seeded by the run seed, once per run,
+- write: the defect delta (or the faulty rr_graph through the delta), once per run.
+
+Tasks of different rr_graphs interleave on the pool, so parsing a graph overlaps
+with simulating and writing the runs of another one. A parsed graph stays in memory
+until all its runs are written; graphs only start parsing while their estimated
+size fits in the memory limit (one graph at a time is always allowed). Each task
+receives its own pickled copy of the graph arrays, so the tasks of a graph in flight
+are capped to keep the parent copy plus one copy per task within the limit.
+
+The manifest is a JSON list of entries, probabilities as in orchestrator.expand_runs:
+[{"rr_graph": "w100/rr_graph.xml", "cell": "ProtoVoterCell",
+  "probabilities": [0.001, {"pSA0": 0.002, "pSA1": 0, "pUD": 0.001}], "repeats": 5}]
+
+>>> results = run_batch(load_manifest("manifest.json"), workers=8)
+>>> write_batch_results(results, "batch_results.tsv")
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple
+
+from .control_cell import CELL_TYPES
+from .orchestrator import _available_memory, expand_runs
+
+# Output of a run: delta file, faulty rr_graph (materialized from the delta) or only stats
+DELTA, XML, STATS = "delta", "xml", "stats"
+# Parsed graph size per byte of rr_graph file, before the actual size is known
+PARSE_MEMORY_RATIO = .5
+
+
+class ParsedGraph(NamedTuple):
+    """Result of the parse stage: edges in file order and mux templates."""
+
+    rr_graph: str
+    edges: object
+    templates: List
+    sha256: str
+    parse_time: float
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.edges.src, self.edges.sink, self.edges.switch)) + \
+            sum(t.sinks.nbytes + t.srcs.nbytes for t in self.templates)
+
+
+def load_manifest(manifest_file):
+    """Return the runs of a manifest, rr_graph paths relative to the manifest directory."""
+    with open(manifest_file) as f:
+        entries = json.load(f)
+    base = Path(manifest_file).parent
+    runs = []
+    for entry in entries:
+        if entry.get("cell", "ProtoVoterCell") not in CELL_TYPES:
+            raise ValueError(f"unknown cell type {entry['cell']!r}")
+        for run in expand_runs(base / entry["rr_graph"], entry.get("cell", "ProtoVoterCell"),
+                               entry["probabilities"], entry.get("repeats", 1),
+                               entry.get("seed", 0)):
+            run["run"] = len(runs)
+            runs.append(run)
+    return runs
+
+
+def parse_graph(rr_graph):
+    """Parse stage (worker): scan the edges and group the muxes into templates."""
+    from .delta import file_sha256
+    from .edge_scanner import scan_rr_edges
+    from .templates import group_mux_edges
+
+    start = time.perf_counter()
+    edges = scan_rr_edges(rr_graph, workers=0)
+    return ParsedGraph(rr_graph, edges, group_mux_edges(edges), file_sha256(rr_graph),
+                       time.perf_counter() - start)
+
+
+def simulate_run(templates, run, batch_muxes: int = 1 << 16):
+    """Simulate stage (worker): return (stats as dict, defect edges, simulation time)."""
+    import numpy as np
+    from .memristor_errors import RandomErrorGen
+    from .stats import SimulationStats
+    from .templates import simulate_template
+
+    start = time.perf_counter()
+    probabilities = run["probabilities"]
+    if "p" in probabilities:
+        p = probabilities["p"]
+        reg = RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
+    else:
+        reg = RandomErrorGen(**probabilities)
+    rng = np.random.default_rng(run["seed"])
+    stats = SimulationStats()
+    defect_edges = dict()
+    for template in templates:
+        simulate_template(template, CELL_TYPES[run["cell_type"]], reg, rng, stats, defect_edges,
+                          batch_muxes)
+    return stats.to_dict(), defect_edges, time.perf_counter() - start
+
+
+def write_run(rr_graph, edges, sha256, defect_edges, output_file, output: str = DELTA):
+    """Write stage (worker): write the delta or the faulty rr_graph, return the write time."""
+    from .delta import materialize, write_delta
+
+    start = time.perf_counter()
+    if output == DELTA:
+        write_delta(output_file, rr_graph, defect_edges, edges, sha256)
+    else:
+        delta_file = f"{output_file}.{os.getpid()}.delta"
+        write_delta(delta_file, rr_graph, defect_edges, edges, sha256)
+        materialize(delta_file, rr_graph, output_file, check_hash=False)
+        os.remove(delta_file)
+    return time.perf_counter() - start
+
+
+def run_output_file(run, output: str = DELTA):
+    """Return the file written for a run, named after the faulty rr_graph and the run."""
+    from .core import faulty_rr_graph_name
+
+    # [:-4] gets name up to extension (.xml)
+    name = faulty_rr_graph_name(run["rr_graph"][:-4], **run["probabilities"])[:-4]
+    return f"{name}_run{run['run']}.{'delta' if output == DELTA else 'xml'}"
+
+
+class BatchRunner():
+    """Run the parse, simulate and write stages of many runs on a shared process pool.
+
+    :param workers: Worker processes of the pool, defaults to the number of cores
+    :param memory_limit: Bytes of parsed graphs held at once, defaults to the available memory
+    :param output: DELTA, XML or STATS (nothing written)
+    :param batch_muxes: Template instances simulated together, see simulate_template
+    """
+
+    def __init__(self, workers: int = None, memory_limit: int = None, output: str = DELTA,
+                 batch_muxes: int = 1 << 16):
+        """Store the limits."""
+        if output not in (DELTA, XML, STATS):
+            raise ValueError(f"unknown output {output!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit or _available_memory()
+        self.output = output
+        self.batch_muxes = batch_muxes
+
+    async def run(self, runs):
+        """Run all runs and return their results in run order."""
+        graphs = dict()
+        for run in runs:
+            graphs.setdefault(run["rr_graph"], []).append(run)
+        self._memory = asyncio.Condition()
+        self._reserved = 0
+        self.peak_reserved = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            per_graph = await asyncio.gather(*(self._run_graph(pool, rr_graph, graph_runs)
+                                               for rr_graph, graph_runs in graphs.items()))
+        return sorted((result for results in per_graph for result in results),
+                      key=lambda result: result["run"])
+
+    async def _reserve(self, nbytes):
+        async with self._memory:
+            # A graph larger than the limit still runs, alone
+            await self._memory.wait_for(lambda: self.memory_limit is None or
+                                        self._reserved == 0 or
+                                        self._reserved + nbytes <= self.memory_limit)
+            self._reserved += nbytes
+            self.peak_reserved = max(self.peak_reserved, self._reserved)
+
+    async def _release(self, nbytes):
+        async with self._memory:
+            self._reserved -= nbytes
+            self._memory.notify_all()
+
+    async def _run_graph(self, pool, rr_graph, runs):
+        loop = asyncio.get_running_loop()
+        # A missing file reserves nothing and fails in the parse stage
+        reserved = int(os.path.getsize(rr_graph) * PARSE_MEMORY_RATIO) \
+            if os.path.exists(rr_graph) else 0
+        await self._reserve(reserved)
+        try:
+            try:
+                parsed = await loop.run_in_executor(pool, parse_graph, rr_graph)
+            except Exception as e:  # report and go on with the other graphs
+                return [dict(run, error=f"parse failed: {e!r}") for run in runs]
+            # Every task carries a pickled copy of the graph (templates or edges): cap the
+            # tasks in flight so that the parent copy plus one per task fits the limit
+            in_flight = min(len(runs), self.workers)
+            if self.memory_limit is not None:
+                in_flight = max(1, min(in_flight,
+                                       self.memory_limit // max(parsed.nbytes, 1) - 1))
+            # Release the parse estimate and wait for the full amount, so that graphs
+            # growing at the same time never hold part of the memory while waiting
+            await self._release(reserved)
+            reserved = 0
+            await self._reserve((1 + in_flight) * parsed.nbytes)
+            reserved = (1 + in_flight) * parsed.nbytes
+            tasks = asyncio.Semaphore(in_flight)
+            return await asyncio.gather(*(self._run_one(pool, parsed, run, tasks)
+                                          for run in runs))
+        finally:
+            await self._release(reserved)
+
+    async def _run_one(self, pool, parsed, run, tasks):
+        from .stats import SimulationStats
+
+        loop = asyncio.get_running_loop()
+        result = dict(run, parse_time=parsed.parse_time,
+                      num_muxes=sum(len(t) for t in parsed.templates),
+                      mux_edge_count=sum(t.srcs.size for t in parsed.templates))
+        try:
+            async with tasks:
+                stats, defect_edges, result["sim_time"] = await loop.run_in_executor(
+                    pool, simulate_run, parsed.templates, run, self.batch_muxes)
+            stats = SimulationStats.from_dict(stats)
+            result.update(unusable_count=stats.unusable.unusable,
+                          unusable=stats.unusable.rate(),
+                          defect_edge_count=stats.defects.defect_edges(),
+                          defect_rate=stats.defects.defect_rate())
+            if self.output != STATS:
+                output_file = run_output_file(run, self.output)
+                async with tasks:
+                    result["write_time"] = await loop.run_in_executor(
+                        pool, write_run, parsed.rr_graph, parsed.edges, parsed.sha256,
+                        defect_edges, output_file, self.output)
+                result["output_file"] = output_file
+        except Exception as e:  # report and go on with the other runs
+            result["error"] = f"run failed: {e!r}"
+        return result
+
+
+def run_batch(runs, **kwargs):
+    """Run the batch synchronously, see BatchRunner for the keyword arguments."""
+    return asyncio.run(BatchRunner(**kwargs).run(runs))
+
+
+def write_batch_results(results, out_file):
+    """Write the results of all runs as one tab separated table."""
+    columns = ["run", "rr_graph", "cell_type", "probabilities", "seed", "num_muxes",
+               "mux_edge_count", "unusable_count", "defect_edge_count", "% unusable",
+               "% defect edges", "parse_time", "sim_time", "write_time", "output_file", "error"]
+    with open(out_file, "w") as f:
+        f.write("\t".join(columns) + "\n")
+        for result in results:
+            row = dict(result)
+            for key, column in (("unusable", "% unusable"), ("defect_rate", "% defect edges")):
+                if key in row:
+                    row[column] = f"{row[key] * 100:.2f}"
+            f.write("\t".join(str(row.get(c, "")) for c in columns) + "\n")
+    print(f"Results written to {out_file}")
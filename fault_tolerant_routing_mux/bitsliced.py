@@ -0,0 +1,231 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Bit-sliced simulation of independent routing mux trials.
+
+Trial t of a batch is bit t of every plane, a plane being a uint64 array, so a
+single bitwise numpy operation evaluates 64 trials per word. Memristor errors are
+two planes (hi, lo) with the Errors code hi * 2 + lo. Cell errors are one-hot
+planes (one per Errors code) obtained by evaluating the cell LUTs as sums of
+minterms, and the rules of RoutingMuxBlock.compute_block_error ("any UD", "more
+than one SA1") and get_defect_edges become bitwise logic over the cells of a block.
+Defect edges are summed per trial with a bit-sliced counter and totals use popcount.
+
+>>> stats = simulate_muxes(12, ProtoVoterCell, RandomErrorGen(pSA0=p, pSA1=p, pUD=p), 10**7)
+>>> stats.summary()
+"""
+from datetime import datetime
+from functools import partial
+from math import ceil
+from typing import Callable, Sequence
+import numpy as np
+
+from .control_cell import MemCell, ProtoVoterCell
+from .memristor_errors import Errors, RandomErrorGen
+from .mux import optimal_block_size
+from .stats import SimulationStats
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def popcount(words):
+    """Return the number of set bits in a uint64 array."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return int(np.bitwise_count(words).sum())
+    return int(_POPCOUNT8[np.ascontiguousarray(words).view(np.uint8)].sum())
+
+
+def pack_bits(bits):
+    """Pack a boolean array (..., trials) into uint64 planes (..., words), trial t at bit t."""
+    packed = np.packbits(bits, axis=-1, bitorder="little")
+    words = ceil(bits.shape[-1] / 64)
+    padded = np.zeros(packed.shape[:-1] + (words * 8,), dtype=np.uint8)
+    padded[..., :packed.shape[-1]] = packed
+    return padded.view("<u8")
+
+
+def unpack_bits(planes, num_trials):
+    """Inverse of pack_bits, truncated to num_trials."""
+    bits = np.unpackbits(np.ascontiguousarray(planes).view(np.uint8), axis=-1, bitorder="little")
+    return bits[..., :num_trials].astype(bool)
+
+
+def sample_memristors(rng, reg: RandomErrorGen, count: int, num_trials: int):
+    """Draw (hi, lo) planes of shape (count, words) following the distribution of reg."""
+    # Same intervals as RandomErrorGen.gen: UD, SA0, SA1, then FF
+    u = rng.random((count, num_trials))
+    lo = u < reg.pSA0  # UD or SA0
+    hi = (u < reg.pUD) | ((u >= reg.pSA0) & (u < reg.pSA1))  # UD or SA1
+    return pack_bits(hi), pack_bits(lo)
+
+
+def _one_hot(hi, lo):
+    """Return the planes of FF, SA0, SA1, UD (indexed by Errors code)."""
+    return (~hi & ~lo, ~hi & lo, hi & ~lo, hi & lo)
+
+
+def _lut(error_LUT, rows, cols):
+    """Evaluate error_LUT[row][col] on one-hot planes as a sum of minterms."""
+    out = [np.zeros_like(rows[0]) for _ in range(4)]
+    for r, row in enumerate(error_LUT):
+        for c, error in enumerate(row):
+            out[error] |= rows[r] & cols[c]
+    return out
+
+
+def _memcell(hi, lo, i):
+    """One-hot error planes of a MemCell whose (pullUp, pullDown) memristors are i, i + 1."""
+    pull_up = _one_hot(hi[i], lo[i])
+    pull_down = _one_hot(hi[i + 1], lo[i + 1])
+    return _lut(MemCell.error_LUT, pull_down, pull_up)
+
+
+def cell_planes(cell_type, hi, lo):
+    """Return the one-hot error planes of every cell given its memristor planes."""
+    n = cell_type.num_memristors
+    cells = []
+    for i in range(0, hi.shape[0], n):
+        if cell_type is ProtoVoterCell:
+            cells.append(_lut(ProtoVoterCell.error_LUT, _memcell(hi, lo, i),
+                              _memcell(hi, lo, i + 2)))
+        else:
+            cells.append(_memcell(hi, lo, i))
+    return cells
+
+
+def _block(cells):
+    """Return (block unusable, per-input defect planes) as in RoutingMuxBlock."""
+    any_ud = np.zeros_like(cells[0][0])
+    one_sa1 = np.zeros_like(any_ud)
+    two_sa1 = np.zeros_like(any_ud)
+    for cell in cells:
+        any_ud |= cell[Errors.UD]
+        two_sa1 |= one_sa1 & cell[Errors.SA1]
+        one_sa1 |= cell[Errors.SA1]
+    unusable = any_ud | two_sa1
+    # Unusable: all dead; one SA1: all but it; otherwise SA0 inputs
+    dead = [unusable | (one_sa1 & ~cell[Errors.SA1]) | cell[Errors.SA0] for cell in cells]
+    return unusable, dead
+
+
+def _add(counter, plane):
+    """Add a 0/1 plane to a bit-sliced counter (list of planes, least significant first)."""
+    carry = plane
+    for i, bit in enumerate(counter):
+        counter[i] = bit ^ carry
+        carry = bit & carry
+
+
+def evaluate_mux_inputs(mux_size: int, cells, block_size: int = None):
+    """Evaluate a 2-stage routing mux on cell planes ordered as RoutingMux.cell_list.
+
+    :param block_size: First stage block size, optimal_block_size(mux_size) if None
+    :return: (unusable plane, defect plane of every input in src_node_list order)
+    """
+    block_size = block_size or optimal_block_size(mux_size)
+    n_blocks = ceil(mux_size / block_size)
+    partial_size = mux_size % block_size
+    first_cells, second_cells = cells[:block_size], cells[block_size:]
+
+    first_unusable, first_dead = _block(first_cells)
+    second_unusable, second_dead = _block(second_cells)
+    partial_dead = _block(first_cells[:partial_size])[1] if partial_size else None
+
+    inputs = []
+    for k in range(n_blocks):
+        block_dead = partial_dead if (partial_size and k == n_blocks - 1) else first_dead
+        inputs += [second_dead[k] | dead for dead in block_dead]
+    return first_unusable | second_unusable, inputs
+
+
+def evaluate_mux(mux_size: int, cells, block_size: int = None):
+    """Evaluate a 2-stage routing mux on cell planes ordered as RoutingMux.cell_list.
+
+    :param block_size: First stage block size, optimal_block_size(mux_size) if None
+    :return: (unusable plane, bit-sliced counter of defect edges)
+    """
+    unusable, inputs = evaluate_mux_inputs(mux_size, cells, block_size)
+    counter = [np.zeros_like(unusable) for _ in range(mux_size.bit_length())]
+    for dead in inputs:
+        _add(counter, dead)
+    return unusable, counter
+
+
+def count_cell_errors(cells, num_trials):
+    """Return the number of cells per Errors code over the first num_trials trials."""
+    errors = np.zeros(4, dtype=np.int64)
+    for error in (Errors.SA0, Errors.SA1, Errors.UD):
+        errors[error] = sum(popcount(cell[error]) for cell in cells)
+    # Padding bits of the last word are FF cells, count FF from the other errors
+    errors[Errors.FF] = len(cells) * num_trials - errors.sum()
+    return errors
+
+
+def _collect(stats, mux_size, cells, unusable, counter, num_trials):
+    """Fold the planes of a batch into stats."""
+    stats.cell_errors.counts += count_cell_errors(cells, num_trials)
+    stats.unusable.unusable += popcount(unusable)
+    stats.unusable.total += num_trials
+
+    defects = np.zeros(num_trials, dtype=np.int64)
+    for i, plane in enumerate(counter):
+        defects += unpack_bits(plane, num_trials).astype(np.int64) << i
+    stats.defects.update(np.full(num_trials, mux_size), defects)
+
+
+def simulate_muxes(mux_size: int, cell_type, reg: RandomErrorGen, num_trials: int,
+                   rng=None, batch_trials: int = 1 << 16, progress: Callable = None):
+    """Simulate num_trials independent muxes and return their SimulationStats.
+
+    Same statistics as folding num_trials simulated RoutingMux into SimulationStats.add_mux.
+    :param rng: numpy Generator, np.random.default_rng() if None
+    :param batch_trials: Trials evaluated together, bounds memory
+    :param progress: Called as progress(done, num_trials) after every batch
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    block_size = optimal_block_size(mux_size)
+    num_cells = block_size + ceil(mux_size / block_size)
+    num_memristors = num_cells * cell_type.num_memristors
+
+    stats = SimulationStats()
+    for start in range(0, num_trials, batch_trials):
+        n = min(batch_trials, num_trials - start)
+        hi, lo = sample_memristors(rng, reg, num_memristors, n)
+        cells = cell_planes(cell_type, hi, lo)
+        unusable, counter = evaluate_mux(mux_size, cells)
+        _collect(stats, mux_size, cells, unusable, counter, n)
+        if progress is not None:
+            progress(start + n, num_trials)
+    return stats
+
+
+def bitsliced_standalone_sim(p_array: Sequence[float], num_iters: int, cell_type,
+                             seed: int = None, progress: Callable = None):
+    """Bit-sliced counterpart of FaultSimulator.standalone_sim, writing the same report.
+
+    :param progress: Called as progress(p, done, num_iters) after every batch
+    """
+    from .core import FaultSimulator
+
+    rng = np.random.default_rng(seed)
+    results = dict()
+    start = datetime.now()
+    for p in p_array:
+        reg = RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
+        report = None if progress is None else partial(progress, p)
+        results[p] = simulate_muxes(12, cell_type, reg, num_iters, rng,
+                                    progress=report).summary()
+    sim_time = (datetime.now() - start).total_seconds()
+    FaultSimulator._write_standalone_report(cell_type, num_iters, sim_time, results)
+    return results
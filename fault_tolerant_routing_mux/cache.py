@@ -0,0 +1,317 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Persistent cache of completed simulations, addressed by a hash of their inputs.
+
+The key of an entry is the SHA-256 of its inputs (rr_graph content, cell type,
+probabilities, seed, iterations, sampling method) and of the package version, so
+a new release never reuses old results. An entry is a directory holding the
+report, the SimulationStats and the defect delta of a run; faulty rr_graphs are
+rebuilt from the delta with materialize(), without parsing the XML.
+
+Entries are built in a private temporary directory and renamed into place, and
+evicted entries are renamed away before being removed, so concurrent processes
+only ever see complete entries. Each hit refreshes the access time of its entry
+and the least recently used entries are evicted once the total size exceeds
+max_bytes. The digest of an rr_graph is memoized per (path, size, mtime), so a hit
+costs a few file system calls.
+
+>>> cache = ResultCache("~/.cache/ftrm")
+>>> run = cached_run_simulation(cache, ProtoVoterCell, Path("rr_graph.xml"), p=0.003, seed=1)
+>>> run.hit, run.stats.summary(), run.output_file
+"""
+import hashlib
+import json
+import os
+import random
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+from . import __version__
+
+try:
+    import fcntl
+except ImportError:  # Windows: entries stay consistent, concurrent evictions may overlap
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 1 << 30
+META_FILE = "meta.json"
+
+
+def default_cache_dir():
+    """Return $FTRM_CACHE_DIR, or ftrm in the user cache directory."""
+    if "FTRM_CACHE_DIR" in os.environ:
+        return Path(os.environ["FTRM_CACHE_DIR"])
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "ftrm"
+
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class ResultCache():
+    """Directory of content-addressed simulation results with LRU eviction.
+
+    :param directory: Cache directory, default_cache_dir() if None
+    :param max_bytes: Total size of the entries kept after each insertion
+    """
+
+    def __init__(self, directory=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Create the cache directory layout if needed."""
+        self.directory = Path(directory or default_cache_dir()).expanduser()
+        self.max_bytes = max_bytes
+        self.entries = self.directory / "entries"
+        self.digests = self.directory / "digests"
+        self.tmp = self.directory / "tmp"
+        for path in (self.entries, self.digests, self.tmp):
+            path.mkdir(parents=True, exist_ok=True)
+
+    def file_digest(self, path):
+        """Return the SHA-256 of a file, memoized by path, size and modification time."""
+        from .delta import file_sha256
+
+        st = os.stat(path)
+        stamp = f"{os.path.realpath(path)}\0{st.st_size}\0{st.st_mtime_ns}"
+        memo = self.digests / hashlib.sha256(stamp.encode()).hexdigest()
+        try:
+            return memo.read_text()
+        except FileNotFoundError:
+            digest = file_sha256(path)
+            self._write_atomic(memo, digest)
+            return digest
+
+    def key(self, kind: str, **inputs):
+        """Return the key of a computation given all the inputs its result depends on."""
+        payload = json.dumps({"kind": kind, "version": __version__, "inputs": inputs},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry(self, key):
+        return self.entries / key[:2] / key
+
+    def get(self, key):
+        """Return the directory of an entry and mark it as used, None on a miss."""
+        entry = self._entry(key)
+        try:
+            os.utime(entry / META_FILE)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def put(self, key, files: Dict[str, object], meta: Dict = None):
+        """Store an entry and return its directory.
+
+        :param files: {name: Path of a file to copy, or str contents}
+        :param meta: JSON serializable description of the entry
+        """
+        staging = self.tmp / uuid.uuid4().hex
+        staging.mkdir()
+        for name, content in files.items():
+            if isinstance(content, str):
+                (staging / name).write_text(content)
+            else:
+                shutil.copyfile(content, staging / name)
+        (staging / META_FILE).write_text(json.dumps(dict(meta or {}, version=__version__)))
+
+        entry = self._entry(key)
+        entry.parent.mkdir(exist_ok=True)
+        try:
+            os.rename(staging, entry)
+        except OSError:  # Stored concurrently by another process
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+        return entry
+
+    def _list(self):
+        """Return [(last use, size, entry)] of every complete entry."""
+        found = []
+        for prefix in os.scandir(self.entries):
+            for entry in os.scandir(prefix.path):
+                try:
+                    found.append((os.stat(os.path.join(entry.path, META_FILE)).st_mtime_ns,
+                                  _dir_size(entry.path), entry.path))
+                except FileNotFoundError:
+                    continue
+        return found
+
+    def size(self):
+        """Return the total size of the entries in bytes."""
+        return sum(size for _, size, _ in self._list())
+
+    def __len__(self):
+        return len(self._list())
+
+    @contextmanager
+    def _lock(self):
+        with open(self.directory / "lock", "w") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _remove(self, entry):
+        trash = self.tmp / uuid.uuid4().hex
+        try:
+            os.rename(entry, trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def evict(self, max_bytes: int = None):
+        """Remove the least recently used entries until the total size fits max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock():
+            found = sorted(self._list())
+            total = sum(size for _, size, _ in found)
+            for _, size, entry in found:
+                if total <= max_bytes:
+                    break
+                self._remove(entry)
+                total -= size
+
+    def clear(self):
+        """Remove every entry."""
+        self.evict(max_bytes=0)
+
+    def _write_atomic(self, path, text):
+        staging = self.tmp / uuid.uuid4().hex
+        staging.write_text(text)
+        os.replace(staging, path)
+
+
+class CachedRun(NamedTuple):
+    """Result of cached_run_simulation, output_file is the faulty rr_graph or the delta."""
+
+    stats: object
+    report_file: Path
+    output_file: str
+    hit: bool
+
+
+def cached_run_simulation(cache: ResultCache, cell_type, rr_graph_file: Path, p: float = None,
+                          pSA0: float = 0., pSA1: float = 0., pUD: float = 0., seed: int = 0,
+                          delta: bool = False, sparse: bool = False, stream: bool = False,
+                          templates: bool = False):
+    """FaultSimulator.run_simulation with the random state seeded, served from cache.
+
+    A hit restores the report next to the rr_graph and the delta (delta=True) or the
+    faulty rr_graph rebuilt from the delta, without parsing the rr_graph. A miss runs
+    FaultSimulator (StreamingFaultSimulator if stream, which draws the same defects,
+    SparseFaultSimulator if sparse or TemplateFaultSimulator if templates) and stores its
+    outputs. Sparse and template runs draw differently and have their own entries.
+    """
+    from .core import faulty_rr_graph_name
+    from .delta import materialize, write_delta
+    from .stats import SimulationStats
+
+    if sparse and templates:
+        raise ValueError("sparse and templates are exclusive")
+    rr_graph_file = Path(rr_graph_file)
+    sampling = "sparse" if sparse else "templates" if templates else "object"
+    key = cache.key("vtr", rr_graph=cache.file_digest(rr_graph_file), cell=cell_type.__name__,
+                    p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD, seed=seed, sampling=sampling)
+    faulty_file = faulty_rr_graph_name(str(rr_graph_file)[:-4], p, pSA0, pSA1, pUD)
+    delta_file = f"{faulty_file[:-4]}.delta"
+    report_file = rr_graph_file.parents[0] / "fault_sim.out"
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            stats = SimulationStats.load(entry / "stats.json")
+            shutil.copyfile(entry / "report", report_file)
+            if delta:
+                shutil.copyfile(entry / "delta", delta_file)
+            else:
+                materialize(entry / "delta", rr_graph_file, faulty_file, check_hash=False)
+            return CachedRun(stats, report_file, delta_file if delta else faulty_file, True)
+        except FileNotFoundError:  # Evicted while reading, recompute
+            pass
+
+    if sparse:
+        from .sparse import SparseFaultSimulator
+        fault_sim = SparseFaultSimulator(cell_type, rr_graph_file, p=p, pSA0=pSA0, pSA1=pSA1,
+                                         pUD=pUD, seed=seed)
+    elif templates:
+        from .templates import TemplateFaultSimulator
+        fault_sim = TemplateFaultSimulator(cell_type, rr_graph_file, p=p, pSA0=pSA0, pSA1=pSA1,
+                                           pUD=pUD, seed=seed)
+    else:
+        if stream:
+            from .streaming import StreamingFaultSimulator as FaultSimulator
+        else:
+            from .core import FaultSimulator
+        fault_sim = FaultSimulator(cell_type, rr_graph_file, p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+        random.seed(seed)
+    fault_sim.run_simulation(delta=delta)
+
+    files = {"stats.json": json.dumps(fault_sim.stats.to_dict()), "report": report_file}
+    if delta:
+        files["delta"] = Path(delta_file)
+    else:
+        staged_delta = cache.tmp / f"{uuid.uuid4().hex}.delta"
+        write_delta(staged_delta, rr_graph_file, fault_sim.defect_edges)
+        files["delta"] = staged_delta
+    cache.put(key, files, meta={"kind": "vtr", "rr_graph": str(rr_graph_file),
+                                "cell": cell_type.__name__, "p": p, "pSA0": pSA0,
+                                "pSA1": pSA1, "pUD": pUD, "seed": seed, "sparse": sparse,
+                                "sampling": sampling})
+    if not delta:
+        os.remove(staged_delta)
+    return CachedRun(fault_sim.stats, report_file, delta_file if delta else faulty_file, False)
+
+
+def cached_standalone_sim(cache: ResultCache, p_array, num_iters: int, cell_type,
+                          seed: int = 0, engine: str = "object", workers: int = None,
+                          chunk_iters: int = 1000):
+    """Standalone simulation served from cache, writing fault_sim.rpt in both cases.
+
+    :param engine: "object" (FaultSimulator.standalone_sim with the random state seeded),
+                   "parallel" (parallel_standalone_sim, same results for any number of
+                   workers) or "bitsliced" (bitsliced_standalone_sim)
+    :return: (results as {p: summary}, hit)
+    """
+    inputs = dict(p=list(p_array), iters=num_iters, cell=cell_type.__name__, seed=seed,
+                  engine=engine)
+    if engine == "parallel":
+        inputs["chunk"] = chunk_iters
+    key = cache.key("standalone", **inputs)
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            results = {row[0]: tuple(row[1:])
+                       for row in json.loads((entry / "results.json").read_text())}
+            shutil.copyfile(entry / "report", "fault_sim.rpt")
+            return results, True
+        except FileNotFoundError:
+            pass
+
+    if engine == "bitsliced":
+        from .bitsliced import bitsliced_standalone_sim
+        results = bitsliced_standalone_sim(p_array, num_iters, cell_type, seed=seed)
+    elif engine == "parallel":
+        from .scheduler import parallel_standalone_sim
+        results = parallel_standalone_sim(p_array, num_iters, cell_type, workers=workers,
+                                          chunk_iters=chunk_iters, seed=seed)
+    else:
+        from .core import FaultSimulator
+        results = FaultSimulator.standalone_sim(p_array, num_iters, cell_type,
+                                                chunk_size=chunk_iters, seed=seed)
+
+    rows = [[p, *summary] for p, summary in results.items()]
+    cache.put(key, {"results.json": json.dumps(rows), "report": Path("fault_sim.rpt")},
+              meta=dict(inputs, kind="standalone"))
+    return results, False
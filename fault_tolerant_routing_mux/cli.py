@@ -0,0 +1,592 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Command line entry point (ftrm).
+
+Only the standard library is imported at module level. numpy and matplotlib are
+imported inside the subcommands that actually need them, so short jobs start fast.
+
+$ ftrm standalone --cell ProtoVoterCell --iters 1000 --p 0.01 0.02
+$ ftrm standalone --engine bitsliced --iters 10000000
+$ ftrm vtr rr_graph.xml --cell MemCell --p 0.003
+$ ftrm vtr rr_graph.xml --p 0.003 --delta && ftrm materialize rr_graph_0.3.delta rr_graph.xml
+$ ftrm vtr rr_graph.xml --p 0.003 --seed 1 --cache
+$ ftrm screen rr_graph.xml rr_graph_0.3.delta --max-unreachable-sinks 0
+$ ftrm daemon --socket /tmp/ftrm.sock --workers 4
+$ ftrm sweep --range 0 0.155 0.005 --iters 10000 --plot
+$ ftrm aging rr_graph.xml --rate-SA0 1e-6 --rate-UD 1e-7 --horizon 100000
+$ ftrm annotate rr_graph.xml --p 0.003 --xml
+$ ftrm exact rr_graph.xml --p 0.001 0.003 --quantiles 0.5 0.99
+$ ftrm route rr_graph.xml --p 0.001 --repeats 10 --command "vpr ... {faulty_rr_graph}"
+"""
+import argparse
+import sys
+from math import ceil
+
+from .control_cell import CELL_TYPES
+
+
+def _arange(start, stop, step):
+    """Return the same grid as np.arange(start, stop, step) without importing numpy."""
+    return [start + i * step for i in range(max(0, ceil((stop - start) / step)))]
+
+
+def _get_probabilities(args):
+    """Return the probability grid given either explicitly or as a range."""
+    if args.p is not None:
+        return args.p
+    return _arange(*args.range)
+
+
+def _add_grid_arguments(parser, default_range):
+    grid = parser.add_mutually_exclusive_group()
+    grid.add_argument("--p", type=float, nargs="+", metavar="P",
+                      help="defect probabilities to simulate")
+    grid.add_argument("--range", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                      default=default_range,
+                      help="probability grid as in np.arange (default: %(default)s)")
+
+
+def _print_progress(p, done, total):
+    print(f"\rp = {p:.4f}: {done}/{total} muxes", end="\n" if done == total else "",
+          file=sys.stderr, flush=True)
+
+
+def _cmd_standalone(args):
+    if args.cache is not None:
+        from .cache import ResultCache, cached_standalone_sim
+
+        engine = "parallel" if args.jobs is not None and args.engine == "object" else args.engine
+        _, hit = cached_standalone_sim(ResultCache(args.cache or None), _get_probabilities(args),
+                                       args.iters, CELL_TYPES[args.cell], seed=args.seed,
+                                       engine=engine, workers=args.jobs, chunk_iters=args.chunk)
+        print(f"{'Cache hit' if hit else 'Cached'}, report written to fault_sim.rpt")
+        return
+    progress = _print_progress if args.progress else None
+    if args.engine == "bitsliced":
+        from .bitsliced import bitsliced_standalone_sim
+
+        bitsliced_standalone_sim(_get_probabilities(args), args.iters, CELL_TYPES[args.cell],
+                                 seed=args.seed, progress=progress)
+        return
+    if args.jobs is not None:
+        from .scheduler import parallel_standalone_sim
+
+        parallel_standalone_sim(_get_probabilities(args), args.iters, CELL_TYPES[args.cell],
+                                workers=args.jobs, chunk_iters=args.chunk, seed=args.seed)
+        return
+    from .core import FaultSimulator
+
+    FaultSimulator.standalone_sim(_get_probabilities(args), args.iters, CELL_TYPES[args.cell],
+                                  chunk_size=args.chunk, progress=progress, seed=args.seed)
+
+
+def _cmd_vtr(args):
+    from pathlib import Path
+    if args.cache is not None:
+        from .cache import ResultCache, cached_run_simulation
+
+        run = cached_run_simulation(ResultCache(args.cache or None), CELL_TYPES[args.cell],
+                                    Path(args.rr_graph), p=args.p, pSA0=args.pSA0,
+                                    pSA1=args.pSA1, pUD=args.pUD, seed=args.seed or 0,
+                                    delta=args.delta, sparse=args.sparse, stream=args.stream,
+                                    templates=args.templates)
+        output = "Defect delta" if args.delta else "Faulty rr_graph"
+        print(f"{'Cache hit, ' if run.hit else ''}{output} written to {run.output_file}")
+        return
+    kwargs = dict(p=args.p, pSA0=args.pSA0, pSA1=args.pSA1, pUD=args.pUD)
+    if args.stream:
+        from .streaming import StreamingFaultSimulator as FaultSimulator
+    elif args.sparse:
+        from .sparse import SparseFaultSimulator as FaultSimulator
+        kwargs["seed"] = args.seed
+    elif args.templates:
+        from .templates import TemplateFaultSimulator as FaultSimulator
+        kwargs["seed"] = args.seed
+    else:
+        from .core import FaultSimulator
+
+    fault_sim = FaultSimulator(CELL_TYPES[args.cell], Path(args.rr_graph), **kwargs)
+    fault_sim.run_simulation(delta=args.delta)
+    if args.delta:
+        print(f"Defect delta written to {fault_sim.delta_file}")
+    else:
+        print(f"Faulty rr_graph written to {fault_sim.get_faulty_rr_graph()}")
+
+
+def _cmd_aging(args):
+    from pathlib import Path
+    import numpy as np
+    from .aging import AgingSimulator
+    from .core import FaultSimulator
+
+    fault_sim = FaultSimulator(CELL_TYPES[args.cell], Path(args.rr_graph), p=args.p)
+    if args.p:  # production defects before aging
+        for mux in fault_sim.muxes:
+            mux.set_errors(fault_sim.reg)
+    aging = AgingSimulator(fault_sim.muxes, args.rate_SA0, args.rate_SA1, args.rate_UD,
+                           shape=args.shape, seed=args.seed)
+    series = aging.run(np.linspace(0, args.horizon, args.steps + 1))
+    print("time\tunusable muxes\tdefect edges\tfailed memristors")
+    for row in zip(*series):
+        print(f"{row[0]:g}\t{row[1]}\t{row[2]}\t{row[3]}")
+
+
+def _cmd_cache(args):
+    from .cache import ResultCache
+
+    cache = ResultCache(args.dir)
+    if args.clear:
+        cache.clear()
+    elif args.max_mb is not None:
+        cache.evict(args.max_mb * 2**20)
+    print(f"{cache.directory}: {len(cache)} entries, {cache.size() / 2**20:.1f} MB")
+
+
+def _cmd_daemon(args):
+    from .daemon import SimulationDaemon
+
+    SimulationDaemon(args.socket, workers=args.workers).run()
+
+
+def _cmd_screen(args):
+    from .connectivity import ConnectivityScreen
+    from .delta import read_delta
+    from .rr_graph_index import RRGraphIndex
+
+    report = ConnectivityScreen(RRGraphIndex(args.rr_graph)).analyze(
+        removed=read_delta(args.delta).index)
+    print(f"Removed edges:\t{report.removed_edges}")
+    print(f"Undriven nodes:\t{report.undriven}")
+    print(f"Unreachable nodes:\t{report.unreachable}")
+    print(f"Components:\t{report.components_base} -> {report.components_faulty}")
+    if args.max_unreachable_sinks is not None and \
+            not report.passes(max_unreachable={"SINK": args.max_unreachable_sinks}):
+        raise SystemExit("Rejected: too many unreachable sinks")
+
+
+def _cmd_materialize(args):
+    from .delta import materialize
+
+    out = args.out or f"{args.delta.rsplit('.', 1)[0]}.xml"
+    materialize(args.delta, args.rr_graph, out, check_hash=not args.no_check)
+
+
+def _equal_curves(args, probabilities):
+    """Return {cell: {str(p): unusable ratio}} of the main.py experiment."""
+    if args.jobs is not None:
+        from .scheduler import EQUAL, SweepScheduler
+
+        scheduler = SweepScheduler(workers=args.jobs, chunk_iters=args.chunk, seed=args.seed)
+        for cell in args.cells:
+            scheduler.add_equal(probabilities, args.iters, cell)
+        curves = scheduler.run()
+        return {cell: curves[EQUAL, cell] for cell in args.cells}
+    from .main import simulate_failure_equal
+
+    return {cell: simulate_failure_equal(probabilities, CELL_TYPES[cell], args.iters)
+            for cell in args.cells}
+
+
+def _cmd_sweep(args):
+    probabilities = _get_probabilities(args)
+    if args.adaptive is not None:
+        from .adaptive import adaptive_grid
+
+        if args.paired:
+            raise SystemExit("--adaptive does not support --paired")
+
+        def evaluate(p_array):
+            curves = _equal_curves(args, p_array)
+            return {p: [curves[cell][str(p)] for cell in args.cells] for p in p_array}
+
+        grid = adaptive_grid(evaluate, probabilities, args.tolerance, args.adaptive)
+        probabilities = grid.p
+        results = {cell: {str(p): grid.results[p][i] for p in probabilities}
+                   for i, cell in enumerate(args.cells)}
+        print(f"{len(probabilities)} points after {grid.rounds} refinement rounds")
+    elif args.paired:
+        from .comparison import (compare_architectures, comparison_curves,
+                                 write_comparison_report)
+
+        if len(args.cells) < 2:
+            raise SystemExit("--paired compares at least two cell types")
+        rows = compare_architectures(probabilities, [CELL_TYPES[cell] for cell in args.cells],
+                                     args.iters, seed=args.seed)
+        write_comparison_report(rows)
+        results = comparison_curves(rows)
+    else:
+        results = _equal_curves(args, probabilities)
+
+    print("p(UD)\t" + "\t".join(args.cells))
+    for p in probabilities:
+        print(f"{p:.4f}\t" + "\t".join(f"{results[cell][str(p)]:.4f}" for cell in args.cells))
+
+    if args.plot:
+        if len(args.cells) != 2:
+            raise SystemExit("--plot compares exactly two cell types")
+        import matplotlib
+        matplotlib.use("Agg")  # never open a window from the command line
+        from .plotter import plot_all_equal
+
+        plot_all_equal(probabilities, *(results[cell] for cell in args.cells))
+
+
+def _cmd_route(args):
+    from .orchestrator import expand_runs, run_pipeline, write_results
+
+    runs = expand_runs(args.rr_graph, args.cell, args.p, args.repeats, args.seed)
+    memory_per_job = args.memory_per_job * 2**20 if args.memory_per_job else None
+    results = run_pipeline(runs, args.command, max_jobs=args.jobs, memory_per_job=memory_per_job,
+                           keep_faulty=not args.discard_faulty, stream=args.stream)
+    write_results(results, args.results)
+
+
+def _cmd_batch(args):
+    from .batch import load_manifest, run_batch, write_batch_results
+
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit else None
+    results = run_batch(load_manifest(args.manifest), workers=args.jobs,
+                        memory_limit=memory_limit, output=args.output)
+    write_batch_results(results, args.results)
+    if any("error" in result for result in results):
+        raise SystemExit("some runs failed, see the error column of the results")
+
+
+def _cmd_annotate(args):
+    import numpy as np
+    from .core import faulty_rr_graph_name
+    from .edge_probability import annotate_rr_graph, edge_defect_probabilities
+    from .edge_scanner import scan_rr_edges
+
+    probabilities = edge_defect_probabilities(scan_rr_edges(args.rr_graph), CELL_TYPES[args.cell],
+                                              p=args.p, pSA0=args.pSA0, pSA1=args.pSA1,
+                                              pUD=args.pUD)
+    # [:-4] gets name up to extension (.xml)
+    name = faulty_rr_graph_name(args.rr_graph[:-4], p=args.p, pSA0=args.pSA0, pSA1=args.pSA1,
+                                pUD=args.pUD)[:-4]
+    np.save(f"{name}.prob.npy", probabilities)
+    print(f"Expected defect edges: {probabilities.sum():.2f}")
+    print(f"Edge probabilities written to {name}.prob.npy")
+    if args.xml:
+        annotate_rr_graph(args.rr_graph, f"{name}_prob.xml", probabilities)
+        print(f"Annotated rr_graph written to {name}_prob.xml")
+
+
+def _cmd_exact(args):
+    from collections import Counter
+    from .distribution import device_distribution
+    from .rr_graph_parser import RRGraphStreamer
+
+    sinks, _ = RRGraphStreamer(args.rr_graph).scan_mux_edges()
+    mux_sizes = Counter(Counter(sinks).values())
+    print("p\tmean defects\tstd\t" + "\t".join(f"q{q}" for q in args.quantiles) +
+          "\tmean unusable\tP(unusable>0)")
+    for p in args.p:
+        defects, unusable = device_distribution(mux_sizes, CELL_TYPES[args.cell], p=p,
+                                                max_defect_edges=args.max_defects)
+        quantiles = "\t".join(str(defects.quantile(q)) for q in args.quantiles)
+        print(f"{p:.4f}\t{defects.mean():.2f}\t{defects.std():.2f}\t{quantiles}\t"
+              f"{unusable.mean():.2f}\t{unusable.tail(1):.4g}")
+
+
+def _cmd_design(args):
+    from collections import Counter
+    from .design_space import explore_block_sizes, write_design_report
+    from .memristor_errors import RandomErrorGen
+
+    if args.sizes:
+        mux_sizes = Counter(args.sizes)
+    elif args.rr_graph:
+        from .rr_graph_parser import RRGraphStreamer
+
+        sinks, _ = RRGraphStreamer(args.rr_graph).scan_mux_edges()
+        mux_sizes = Counter(Counter(sinks).values())
+    else:
+        raise SystemExit("design needs a rr_graph or --sizes")
+    reg = RandomErrorGen(pSA0=args.p, pSA1=args.p, pUD=args.p)
+    points = explore_block_sizes(mux_sizes, CELL_TYPES[args.cell], reg, args.iters,
+                                 seed=args.seed)
+    write_design_report(points, args.output, pareto_only=args.pareto_only)
+
+
+def _cmd_threshold(args):
+    from collections import Counter
+    from .threshold import EXACT, NOISY, max_tolerable_probability
+
+    if args.rr_graph:
+        from .rr_graph_parser import RRGraphStreamer
+
+        sinks, _ = RRGraphStreamer(args.rr_graph).scan_mux_edges()
+        mux_sizes = Counter(Counter(sinks).values())
+    else:
+        mux_sizes = Counter(args.sizes)
+    threshold = max_tolerable_probability(
+        args.target, CELL_TYPES[args.cell], args.metric, mux_sizes,
+        method=NOISY if args.noisy else EXACT, tolerance=args.tolerance,
+        num_trials=args.iters, seed=args.seed)
+    print(f"p = {threshold.p:.6g} in [{threshold.low:.6g}, {threshold.high:.6g}] "
+          f"({threshold.method}, {threshold.evaluations} evaluations)")
+
+
+def _add_parallel_arguments(parser):
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="run on a process pool with this many workers (0: in process)")
+    parser.add_argument("--chunk", type=int, default=1000,
+                        help="iterations per parallel work unit, or per batch of muxes held "
+                             "in memory by the object engine (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the parallel work units or of the bit-sliced engine "
+                             "(default: %(default)s)")
+
+
+def _add_cache_argument(parser):
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="reuse results of identical runs from a persistent cache "
+                             "(default directory: $FTRM_CACHE_DIR or ~/.cache/ftrm)")
+
+
+def build_parser():
+    """Return the argument parser of the ftrm command."""
+    parser = argparse.ArgumentParser(
+        prog="ftrm",
+        description="Fault simulation of memristor-based routing multiplexers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    cell_args = dict(choices=sorted(CELL_TYPES), default="ProtoVoterCell",
+                     help="memory cell architecture (default: %(default)s)")
+
+    standalone = subparsers.add_parser(
+        "standalone", help="simulate 12-input routing muxes (FaultSimulator.standalone_sim)")
+    standalone.add_argument("--cell", **cell_args)
+    standalone.add_argument("--iters", type=int, default=1000,
+                            help="number of muxes per probability (default: %(default)s)")
+    standalone.add_argument("--engine", choices=["object", "bitsliced"], default="object",
+                            help="RoutingMux objects or bit-sliced numpy planes, 64 trials "
+                                 "per word (default: %(default)s)")
+    standalone.add_argument("--progress", action="store_true",
+                            help="report the simulated muxes of every probability on stderr")
+    _add_grid_arguments(standalone, default_range=[0., .155, .005])
+    _add_parallel_arguments(standalone)
+    _add_cache_argument(standalone)
+    standalone.set_defaults(func=_cmd_standalone)
+
+    vtr = subparsers.add_parser(
+        "vtr", help="write a faulty copy of a VTR rr_graph (FaultSimulator.run_simulation)")
+    vtr.add_argument("rr_graph", help="rr_graph XML file")
+    vtr.add_argument("--cell", **cell_args)
+    vtr.add_argument("--p", type=float, default=None,
+                     help="equal probability for SA0, SA1 and UD")
+    vtr.add_argument("--pSA0", type=float, default=0.)
+    vtr.add_argument("--pSA1", type=float, default=0.)
+    vtr.add_argument("--pUD", type=float, default=0.)
+    engine = vtr.add_mutually_exclusive_group()
+    engine.add_argument("--stream", action="store_true",
+                        help="two-pass streaming simulation, memory bounded by the mux edges")
+    engine.add_argument("--sparse", action="store_true",
+                        help="draw only the defective memristors, fast at low probabilities")
+    engine.add_argument("--templates", action="store_true",
+                        help="simulate muxes of identical structure as bit-sliced batches")
+    vtr.add_argument("--seed", type=int, default=None,
+                     help="seed of the --sparse/--templates defect draws and of --cache runs")
+    _add_cache_argument(vtr)
+    vtr.add_argument("--delta", action="store_true",
+                     help="write only the removed edges instead of a faulty rr_graph copy")
+    vtr.set_defaults(func=_cmd_vtr)
+
+    materialize = subparsers.add_parser(
+        "materialize", help="apply a defect delta to its base rr_graph")
+    materialize.add_argument("delta", help="delta file written by ftrm vtr --delta")
+    materialize.add_argument("rr_graph", help="base rr_graph XML file")
+    materialize.add_argument("--out", default=None,
+                             help="faulty rr_graph file (default: delta name with .xml)")
+    materialize.add_argument("--no-check", action="store_true",
+                             help="skip the base rr_graph hash check")
+    materialize.set_defaults(func=_cmd_materialize)
+
+    cache = subparsers.add_parser("cache", help="show, shrink or clear the result cache")
+    cache.add_argument("--dir", default=None, help="cache directory (default: as in --cache)")
+    cache.add_argument("--max-mb", type=int, default=None,
+                       help="evict the least recently used entries down to this size")
+    cache.add_argument("--clear", action="store_true", help="remove every entry")
+    cache.set_defaults(func=_cmd_cache)
+
+    screen = subparsers.add_parser(
+        "screen", help="connectivity lost by a defect delta, without running the router")
+    screen.add_argument("rr_graph", help="base rr_graph XML file")
+    screen.add_argument("delta", help="delta file written by ftrm vtr --delta")
+    screen.add_argument("--max-unreachable-sinks", type=int, default=None, metavar="N",
+                        help="exit with an error status above N unreachable SINK nodes")
+    screen.set_defaults(func=_cmd_screen)
+
+    daemon = subparsers.add_parser(
+        "daemon", help="serve simulations on resident rr_graphs over a Unix socket")
+    daemon.add_argument("--socket", default=None,
+                        help="socket path (default: $FTRM_SOCKET or ftrm-<uid>.sock in /tmp)")
+    daemon.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: number of cores)")
+    daemon.set_defaults(func=_cmd_daemon)
+
+    sweep = subparsers.add_parser(
+        "sweep", help="unusable mux ratio by UD probability (main.py experiment)")
+    sweep.add_argument("--cells", nargs="+", choices=sorted(CELL_TYPES),
+                       default=["MemCell", "ProtoVoterCell"],
+                       help="cell architectures to compare (default: %(default)s)")
+    sweep.add_argument("--iters", type=int, default=10000,
+                       help="number of muxes per probability (default: %(default)s)")
+    sweep.add_argument("--plot", action="store_true",
+                       help="save the comparison plot to failure-percent.png")
+    sweep.add_argument("--paired", action="store_true",
+                       help="evaluate all cells on the same memristor draws and write paired "
+                            "differences with confidence intervals to comparison.rpt")
+    sweep.add_argument("--adaptive", type=int, default=None, metavar="MAX_POINTS",
+                       help="refine the grid (the initial coarse one) where the curves change "
+                            "or bend more than --tolerance, up to MAX_POINTS points")
+    sweep.add_argument("--tolerance", type=float, default=.01,
+                       help="change/curvature tolerance of --adaptive (default: %(default)s)")
+    _add_grid_arguments(sweep, default_range=[0., .155, .005])
+    _add_parallel_arguments(sweep)
+    sweep.set_defaults(func=_cmd_sweep)
+
+    annotate = subparsers.add_parser(
+        "annotate", help="exact defect probability of every edge, for fault-aware routing")
+    annotate.add_argument("rr_graph", help="rr_graph XML file")
+    annotate.add_argument("--cell", **cell_args)
+    annotate.add_argument("--p", type=float, default=None,
+                          help="equal probability for SA0, SA1 and UD")
+    annotate.add_argument("--pSA0", type=float, default=0.)
+    annotate.add_argument("--pSA1", type=float, default=0.)
+    annotate.add_argument("--pUD", type=float, default=0.)
+    annotate.add_argument("--xml", action="store_true",
+                          help="also write the rr_graph with a defect_probability attribute "
+                               "on every mux edge")
+    annotate.set_defaults(func=_cmd_annotate)
+
+    exact = subparsers.add_parser(
+        "exact", help="exact distribution of defect edges and unusable muxes of a rr_graph")
+    exact.add_argument("rr_graph", help="rr_graph XML file")
+    exact.add_argument("--cell", **cell_args)
+    exact.add_argument("--p", type=float, nargs="+", required=True,
+                       help="equal probabilities for SA0, SA1 and UD")
+    exact.add_argument("--quantiles", type=float, nargs="+", default=[.5, .99],
+                       help="defect edge quantiles to report (default: %(default)s)")
+    exact.add_argument("--max-defects", type=int, default=None,
+                       help="truncate the defect edge distribution above this value")
+    exact.set_defaults(func=_cmd_exact)
+
+    design = subparsers.add_parser(
+        "design", help="unusable and defect edge rates of every first stage block size")
+    design.add_argument("rr_graph", nargs="?", default=None,
+                        help="rr_graph XML file giving the mux sizes and their counts")
+    design.add_argument("--sizes", type=int, nargs="+", default=None,
+                        help="mux sizes to explore instead of those of a rr_graph")
+    design.add_argument("--cell", **cell_args)
+    design.add_argument("--p", type=float, required=True,
+                        help="equal probability for SA0, SA1 and UD")
+    design.add_argument("--iters", type=int, default=100000,
+                        help="trials per mux size, shared by all block sizes "
+                             "(default: %(default)s)")
+    design.add_argument("--seed", type=int, default=None)
+    design.add_argument("--pareto-only", action="store_true",
+                        help="only write the Pareto-optimal block sizes")
+    design.add_argument("--output", default="design_space.rpt",
+                        help="report file (default: %(default)s)")
+    design.set_defaults(func=_cmd_design)
+
+    threshold = subparsers.add_parser(
+        "threshold", help="highest defect probability keeping a rate below a target")
+    threshold.add_argument("rr_graph", nargs="?", default=None,
+                           help="rr_graph XML file giving the mux sizes and their counts")
+    threshold.add_argument("--sizes", type=int, nargs="+", default=[12],
+                           help="mux sizes when no rr_graph is given (default: %(default)s)")
+    threshold.add_argument("--cell", **cell_args)
+    threshold.add_argument("--metric", choices=["unusable", "defects"], default="unusable",
+                           help="unusable mux ratio or defect edge ratio (default: %(default)s)")
+    threshold.add_argument("--target", type=float, required=True,
+                           help="highest acceptable ratio, e.g. 0.01")
+    threshold.add_argument("--tolerance", type=float, default=1e-5,
+                           help="width of the probability bracket (default: %(default)s)")
+    threshold.add_argument("--noisy", action="store_true",
+                           help="bisect on simulations instead of the exact distribution")
+    threshold.add_argument("--iters", type=int, default=100000,
+                           help="initial trials per mux size of --noisy (default: %(default)s)")
+    threshold.add_argument("--seed", type=int, default=None)
+    threshold.set_defaults(func=_cmd_threshold)
+
+    aging = subparsers.add_parser(
+        "aging", help="time series of defects accumulating over the device lifetime")
+    aging.add_argument("rr_graph", help="rr_graph XML file")
+    aging.add_argument("--cell", **cell_args)
+    aging.add_argument("--p", type=float, default=0.,
+                       help="production defect probability at time 0 (default: %(default)s)")
+    for mode in ("SA0", "SA1", "UD"):
+        aging.add_argument(f"--rate-{mode}", dest=f"rate_{mode}", type=float, default=0.,
+                           help=f"{mode} failure rate per memristor and time unit")
+    aging.add_argument("--shape", type=float, default=1.,
+                       help="Weibull shape of the lifetime, >1 for wear-out (default: 1)")
+    aging.add_argument("--horizon", type=float, required=True, help="last sampled time")
+    aging.add_argument("--steps", type=int, default=100,
+                       help="number of sampling intervals (default: %(default)s)")
+    aging.add_argument("--seed", type=int, default=None, help="seed of the failure draws")
+    aging.set_defaults(func=_cmd_aging)
+
+    route = subparsers.add_parser(
+        "route", help="pipeline fault injection with an external router (e.g. the VTR fork)")
+    route.add_argument("rr_graph", help="rr_graph XML file")
+    route.add_argument("--command", required=True,
+                       help="router command template, formatted with {rr_graph}, "
+                            "{faulty_rr_graph}, {run} and {seed}")
+    route.add_argument("--cell", **cell_args)
+    route.add_argument("--p", type=float, nargs="+", required=True,
+                       help="equal probabilities for SA0, SA1 and UD")
+    route.add_argument("--repeats", type=int, default=1,
+                       help="runs per probability (default: %(default)s)")
+    route.add_argument("--seed", type=int, default=0,
+                       help="seed of the first run, incremented per run (default: %(default)s)")
+    route.add_argument("--jobs", type=int, default=None,
+                       help="concurrent injections and router runs (default: number of cores)")
+    route.add_argument("--memory-per-job", type=int, default=None, metavar="MB",
+                       help="expected peak memory per run, limits the number of jobs")
+    route.add_argument("--stream", action="store_true",
+                       help="inject faults with the streaming simulator")
+    route.add_argument("--discard-faulty", action="store_true",
+                       help="delete every faulty rr_graph once it has been routed")
+    route.add_argument("--results", default="route_results.tsv",
+                       help="results table (default: %(default)s)")
+    route.set_defaults(func=_cmd_route)
+
+    batch = subparsers.add_parser(
+        "batch", help="fault injection over the rr_graphs and probabilities of a manifest")
+    batch.add_argument("manifest", help="JSON list of {rr_graph, cell, probabilities, "
+                                        "repeats, seed} entries")
+    batch.add_argument("--jobs", type=int, default=None,
+                       help="worker processes shared by all stages (default: number of cores)")
+    batch.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                       help="parsed graphs held at once (default: available memory)")
+    batch.add_argument("--output", choices=["delta", "xml", "stats"], default="delta",
+                       help="file written per run (default: %(default)s)")
+    batch.add_argument("--results", default="batch_results.tsv",
+                       help="consolidated results table (default: %(default)s)")
+    batch.set_defaults(func=_cmd_batch)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the ftrm command."""
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
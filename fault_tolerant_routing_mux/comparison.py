@@ -0,0 +1,159 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Paired comparison of cell architectures on identical memristor draws.
+
+Every trial draws the memristors of a mux once, num_memristors of the largest cell
+per cell position, and every architecture reads the prefix it needs: a MemCell
+uses the first pair, a ProtoVoterCell the first pair for its main cell and the
+second for its control cell. The architectures therefore only differ by their
+logic, the per-trial differences of their outcomes are strongly correlated and
+the confidence intervals of the paired differences are much tighter than those of
+two independent runs.
+
+>>> rows = compare_architectures(np.arange(0, .155, .005), [MemCell, ProtoVoterCell], 10000)
+>>> write_comparison_report(rows)
+"""
+from statistics import NormalDist
+from typing import NamedTuple, Sequence
+import numpy as np
+
+from .control_cell import CELL_TYPES
+from .memristor_errors import Errors, RandomErrorGen
+from .mux import RoutingMux
+from .scheduler import EQUAL, STANDALONE
+
+METRICS = ("unusable", "defects")
+
+
+class PairedDifference(NamedTuple):
+    """Mean of the per-trial differences and its confidence interval."""
+
+    mean: float
+    low: float
+    high: float
+
+
+class ComparisonRow(NamedTuple):
+    """Rates of a metric for a baseline and another architecture, and their difference."""
+
+    p: float
+    metric: str
+    baseline: str
+    cell: str
+    baseline_rate: float
+    cell_rate: float
+    difference: PairedDifference
+
+
+def sample_memristor_errors(rng, reg: RandomErrorGen, shape):
+    """Draw an array of Errors codes following the distribution of reg."""
+    # Same intervals as RandomErrorGen.gen: UD, SA0, SA1, then FF
+    codes = np.array([Errors.UD, Errors.SA0, Errors.SA1, Errors.FF], dtype=np.int8)
+    return codes[np.searchsorted([reg.pUD, reg.pSA0, reg.pSA1], rng.random(shape), side="right")]
+
+
+def paired_difference(a, b, confidence: float = .95):
+    """Return the PairedDifference of a - b over paired trials (normal approximation)."""
+    d = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+    half_width = 0.
+    if d.size > 1:
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        half_width = z * d.std(ddof=1) / np.sqrt(d.size)
+    return PairedDifference(d.mean(), d.mean() - half_width, d.mean() + half_width)
+
+
+def paired_trials(mux_size: int, cell_types: Sequence, reg: RandomErrorGen, num_trials: int,
+                  rng=None):
+    """Evaluate every architecture on the same memristor draws.
+
+    :return: {cell name: (unusable flags, defect edge ratios)}, arrays of num_trials trials
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    muxes = [RoutingMux(0, list(range(mux_size)), cell_type) for cell_type in cell_types]
+    width = max(cell_type.num_memristors for cell_type in cell_types)
+    draws = sample_memristor_errors(rng, reg, (num_trials, len(muxes[0].cell_list), width))
+
+    outcomes = {cell_type.__name__: (np.zeros(num_trials, dtype=bool),
+                                     np.zeros(num_trials, dtype=float))
+                for cell_type in cell_types}
+    for t, trial in enumerate(draws.tolist()):
+        for cell_type, mux in zip(cell_types, muxes):
+            for cell, memristors in zip(mux.cell_list, trial):
+                for index in range(cell_type.num_memristors):
+                    cell.set_memristor(index, memristors[index])
+            mux.compute_block_errors()
+            unusable, defects = outcomes[cell_type.__name__]
+            unusable[t] = mux.get_mux_unusable()
+            defects[t] = sum(len(srcs) for srcs in mux.get_defect_edges().values()) / mux_size
+    return outcomes
+
+
+def compare_architectures(p_array: Sequence[float], cell_types: Sequence = None,
+                          num_iters: int = 10000, experiment: str = EQUAL, seed=None,
+                          confidence: float = .95):
+    """Compare architectures against the first one on identical draws, for every p.
+
+    :param cell_types: Cell classes, every registered CELL_TYPES if None
+    :param experiment: EQUAL (2-input mux, pUD = p as in main.simulate_failure_equal) or
+                       STANDALONE (12-input mux, pSA0 = pSA1 = pUD = p as in standalone_sim)
+    :param seed: Seed or numpy Generator of the draws
+    :return: List of ComparisonRow, per p, metric and non-baseline architecture
+    """
+    cell_types = list(CELL_TYPES.values()) if cell_types is None else list(cell_types)
+    if experiment not in (EQUAL, STANDALONE):
+        raise ValueError(f"unknown experiment {experiment!r}")
+    mux_size = 2 if experiment == EQUAL else 12
+    rng = np.random.default_rng(seed)
+    baseline = cell_types[0].__name__
+
+    rows = []
+    for p in p_array:
+        reg = RandomErrorGen(pUD=p) if experiment == EQUAL else \
+            RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
+        outcomes = paired_trials(mux_size, cell_types, reg, num_iters, rng)
+        for m, metric in enumerate(METRICS):
+            base = outcomes[baseline][m]
+            for cell_type in cell_types[1:]:
+                other = outcomes[cell_type.__name__][m]
+                rows.append(ComparisonRow(float(p), metric, baseline, cell_type.__name__,
+                                          float(base.mean()), float(other.mean()),
+                                          paired_difference(other, base, confidence)))
+    return rows
+
+
+def comparison_curves(rows, metric: str = "unusable"):
+    """Return {cell name: {str(p): rate}} of a metric, as simulate_failure_equal results."""
+    curves = dict()
+    for row in rows:
+        if row.metric == metric:
+            curves.setdefault(row.baseline, dict())[str(row.p)] = row.baseline_rate
+            curves.setdefault(row.cell, dict())[str(row.p)] = row.cell_rate
+    return curves
+
+
+def write_comparison_report(rows, path: str = "comparison.rpt", confidence: float = .95):
+    """Write the rates and paired differences (cell - baseline) as a tab separated table."""
+    with open(path, "w") as f:
+        f.write("Paired architecture comparison report\n")
+        f.write(f"Confidence level:\t{confidence * 100:.0f}%\n")
+        f.write("=" * 80)
+        f.write("\n\n")
+        f.write("p\tmetric\tbaseline\tcell\t% baseline\t% cell\t% difference\t% low\t% high\n")
+        for row in rows:
+            f.write(f"{row.p:.4f}\t{row.metric}\t{row.baseline}\t{row.cell}\t"
+                    f"{row.baseline_rate * 100:6.2f}\t{row.cell_rate * 100:6.2f}\t"
+                    f"{row.difference.mean * 100:6.2f}\t{row.difference.low * 100:6.2f}\t"
+                    f"{row.difference.high * 100:6.2f}\n")
+    print(f"Report written to {path}")
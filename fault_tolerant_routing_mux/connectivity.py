@@ -0,0 +1,179 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Connectivity pre-screen of faulty rr_graphs, before running the router.
+
+The rr_graph is held as CSR arrays (indptr, indices, as in scipy.sparse) built
+once from an RRGraphIndex. A faulty graph is the same arrays with a mask of
+removed edges, so every metric is a handful of vectorized numpy passes:
+
+- nodes that had drivers and lost all of them (e.g. IPINs and SINKs behind dead muxes),
+- nodes reachable from a SOURCE in the base graph that no longer are,
+- the number of weakly connected components (scipy.sparse.csgraph when installed,
+  numpy label propagation otherwise).
+
+>>> screen = ConnectivityScreen(RRGraphIndex(file_pathname))
+>>> report = screen.analyze(fault_sim.defect_edges)
+>>> report.unreachable, report.passes(max_unreachable={"SINK": 0})
+"""
+from typing import Dict, NamedTuple
+import numpy as np
+
+from .delta import _edge_keys
+
+
+class CSRGraph(NamedTuple):
+    """Directed graph over node rows, edges of row r are indices[indptr[r]:indptr[r + 1]].
+
+    edge_ids[k] is the position (in rr_graph file order) of the edge stored in slot k.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    edge_ids: np.ndarray
+
+    @classmethod
+    def from_edges(cls, src_rows, sink_rows, num_nodes: int):
+        """Build the CSR arrays of the edges src_rows -> sink_rows."""
+        order = np.argsort(src_rows, kind="stable")
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src_rows, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, np.asarray(sink_rows)[order], order)
+
+    def successors(self, rows, edge_mask=None):
+        """Return the successors of every row through the edges kept by edge_mask."""
+        starts, ends = self.indptr[rows], self.indptr[np.asarray(rows) + 1]
+        counts = ends - starts
+        # Slot indices of all the out-edges of rows, without a Python loop
+        slots = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        if edge_mask is not None:
+            slots = slots[edge_mask[self.edge_ids[slots]]]
+        return self.indices[slots]
+
+
+class ConnectivityReport(NamedTuple):
+    """Connectivity lost by a faulty graph, node counts are per node type name."""
+
+    removed_edges: int
+    undriven: Dict[str, int]
+    unreachable: Dict[str, int]
+    components_base: int
+    components_faulty: int
+
+    def passes(self, max_undriven: Dict[str, int] = None, max_unreachable: Dict[str, int] = None,
+               max_new_components: int = None):
+        """Return False if any count exceeds its limit (None: no limit)."""
+        for counts, limits in ((self.undriven, max_undriven),
+                               (self.unreachable, max_unreachable)):
+            for node_type, limit in (limits or {}).items():
+                if counts.get(node_type, 0) > limit:
+                    return False
+        return max_new_components is None or \
+            self.components_faulty - self.components_base <= max_new_components
+
+
+def _weak_components_numpy(num_nodes, a, b):
+    """Label weakly connected components by min-label hooking and pointer jumping."""
+    labels = np.arange(num_nodes)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[a], low)
+        np.minimum.at(hooked, labels[b], low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return np.unique(labels).size
+        labels = hooked
+
+
+def weak_components(num_nodes: int, src_rows, sink_rows):
+    """Return the number of weakly connected components of a graph given by its edges."""
+    try:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        return _weak_components_numpy(num_nodes, np.asarray(src_rows), np.asarray(sink_rows))
+    graph = coo_matrix((np.ones(len(src_rows), dtype=np.int8), (src_rows, sink_rows)),
+                       shape=(num_nodes, num_nodes))
+    return connected_components(graph, directed=True, connection="weak")[0]
+
+
+class ConnectivityScreen():
+    """CSR connectivity model of a rr_graph, analyzing faulty versions given by edge masks.
+
+    :param index: RRGraphIndex of the base rr_graph
+    """
+
+    def __init__(self, index):
+        """Build the CSR arrays and the base graph metrics."""
+        self.index = index
+        self.num_nodes = index.node_id.size
+        self.src_rows = index.node_rows(index.edge_src)
+        self.sink_rows = index.node_rows(index.edge_sink)
+        self.csr = CSRGraph.from_edges(self.src_rows, self.sink_rows, self.num_nodes)
+        self.sources = np.flatnonzero(index.node_type == index.node_type_code("SOURCE")) \
+            if "SOURCE" in index.node_types else np.zeros(0, dtype=np.int64)
+        self.in_degree = np.bincount(self.sink_rows, minlength=self.num_nodes)
+        self.reachable_base = self.reachable()
+        self.components_base = weak_components(self.num_nodes, self.src_rows, self.sink_rows)
+
+    def reachable(self, edge_mask=None):
+        """Return the mask of nodes reachable from any SOURCE through the kept edges."""
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        visited[self.sources] = True
+        frontier = self.sources
+        while frontier.size:
+            successors = self.csr.successors(frontier, edge_mask)
+            frontier = np.unique(successors[~visited[successors]])
+            visited[frontier] = True
+        return visited
+
+    def defect_mask(self, defect_edges: Dict):
+        """Return the mask of removed edges, every edge joining a defect (src, sink) pair."""
+        srcs, sinks = self.index.defect_edge_arrays(defect_edges)
+        return np.isin(_edge_keys(self.index.edge_src, self.index.edge_sink),
+                       _edge_keys(srcs, sinks))
+
+    def _by_type(self, mask):
+        counts = np.bincount(self.index.node_type[mask].astype(np.intp),
+                             minlength=len(self.index.node_types))
+        return {name: int(c) for name, c in zip(self.index.node_types, counts) if c}
+
+    def analyze(self, defect_edges: Dict = None, removed=None):
+        """Return the ConnectivityReport of the graph without the defect edges.
+
+        :param defect_edges: {sink: {sources}} as in FaultSimulator.defect_edges
+        :param removed: Alternatively, the removed edges as a mask or as edge positions
+                        (e.g. Delta.index of a defect delta)
+        """
+        if removed is None:
+            removed = self.defect_mask(defect_edges or {})
+        removed = np.asarray(removed)
+        if removed.dtype != bool:
+            mask = np.zeros(self.src_rows.size, dtype=bool)
+            mask[removed] = True
+            removed = mask
+        kept = ~removed
+
+        in_degree = np.bincount(self.sink_rows[kept], minlength=self.num_nodes)
+        undriven = (self.in_degree > 0) & (in_degree == 0)
+        unreachable = self.reachable_base & ~self.reachable(kept)
+        components = weak_components(self.num_nodes, self.src_rows[kept], self.sink_rows[kept])
+        return ConnectivityReport(int(removed.sum()), self._by_type(undriven),
+                                  self._by_type(unreachable), int(self.components_base),
+                                  int(components))
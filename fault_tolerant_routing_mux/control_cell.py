@@ -23,6 +23,15 @@ logic as explored in this work.
 from .memristor_errors import Errors
 
 
+def _lut_distribution(error_LUT, row_distribution, col_distribution):
+    """Return the distribution of error_LUT[row][col] for independent row and col errors."""
+    distribution = [0.] * 4
+    for row, p_row in enumerate(row_distribution):
+        for col, p_col in enumerate(col_distribution):
+            distribution[error_LUT[row][col]] += p_row * p_col
+    return distribution
+
+
 class MemCell():
     """Standard representation of a single 2T2R memory cell."""
 
@@ -41,10 +50,32 @@ class MemCell():
         self.pullUpMemristor = pullUpError
         self.pullDownMemristor = pullDownError
 
+    num_memristors = 2
+
     def get_cell_error(self):
         """Return the cell error."""
         return MemCell.error_LUT[self.pullDownMemristor][self.pullUpMemristor]
 
+    def get_memristor(self, index):
+        """Return the error of memristor index, in set_errors order (pullUp, pullDown)."""
+        return self.pullDownMemristor if index else self.pullUpMemristor
+
+    def set_memristor(self, index, error):
+        """Set the error of a single memristor, in set_errors order (pullUp, pullDown)."""
+        if index:
+            self.pullDownMemristor = error
+        else:
+            self.pullUpMemristor = error
+
+    @classmethod
+    def error_distribution(cls, memristor_distribution):
+        """Return the probability of each cell error, indexed by Errors code.
+
+        :param memristor_distribution: Probability of each error of a single memristor,
+                                       e.g. RandomErrorGen.get_distribution()
+        """
+        return _lut_distribution(cls.error_LUT, memristor_distribution, memristor_distribution)
+
 
 class ProtoVoterCell():
     """Representation of a simple selector control cell.
@@ -67,8 +98,33 @@ class ProtoVoterCell():
         self.mainCell.set_errors(*mainCellErrors)
         self.ctrCell.set_errors(*crtCellErrors)
 
+    num_memristors = 4
+
     def get_cell_error(self):
         """Return cell error."""
         mainCellError = self.mainCell.get_cell_error()
         ctrCellError = self.ctrCell.get_cell_error()
         return ProtoVoterCell.error_LUT[mainCellError][ctrCellError]
+
+    def get_memristor(self, index):
+        """Return the error of memristor index: main cell memristors, then control cell ones."""
+        cell = self.ctrCell if index >= MemCell.num_memristors else self.mainCell
+        return cell.get_memristor(index % MemCell.num_memristors)
+
+    def set_memristor(self, index, error):
+        """Set the error of a single memristor, indexed as in get_memristor."""
+        cell = self.ctrCell if index >= MemCell.num_memristors else self.mainCell
+        cell.set_memristor(index % MemCell.num_memristors, error)
+
+    @classmethod
+    def error_distribution(cls, memristor_distribution):
+        """Return the probability of each cell error, indexed by Errors code."""
+        memcell_distribution = MemCell.error_distribution(memristor_distribution)
+        return _lut_distribution(cls.error_LUT, memcell_distribution, memcell_distribution)
+
+
+# Cell architectures selectable by name, e.g. from the command line
+CELL_TYPES = {
+    "MemCell": MemCell,
+    "ProtoVoterCell": ProtoVoterCell,
+}
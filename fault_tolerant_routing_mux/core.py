@@ -13,15 +13,22 @@
 # limitations under the License.
 # =============================================================================
 """Provides core simulation class to load and overwrite routing resource files."""
-from collections import Counter
+import random
 from datetime import datetime
 from pathlib import Path
-from typing import Dict
-import numpy as np
+from typing import Callable, Dict, Sequence
 
 from .mux import RoutingMux
 from .rr_graph_parser import RRGraphParser
 from .memristor_errors import Errors, RandomErrorGen
+from .stats import SimulationStats
+
+
+def faulty_rr_graph_name(rr_graph_name: str, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0.):  # noqa: E501, E252
+    """Return the faulty rr_graph file name given the rr_graph name without .xml."""
+    if p is not None:
+        return f"{rr_graph_name}_{p*100:02.1f}.xml"
+    return f"{rr_graph_name}_{pSA0*100:05.2f}_{pSA1*100:05.2f}_{pUD*100:05.2f}.xml"
 
 
 class FaultSimulator():
@@ -46,82 +53,107 @@ class FaultSimulator():
     def __init__(self, cell_type, rr_graph_file: Path, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0.):  # noqa: E501, E252
         """Wrap RRGraphParser and RandomErrorGen."""
         self.rrg = RRGraphParser(rr_graph_file)
+        self.base_rr_graph_file = rr_graph_file
         self.total_edge_count = self.get_total_edge_count()
         self.mux_edge_count = self.get_mux_edge_count(self.rrg.get_mux_dict())
         self.muxes = self.gen_routing_muxes(self.rrg.get_mux_dict(), cell_type)
+        self.num_muxes = len(self.muxes)
         self.defect_edges = dict()
         # [:-4] gets name up to extension (.xml)
         self.rr_graph_file = str(rr_graph_file)[:-4]
         self.out_file = rr_graph_file.parents[0] / "fault_sim.out"
         self.cell_type = cell_type
+        self.set_probabilities(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+
+    def set_probabilities(self, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0.):  # noqa: E501, E252
+        """Set error probabilities and the matching faulty rr_graph file name."""
         if p is not None:  # Assume all equal probabilites
             self.reg = RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
-            self.faulty_rr_graph_file = f"{self.rr_graph_file}_{p*100:02.1f}.xml"
         else:
             self.reg = RandomErrorGen(pSA0=pSA0, pSA1=pSA1, pUD=pUD)
-            self.faulty_rr_graph_file = f"{self.rr_graph_file}_{pSA0*100:05.2f}_{pSA1*100:05.2f}_{pUD*100:05.2f}.xml"  # noqa E501
+        self.faulty_rr_graph_file = faulty_rr_graph_name(self.rr_graph_file, p, pSA0, pSA1, pUD)
 
-    def run_simulation(self):
+    def simulate(self):
+        """Sample defects of every mux and return the SimulationStats, without writing files."""
         # Setup
-        cell_errors = list()
+        stats = SimulationStats()
         defect_edges = dict()
-        unusable_muxes = list()
         sim_start = datetime.now()
 
         # Simulation itself
         for mux in self.muxes:
             mux.set_errors(self.reg)
             mux.compute_block_errors()
-            cell_errors += mux.get_cell_errors()
-            defect_edges.update(mux.get_defect_edges())
-            unusable_muxes.append(mux.get_mux_unusable())
+            mux_defect_edges = mux.get_defect_edges()
+            defect_edges.update(mux_defect_edges)
+            stats.add_mux(mux, mux_defect_edges)
+
+        self.sim_time = (datetime.now() - sim_start).total_seconds()
+        self.stats = stats
+        self.unusable_count = stats.unusable.unusable
+        self.defect_edges = defect_edges
+        self.cell_errors_counter = stats.cell_errors
+        self.defect_edge_count = self.get_mux_edge_count(self.defect_edges)
+        return stats
+
+    def run_simulation(self, delta: bool = False):
+        """Sample defects of every mux and write the faulty rr_graph and the report.
+
+        :param delta: Write only the removed edges to self.delta_file (see delta.py)
+                      instead of a full faulty rr_graph
+        """
+        self.simulate()
 
         # Teardown
         print("Simulation ended. Parsing results.", end="")
         sim_end = datetime.now()
-        self.sim_time = (sim_end - sim_start).total_seconds()
-        self.unusable_count = sum(unusable_muxes)
-        self.defect_edges = defect_edges
-        self.cell_errors_counter = Counter(cell_errors)
-        self.defect_edge_count = self.get_mux_edge_count(self.defect_edges)
         print(".", end="")
 
-        self._write_defect_rr_graph_file()
+        if delta:
+            self._write_delta_file()
+        else:
+            self._write_defect_rr_graph_file()
         print(".")
         self.report_time = (datetime.now() - sim_end).total_seconds()
         self._write_report()
 
-    def standalone_sim(p_array: np.array, num_iters: int, cell_type):
+    def standalone_sim(p_array: Sequence[float], num_iters: int, cell_type, chunk_size: int = None, progress: Callable = None, seed=None):  # noqa: E501
+        """Simulate num_iters 12-input muxes per probability, chunk_size muxes at a time.
+
+        :param chunk_size: Muxes built and released together, memory does not depend on
+                           num_iters; chunks draw in the same order as a single batch, so the
+                           results do not depend on chunk_size
+        :param progress: Called as progress(p, done, num_iters) after every chunk
+        :param seed: Seed of the random module state, the current state if None
+        """
         results = dict()
+        if seed is not None:
+            random.seed(seed)
+        chunk_size = chunk_size or max(num_iters, 1)
 
         start = datetime.now()
         for p in p_array:
-            defect_edges = list()
-            cell_errors = list()
+            stats = SimulationStats()
             reg = RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
-            # Simulation
-            sim_muxes = [RoutingMux(
-                            sink_node=i,
-                            src_node_list=[src_node for src_node in range(i * 12, i * 12 + 12)],
-                            cell_type=cell_type)
-                         for i in range(num_iters)]
-            for mux in sim_muxes:
-                mux.set_errors(reg)
-                mux.compute_block_errors()
-                defect_edges += mux.get_defect_edges().values()
-                cell_errors += mux.get_cell_errors()
-
-            # Results
-            res_unusable = sum([m.get_mux_unusable() for m in sim_muxes]) / num_iters
-            res_cell_errors = Counter(cell_errors)
-            res_defect_edges = sum([len(edges) for edges in defect_edges])
-            res_defect_edges = res_defect_edges / (12 * num_iters)
-            results[p] = (res_unusable,
-                          res_defect_edges,
-                          res_cell_errors[Errors.SA0],
-                          res_cell_errors[Errors.SA1],
-                          res_cell_errors[Errors.UD]
-                          )
+            for first in range(0, num_iters, chunk_size):
+                last = min(first + chunk_size, num_iters)
+                # Simulation
+                sim_muxes = [RoutingMux(
+                                sink_node=i,
+                                src_node_list=list(range(i * 12, i * 12 + 12)),
+                                cell_type=cell_type)
+                             for i in range(first, last)]
+                for mux in sim_muxes:
+                    mux.set_errors(reg)
+                    mux.compute_block_errors()
+                    stats.add_mux(mux)
+                # Only the accumulators outlive the chunk
+                del sim_muxes
+                if progress is not None:
+                    progress(p, last, num_iters)
+
+            # Results: (% unusable, % defect edges, # SA0, # SA1, # UD)
+            results[p] = stats.summary()
 
         sim_time = (datetime.now() - start).total_seconds()
         FaultSimulator._write_standalone_report(cell_type, num_iters, sim_time, results)
@@ -179,12 +211,12 @@ class FaultSimulator():
             f.write("\n\n")
 
             # Table
-            unusable = self.unusable_count / len(self.muxes) * 100
+            unusable = self.unusable_count / self.num_muxes * 100
             defect = self.defect_edge_count / self.mux_edge_count * 100
             # print(f"FF: {self.cell_errors_counter[Errors.FF]}")
-            err_sa0 = self.cell_errors_counter[Errors.SA0] / sum(self.cell_errors_counter.values()) * 100 # noqa E221
-            err_sa1 = self.cell_errors_counter[Errors.SA1] / sum(self.cell_errors_counter.values()) * 100 # noqa E221
-            err_ud  = self.cell_errors_counter[Errors.UD]  / sum(self.cell_errors_counter.values()) * 100 # noqa E221
+            err_sa0 = self.cell_errors_counter[Errors.SA0] / self.cell_errors_counter.total() * 100 # noqa E221
+            err_sa1 = self.cell_errors_counter[Errors.SA1] / self.cell_errors_counter.total() * 100 # noqa E221
+            err_ud  = self.cell_errors_counter[Errors.UD]  / self.cell_errors_counter.total() * 100 # noqa E221
 
             f.write(f"# SA0:\t\t\t\t{self.cell_errors_counter[Errors.SA0]:6d}\n")
             f.write(f"# SA1:\t\t\t\t{self.cell_errors_counter[Errors.SA1]:6d}\n")
@@ -203,6 +235,12 @@ class FaultSimulator():
     def _write_defect_rr_graph_file(self):
         self.rrg.update_rr_graph(self.faulty_rr_graph_file, self.defect_edges)
 
+    def _write_delta_file(self):
+        from .delta import write_delta
+
+        self.delta_file = f"{self.faulty_rr_graph_file[:-4]}.delta"
+        write_delta(self.delta_file, self.base_rr_graph_file, self.defect_edges)
+
     def get_mux_edge_count(self, mux_dict: Dict):
         """Return number of edges from a dictionary of {sink: [source nodes]}."""
         return sum([len(edges) for edges in mux_dict.values()])
@@ -0,0 +1,363 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Long-lived simulation daemon keeping parsed rr_graphs and their muxes in memory.
+
+The daemon listens on a Unix socket and speaks newline-delimited JSON. Every
+request carries an "id" and an "op"; requests of a connection run concurrently
+and their responses come back as soon as each one completes:
+
+    {"id": 1, "op": "simulate", "rr_graph": "/abs/rr_graph.xml", "cell": "MemCell",
+     "p": 0.003, "seed": 7, "output": "delta"}
+    {"id": 1, "status": "queued"}
+    {"id": 1, "status": "done", "stats": {...}, "output_file": "...", ...}
+
+Simulations run on a pool of worker processes, each one running a request at a
+time. A worker keeps the FaultSimulator (parsed rr_graph and RoutingMux list) and
+the edge arrays of every graph it has served, and requests are sent to an idle
+worker already holding their graph when there is one. Output modes are "stats"
+(no file), "delta" and "xml"; faulty rr_graphs are written from the delta with
+materialize(), so the resident XML tree is never modified.
+
+>>> ftrm daemon --socket /tmp/ftrm.sock --workers 4 &
+>>> with DaemonClient("/tmp/ftrm.sock") as client:
+...     fault_sim = RemoteFaultSimulator(MemCell, Path("rr_graph.xml"), p=0.003, client=client)
+...     fault_sim.run_simulation(delta=True, seed=1)
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from .control_cell import CELL_TYPES
+
+OUTPUT_MODES = ("stats", "delta", "xml")
+
+# Worker process state: {(rr_graph path, mtime, cell): (FaultSimulator, EdgeArrays, sha256)}
+_RESIDENT = dict()
+
+
+def default_socket_path():
+    """Return $FTRM_SOCKET, or a per-user socket in the temporary directory."""
+    return os.environ.get("FTRM_SOCKET",
+                          os.path.join(tempfile.gettempdir(), f"ftrm-{os.getuid()}.sock"))
+
+
+def _resident(rr_graph, cell):
+    """Return the resident graph of this worker, loading it on first use."""
+    from .core import FaultSimulator
+    from .delta import file_sha256
+    from .edge_scanner import scan_rr_edges
+
+    path = os.path.realpath(rr_graph)
+    key = (path, os.stat(rr_graph).st_mtime_ns, cell)
+    if key not in _RESIDENT:
+        # The graph was rewritten: drop the stale copies before loading the new one
+        for stale in [k for k in _RESIDENT if k[0] == path and k[2] == cell]:
+            del _RESIDENT[stale]
+        fault_sim = FaultSimulator(CELL_TYPES[cell], Path(rr_graph))
+        _RESIDENT[key] = (fault_sim, scan_rr_edges(rr_graph, workers=0), file_sha256(rr_graph))
+    return _RESIDENT[key]
+
+
+def load_graph(rr_graph, cell):
+    """Worker task: make a graph resident and return its sizes."""
+    fault_sim = _resident(rr_graph, cell)[0]
+    return {"num_muxes": fault_sim.num_muxes, "mux_edge_count": fault_sim.mux_edge_count,
+            "total_edge_count": fault_sim.total_edge_count}
+
+
+def run_request(request):
+    """Worker task: simulate one request on a resident graph and return the response."""
+    from .core import faulty_rr_graph_name
+    from .delta import materialize, write_delta
+
+    fault_sim, edges, sha256 = _resident(request["rr_graph"], request["cell"])
+    p, pSA0, pSA1, pUD = (request.get(name, default) for name, default in
+                          (("p", None), ("pSA0", 0.), ("pSA1", 0.), ("pUD", 0.)))
+    fault_sim.set_probabilities(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+    if request.get("seed") is not None:
+        random.seed(request["seed"])
+    stats = fault_sim.simulate()
+    response = {"stats": stats.to_dict(), "unusable_count": fault_sim.unusable_count,
+                "defect_edge_count": fault_sim.defect_edge_count,
+                "sim_time": fault_sim.sim_time, **load_graph(request["rr_graph"], request["cell"])}
+
+    output = request.get("output", "xml")
+    if output != "stats":
+        write_start = datetime.now()
+        rr_graph_name = str(request["rr_graph"])[:-4]
+        faulty_file = request.get("output_file") or \
+            faulty_rr_graph_name(rr_graph_name, p, pSA0, pSA1, pUD)
+        if output == "delta":
+            write_delta(faulty_file, request["rr_graph"], fault_sim.defect_edges, edges, sha256)
+        else:
+            delta_file = f"{faulty_file}.{os.getpid()}.delta"
+            write_delta(delta_file, request["rr_graph"], fault_sim.defect_edges, edges, sha256)
+            materialize(delta_file, request["rr_graph"], faulty_file, check_hash=False)
+            os.remove(delta_file)
+        fault_sim.out_file = Path(request.get("report_file") or
+                                  Path(request["rr_graph"]).parents[0] / "fault_sim.out")
+        fault_sim.report_time = (datetime.now() - write_start).total_seconds()
+        fault_sim._write_report()
+        response.update(output_file=faulty_file, report_file=str(fault_sim.out_file))
+    return response
+
+
+class SimulationDaemon():
+    """asyncio server dispatching simulation requests to resident worker processes.
+
+    :param socket_path: Unix socket to listen on, default_socket_path() if None
+    :param workers: Number of worker processes (default: number of cores)
+    """
+
+    def __init__(self, socket_path=None, workers: int = None):
+        """Start the worker processes."""
+        self.socket_path = socket_path or default_socket_path()
+        workers = workers or os.cpu_count()
+        self.pools = [ProcessPoolExecutor(max_workers=1) for _ in range(workers)]
+        self.resident = [set() for _ in range(workers)]
+        self.busy = [0] * workers
+
+    def _pick(self, graph):
+        """Prefer an idle worker holding the graph, then any idle one, then the least busy."""
+        workers = range(len(self.pools))
+        idle = [i for i in workers if not self.busy[i]]
+        warm = [i for i in idle if graph in self.resident[i]]
+        if warm or idle:
+            return (warm or idle)[0]
+        warm = [i for i in workers if graph in self.resident[i]]
+        return min(warm or workers, key=self.busy.__getitem__)
+
+    async def _run(self, worker, graph, function, *args):
+        self.busy[worker] += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.pools[worker], function, *args)
+        finally:
+            self.busy[worker] -= 1
+        # Only a successful task leaves the graph loaded in the worker
+        self.resident[worker].add(graph)
+        return result
+
+    @staticmethod
+    async def _send(message, writer, lock):
+        """Write one response line; the lock serializes drain() across request tasks."""
+        async with lock:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+
+    async def _answer(self, request, writer, lock):
+        op = request.get("op")
+        response = {"id": request.get("id")}
+        try:
+            if op == "simulate":
+                if request.get("output", "xml") not in OUTPUT_MODES:
+                    raise ValueError(f"output must be one of {OUTPUT_MODES}")
+                graph = (os.path.realpath(request["rr_graph"]), request["cell"])
+                await self._send(dict(response, status="queued"), writer, lock)
+                response.update(await self._run(self._pick(graph), graph, run_request, request))
+            elif op == "load":
+                # Every worker holds the graph so that any of them can serve it
+                graph = (os.path.realpath(request["rr_graph"]), request["cell"])
+                sizes = await asyncio.gather(*(
+                    self._run(i, graph, load_graph, request["rr_graph"], request["cell"])
+                    for i in range(len(self.pools))))
+                response.update(sizes[0])
+            elif op == "ping":
+                pass
+            elif op == "shutdown":
+                self.stopped.set()
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            response["status"] = "done"
+        except Exception as e:  # Reported to the client, the daemon keeps serving
+            response.update(status="error", error=f"{type(e).__name__}: {e}")
+        await self._send(response, writer, lock)
+
+    async def _handle(self, reader, writer):
+        tasks = set()
+        lock = asyncio.Lock()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                await self._send({"status": "error", "error": str(e)}, writer, lock)
+                continue
+            task = asyncio.ensure_future(self._answer(request, writer, lock))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        writer.close()
+
+    async def serve(self):
+        """Serve until a shutdown request."""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        try:
+            await self.stopped.wait()
+            server.close()
+        finally:
+            for pool in self.pools:
+                pool.shutdown()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def run(self):
+        """Blocking entry point of the daemon."""
+        print(f"Listening on {self.socket_path}")
+        asyncio.run(self.serve())
+
+
+class DaemonError(RuntimeError):
+    """A request failed in the daemon."""
+
+
+class DaemonClient():
+    """Blocking client of SimulationDaemon, requests may be pipelined with submit().
+
+    >>> ids = [client.submit(rr_graph=path, cell="MemCell", p=p, seed=1) for p in grid]
+    >>> for response in client.results():  # in completion order
+    ...     print(response["id"], response["unusable_count"])
+    """
+
+    def __init__(self, socket_path=None, timeout: float = None):
+        """Connect to the daemon."""
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path or default_socket_path())
+        self.stream = self.socket.makefile("rb")
+        self.ids = itertools.count()
+        self.pending = set()
+        self.ready = []  # Responses received while waiting for another request
+
+    def submit(self, op: str = "simulate", **fields):
+        """Send a request without waiting for it and return its id."""
+        request_id = next(self.ids)
+        self.socket.sendall(json.dumps(dict(fields, id=request_id, op=op)).encode() + b"\n")
+        self.pending.add(request_id)
+        return request_id
+
+    def _receive(self):
+        """Return the next final (not "queued") response."""
+        while True:
+            line = self.stream.readline()
+            if not line:
+                raise DaemonError("connection closed by the daemon")
+            response = json.loads(line)
+            if "id" not in response:
+                # Only malformed request lines get an answer without id
+                raise DaemonError(response.get("error", "response without id"))
+            if response["status"] != "queued":
+                return response
+
+    def results(self):
+        """Yield the final response of every pending request as soon as it arrives."""
+        while self.pending:
+            response = self.ready.pop(0) if self.ready else self._receive()
+            self.pending.discard(response["id"])
+            yield response
+
+    def request(self, op: str = "simulate", **fields):
+        """Send a request and wait for its response, raise DaemonError if it failed."""
+        request_id = self.submit(op, **fields)
+        response = self._receive()
+        while response["id"] != request_id:
+            self.ready.append(response)
+            response = self._receive()
+        self.pending.discard(request_id)
+        if response["status"] == "error":
+            raise DaemonError(response["error"])
+        return response
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RemoteFaultSimulator():
+    """FaultSimulator counterpart running on a daemon, the graph is parsed there once.
+
+    >>> fault_sim = RemoteFaultSimulator(ProtoVoterCell, rr_graph_file=file_pathname, p=0.003)
+    >>> fault_sim.run_simulation(seed=1)
+    >>> fault_sim.get_faulty_rr_graph()
+    """
+
+    def __init__(self, cell_type, rr_graph_file: Path, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0., client: DaemonClient=None):  # noqa: E501, E252
+        """Make the rr_graph resident in the daemon."""
+        from .core import faulty_rr_graph_name
+
+        self._faulty_rr_graph_name = faulty_rr_graph_name
+        self.client = client or DaemonClient()
+        self.cell_type = cell_type
+        self.base_rr_graph_file = Path(rr_graph_file).resolve()
+        self.rr_graph_file = str(self.base_rr_graph_file)[:-4]
+        self.out_file = self.base_rr_graph_file.parents[0] / "fault_sim.out"
+        sizes = self.client.request("load", rr_graph=str(self.base_rr_graph_file),
+                                    cell=cell_type.__name__)
+        self.num_muxes = sizes["num_muxes"]
+        self.mux_edge_count = sizes["mux_edge_count"]
+        self.total_edge_count = sizes["total_edge_count"]
+        self.set_probabilities(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+
+    def set_probabilities(self, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0.):  # noqa: E501, E252
+        """Set error probabilities and the matching faulty rr_graph file name."""
+        self.probabilities = dict(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+        self.faulty_rr_graph_file = self._faulty_rr_graph_name(self.rr_graph_file, p, pSA0,
+                                                               pSA1, pUD)
+
+    def run_simulation(self, delta: bool = False, seed: int = None, output: str = None):
+        """Run FaultSimulator.run_simulation in the daemon and fetch its results.
+
+        :param seed: Seed of the random state of the run, None continues the worker state
+        :param output: "stats" to skip writing files, otherwise chosen by delta
+        """
+        from .stats import SimulationStats
+
+        output = output or ("delta" if delta else "xml")
+        output_file = f"{self.faulty_rr_graph_file[:-4]}.delta" if output == "delta" \
+            else self.faulty_rr_graph_file
+        response = self.client.request(
+            rr_graph=str(self.base_rr_graph_file), cell=self.cell_type.__name__, seed=seed,
+            output=output, output_file=output_file, report_file=str(self.out_file),
+            **self.probabilities)
+        self.stats = SimulationStats.from_dict(response["stats"])
+        self.cell_errors_counter = self.stats.cell_errors
+        self.unusable_count = response["unusable_count"]
+        self.defect_edge_count = response["defect_edge_count"]
+        self.sim_time = response["sim_time"]
+        if output == "delta":
+            self.delta_file = output_file
+        return self.stats
+
+    def get_faulty_rr_graph(self):
+        return self.faulty_rr_graph_file
@@ -0,0 +1,143 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Compact defect deltas instead of full faulty rr_graph copies.
+
+A delta only lists the edges removed from a base rr_graph. It is a plain text file,
+simple to read from C++ (e.g. with fscanf) in the VTR fork:
+
+    # ftrm defect delta
+    base_sha256 <hex digest of the base rr_graph file>
+    base_edges <number of <edge> elements in the base rr_graph>
+    removed <number of removed edges>
+    <index> <src_node> <sink_node>
+    ...
+
+Removed edges are sorted by index, their position among the <edge> elements of the
+base file (0 based). materialize() rebuilds the faulty rr_graph on demand.
+
+>>> fault_sim.run_simulation(delta=True)
+>>> materialize(fault_sim.delta_file, file_pathname, "faulty_rr_graph.xml")
+"""
+import hashlib
+import mmap
+from typing import Dict, NamedTuple
+import numpy as np
+
+from .edge_scanner import UnexpectedLayout, _section, scan_rr_edges
+
+DELTA_HEADER = "# ftrm defect delta"
+
+
+class Delta(NamedTuple):
+    base_sha256: str
+    base_edges: int
+    index: np.ndarray
+    src: np.ndarray
+    sink: np.ndarray
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _edge_keys(srcs, sinks):
+    return (np.asarray(sinks, dtype=np.int64) << 32) | np.asarray(srcs, dtype=np.int64)
+
+
+def defect_edge_indices(edges, defect_edges: Dict):
+    """Return the sorted indices of edges whose (src, sink) pair is defect.
+
+    Same rule as RRGraphParser.update_rr_graph: every edge joining a defect pair is removed.
+    :param edges: EdgeArrays of the base rr_graph
+    :param defect_edges: {sink: {sources}} as in FaultSimulator.defect_edges
+    """
+    sinks = np.fromiter((sink for sink, srcs in defect_edges.items() for _ in srcs),
+                        dtype=np.int64)
+    srcs = np.fromiter((src for srcs in defect_edges.values() for src in srcs), dtype=np.int64)
+    return np.flatnonzero(np.isin(_edge_keys(edges.src, edges.sink), _edge_keys(srcs, sinks)))
+
+
+def write_delta(delta_file, rr_graph_file, defect_edges: Dict, edges=None, base_sha256=None):
+    """Write the delta removing defect_edges from rr_graph_file.
+
+    :param edges: EdgeArrays of rr_graph_file, scanned if not given
+    :param base_sha256: Digest of rr_graph_file, computed if not given
+    """
+    edges = scan_rr_edges(rr_graph_file) if edges is None else edges
+    base_sha256 = file_sha256(rr_graph_file) if base_sha256 is None else base_sha256
+    index = defect_edge_indices(edges, defect_edges)
+    with open(delta_file, "w") as f:
+        f.write(f"{DELTA_HEADER}\n")
+        f.write(f"base_sha256 {base_sha256}\n")
+        f.write(f"base_edges {edges.src.size}\n")
+        f.write(f"removed {index.size}\n")
+        np.savetxt(f, np.column_stack((index, edges.src[index], edges.sink[index])), fmt="%d")
+
+
+def read_delta(delta_file):
+    """Load a delta written by write_delta."""
+    with open(delta_file) as f:
+        if f.readline().rstrip("\n") != DELTA_HEADER:
+            raise ValueError(f"{delta_file} is not a defect delta")
+        header = dict(f.readline().split() for _ in range(3))
+        removed = int(header["removed"])
+        rows = np.loadtxt(f, dtype=np.int64, ndmin=2) if removed else np.zeros((0, 3), np.int64)
+    if rows.shape[0] != removed:
+        raise ValueError(f"{delta_file} is truncated")
+    return Delta(header["base_sha256"], int(header["base_edges"]), *rows.T)
+
+
+def _edge_starts(data):
+    """Return the offsets of every <edge tag in a buffer."""
+    candidates = np.flatnonzero(data[:-5] == ord("<"))
+    tag = np.frombuffer(b"edge", dtype=np.uint8)
+    is_edge = (data[candidates[:, None] + np.arange(1, 5)] == tag).all(axis=1)
+    after = data[candidates + 5]
+    is_edge &= (after == ord(" ")) | (after == ord("\t")) | (after == ord("\n")) | \
+        (after == ord("\r")) | (after == ord("/")) | (after == ord(">"))
+    return candidates[is_edge]
+
+
+def materialize(delta_file, rr_graph_file, out_file, check_hash: bool = True):
+    """Write the faulty rr_graph described by a delta over its base rr_graph.
+
+    Bytes are copied from the base file, only the removed <edge> elements (and their
+    trailing whitespace) are skipped, so the output keeps the formatting of the base.
+    :param check_hash: Refuse to apply a delta made for another base file
+    """
+    delta = read_delta(delta_file)
+    if check_hash and file_sha256(rr_graph_file) != delta.base_sha256:
+        raise ValueError(f"{delta_file} was not computed from {rr_graph_file}")
+
+    with open(rr_graph_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start, end = _section(mm, b"rr_edges")
+        data = np.frombuffer(mm, dtype=np.uint8, count=end - start, offset=start)
+        starts = _edge_starts(data) + start
+        del data  # release the buffer before the map is closed
+        if starts.size != delta.base_edges:
+            raise UnexpectedLayout("edge count differs from the delta")
+        ends = np.append(starts[1:], end)
+
+        position = 0
+        with open(out_file, "wb") as out:
+            for i in delta.index.tolist():
+                out.write(mm[position:starts[i]])
+                position = ends[i]
+            out.write(mm[position:])
@@ -0,0 +1,125 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Design-space exploration of the first stage block size of routing muxes.
+
+RoutingMux always uses optimal_block_size, the block size minimizing memory cells.
+Here every block size 1..n of every mux size n is evaluated on the bit-sliced
+engine: each batch of trials draws the memristors of the largest design once and
+every design reads the cells it needs (first stage cells, then second stage cells,
+as RoutingMux.cell_list). Designs are therefore compared on common random numbers
+and the draws are not repeated per design.
+
+>>> points = explore_block_sizes({12: 5000, 30: 800}, ProtoVoterCell,
+...                              RandomErrorGen(pSA0=p, pSA1=p, pUD=p), 100000)
+>>> write_design_report(points)
+"""
+from math import ceil
+from typing import Dict, List, NamedTuple, Sequence
+import numpy as np
+
+from .bitsliced import _collect, cell_planes, evaluate_mux, sample_memristors
+from .memristor_errors import RandomErrorGen
+from .mux import optimal_block_size
+from .stats import SimulationStats
+
+
+class DesignPoint(NamedTuple):
+    """Outcome of one block size choice for muxes of mux_size inputs."""
+
+    mux_size: int
+    block_size: int
+    num_cells: int
+    num_muxes: int
+    unusable: float
+    defect_rate: float
+    pareto: bool
+
+
+def design_cells(mux_size: int, block_size: int):
+    """Return the number of memory cells of a 2-stage mux (first + second stage)."""
+    return block_size + ceil(mux_size / block_size)
+
+
+def pareto_front(costs):
+    """Return the mask of rows of costs (points, objectives) not dominated by another row.
+
+    All objectives are minimized; a row is dominated by one that is no worse in every
+    objective and strictly better in one.
+    """
+    costs = np.asarray(costs, dtype=float)
+    no_worse = (costs[:, None, :] <= costs[None, :, :]).all(axis=2)
+    better = (costs[:, None, :] < costs[None, :, :]).any(axis=2)
+    # dominates[i, j]: row i dominates row j
+    dominates = no_worse & better
+    return ~dominates.any(axis=0)
+
+
+def explore_block_sizes(mux_sizes, cell_type, reg: RandomErrorGen, num_trials: int,
+                        seed=None, block_sizes: Dict[int, Sequence[int]] = None,
+                        batch_trials: int = 1 << 14):
+    """Evaluate every candidate block size of every mux size on shared memristor draws.
+
+    :param mux_sizes: {mux size: number of muxes} (e.g. Counter of the rr_graph mux sizes)
+                      or a sequence of mux sizes
+    :param seed: Seed or numpy Generator of the draws
+    :param block_sizes: Candidate block sizes per mux size, all of 1..size if None
+    :return: List of DesignPoint, ordered by mux size then block size, pareto flags per
+             mux size over (cells, unusable, defect rate)
+    """
+    if not isinstance(mux_sizes, dict):
+        mux_sizes = {size: 1 for size in mux_sizes}
+    designs = [(size, b) for size in sorted(mux_sizes)
+               for b in (block_sizes or {}).get(size, range(1, size + 1))]
+    num_memristors = max(design_cells(*design) for design in designs) * cell_type.num_memristors
+
+    rng = np.random.default_rng(seed)
+    stats = {design: SimulationStats() for design in designs}
+    for start in range(0, num_trials, batch_trials):
+        n = min(batch_trials, num_trials - start)
+        hi, lo = sample_memristors(rng, reg, num_memristors, n)
+        cells = cell_planes(cell_type, hi, lo)
+        for size, b in designs:
+            design = cells[:design_cells(size, b)]
+            unusable, counter = evaluate_mux(size, design, b)
+            _collect(stats[size, b], size, design, unusable, counter, n)
+
+    points = []
+    for size in sorted(mux_sizes):
+        rows = [(b, stats[size, b].unusable.rate(), stats[size, b].defects.defect_rate())
+                for s, b in designs if s == size]
+        front = pareto_front([(design_cells(size, b), u, d) for b, u, d in rows])
+        points += [DesignPoint(size, b, design_cells(size, b), mux_sizes[size], u, d, bool(p))
+                   for (b, u, d), p in zip(rows, front)]
+    return points
+
+
+def write_design_report(points: List[DesignPoint], path: str = "design_space.rpt",
+                        pareto_only: bool = False):
+    """Write the design points as a tab separated table, * marks optimal_block_size."""
+    with open(path, "w") as f:
+        f.write("Block size design space report\n")
+        f.write("=" * 80)
+        f.write("\n\n")
+        f.write("mux size\t# muxes\tblock size\tcells\ttotal cells\t% unusable\t"
+                "% defect edges\tpareto\n")
+        for point in points:
+            if pareto_only and not point.pareto:
+                continue
+            mark = "*" if point.block_size == optimal_block_size(point.mux_size) else ""
+            f.write(f"{point.mux_size}\t{point.num_muxes}\t{point.block_size}{mark}\t"
+                    f"{point.num_cells}\t{point.num_cells * point.num_muxes}\t"
+                    f"{point.unusable * 100:6.2f}\t{point.defect_rate * 100:6.2f}\t"
+                    f"{'yes' if point.pareto else ''}\n")
+    print(f"Report written to {path}")
@@ -0,0 +1,237 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Exact device-level distributions of defect edges and unusable muxes.
+
+Muxes fail independently and the outcome of a mux only depends on its size, so
+the device distribution is the convolution of the per-size outcome distributions
+raised to their multiplicities. No sampling is involved.
+
+>>> sizes = mux_size_histogram(RRGraphParser(file_pathname).get_mux_dict())
+>>> defects, unusable = device_distribution(sizes, ProtoVoterCell, p=0.003)
+>>> defects.quantile(0.99), unusable.tail(1)
+"""
+from collections import Counter, defaultdict
+from typing import Dict
+import numpy as np
+
+from .memristor_errors import Errors, RandomErrorGen
+from .mux import optimal_block_size
+
+# Block state while adding cells: (number of SA1 capped at 2, number of SA0),
+# None once the block is unusable (any UD or more than one SA1)
+_UNUSABLE = None
+
+
+def _add_cell(states, cell_distribution):
+    """Return the block states after adding one more independent cell."""
+    new_states = defaultdict(float)
+    for key, p in states.items():
+        *carried, state = key
+        for error, p_error in enumerate(cell_distribution):
+            if not p_error:
+                continue
+            if state is _UNUSABLE or error == Errors.UD or \
+                    (error == Errors.SA1 and state[0] == 1):
+                new_state = _UNUSABLE
+            elif error == Errors.SA1:
+                new_state = (1, state[1])
+            elif error == Errors.SA0:
+                new_state = (state[0], state[1] + 1)
+            else:
+                new_state = state
+            new_states[(*carried, new_state)] += p * p_error
+    return new_states
+
+
+def _dead_count(state, size):
+    """Return the number of defect inputs of a block of size inputs, as in get_defect_edges."""
+    if state is _UNUSABLE:
+        return size
+    if state[0] == 1:  # all but SA1 are defect
+        return size - 1
+    return state[1]
+
+
+def _first_stage_distribution(cell_distribution, block_size, partial_size):
+    """Return {(unusable, defects in a full block, defects in the partial block): p}.
+
+    First stage blocks share their cells; the partial block only sees the first
+    partial_size of them.
+    """
+    states = {(0, (0, 0)): 1.}
+    for i in range(block_size):
+        if i == partial_size and partial_size:
+            states = {(_dead_count(s, partial_size), s): p for (_, s), p in states.items()}
+        states = _add_cell(states, cell_distribution)
+
+    distribution = defaultdict(float)
+    for (partial_dead, state), p in states.items():
+        distribution[state is _UNUSABLE, _dead_count(state, block_size), partial_dead] += p
+    return distribution
+
+
+def _second_stage_distribution(cell_distribution, n_full, partial):
+    """Return {(unusable, defect full blocks, partial block defect): p}."""
+    states = {((0, 0),): 1.}
+    for _ in range(n_full):
+        states = _add_cell(states, cell_distribution)
+
+    distribution = defaultdict(float)
+    for (state,), p in states.items():
+        for last, p_last in enumerate(cell_distribution if partial else [1.]):
+            if not partial:
+                last = Errors.FF
+            if state is _UNUSABLE or last == Errors.UD or \
+                    (last == Errors.SA1 and state[0] == 1):
+                distribution[True, n_full, partial] += p * p_last
+            elif state[0] == 1:  # SA1 in a full block: everything else is defect
+                distribution[False, n_full - 1, partial] += p * p_last
+            elif last == Errors.SA1:  # SA1 on the partial block
+                distribution[False, n_full, False] += p * p_last
+            else:
+                distribution[False, state[1], last == Errors.SA0] += p * p_last
+    return distribution
+
+
+def mux_outcome_distribution(mux_size: int, cell_distribution, block_size: int = None):
+    """Return P[unusable, number of defect edges] of a single 2-stage routing mux.
+
+    :param mux_size: Number of mux inputs
+    :param cell_distribution: Probability of each cell error, e.g. from
+                              cell_type.error_distribution()
+    :param block_size: First stage block size, the memory-optimal one by default
+    :return: Array of shape (2, mux_size + 1)
+    """
+    block_size = block_size or optimal_block_size(mux_size)
+    n_full, partial_size = divmod(mux_size, block_size)
+    first_stage = _first_stage_distribution(cell_distribution, block_size, partial_size)
+    second_stage = _second_stage_distribution(cell_distribution, n_full, partial_size > 0)
+
+    pmf = np.zeros((2, mux_size + 1))
+    for (unusable_1, full_dead, partial_dead), p_1 in first_stage.items():
+        for (unusable_2, dead_blocks, partial_block_dead), p_2 in second_stage.items():
+            defects = (n_full - dead_blocks) * full_dead + dead_blocks * block_size
+            if partial_size:
+                defects += partial_size if partial_block_dead else partial_dead
+            pmf[int(unusable_1 or unusable_2), defects] += p_1 * p_2
+    return pmf
+
+
+def mux_size_histogram(mux_dict: Dict):
+    """Return {mux size: number of muxes} from a {sink: [sources]} dictionary."""
+    return dict(sorted(Counter(len(sources) for sources in mux_dict.values()).items()))
+
+
+def _convolve(a, b, max_len):
+    """FFT convolution of two pmfs, truncated to max_len values."""
+    n = len(a) + len(b) - 1
+    fft_len = 1 << (n - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(a, fft_len) * np.fft.rfft(b, fft_len), fft_len)[:n]
+    # FFT round-off can produce tiny negative probabilities
+    return np.clip(result[:max_len], 0., None)
+
+
+def _power(pmf, exponent, max_len):
+    """Distribution of the sum of exponent independent copies, by repeated squaring."""
+    result = np.ones(1)
+    while exponent:
+        if exponent & 1:
+            result = _convolve(result, pmf, max_len)
+        exponent >>= 1
+        if exponent:
+            pmf = _convolve(pmf, pmf, max_len)
+    return result
+
+
+class CountDistribution():
+    """Distribution of a non-negative integer count given by its pmf.
+
+    Values above the truncation limit are not represented; their total probability
+    is truncated_mass and they count as larger than any represented value.
+    """
+
+    def __init__(self, pmf):
+        """Store the pmf, pmf[k] = P(X = k)."""
+        self.pmf = np.asarray(pmf, dtype=float)
+        self.truncated_mass = max(0., 1. - self.pmf.sum())
+        self._cdf = np.cumsum(self.pmf)
+
+    def mean(self):
+        """Return the mean of the represented values."""
+        return float((np.arange(self.pmf.size) * self.pmf).sum())
+
+    def std(self):
+        """Return the standard deviation of the represented values."""
+        values = np.arange(self.pmf.size)
+        return float(np.sqrt((values ** 2 * self.pmf).sum() - self.mean() ** 2))
+
+    def cdf(self, k: int):
+        """Return P(X <= k)."""
+        if k < 0:
+            return 0.
+        return float(self._cdf[min(k, self.pmf.size - 1)])
+
+    def tail(self, k: int):
+        """Return P(X >= k)."""
+        return max(0., 1. - self.cdf(k - 1))
+
+    def quantile(self, q: float):
+        """Return the smallest k with P(X <= k) >= q, None if beyond the truncation."""
+        k = int(np.searchsorted(self._cdf, q - 1e-12))
+        return k if k < self.pmf.size else None
+
+
+def device_distribution(mux_sizes: Dict, cell_type, p: float = None, pSA0: float = 0.,
+                        pSA1: float = 0., pUD: float = 0., max_defect_edges: int = None):
+    """Return exact distributions of the total defect edges and unusable muxes of a device.
+
+    :param mux_sizes: {mux size: number of muxes}, see mux_size_histogram
+    :param cell_type: Cell architecture
+    :param p: Equal probability for all errors, otherwise pSA0, pSA1 and pUD are used
+    :param max_defect_edges: Truncate the defect edge distribution above this value.
+                             Represented probabilities stay exact, the discarded mass is
+                             reported as CountDistribution.truncated_mass
+    :return: (defect edges, unusable muxes) as CountDistribution
+    """
+    if p is not None:
+        pSA0 = pSA1 = pUD = p
+    cell_distribution = cell_type.error_distribution(
+        RandomErrorGen(pSA0=pSA0, pSA1=pSA1, pUD=pUD).get_distribution())
+
+    total_edges = sum(size * count for size, count in mux_sizes.items())
+    total_muxes = sum(mux_sizes.values())
+    defect_len = total_edges + 1 if max_defect_edges is None else max_defect_edges + 1
+
+    defects, unusable = np.ones(1), np.ones(1)
+    for size, count in mux_sizes.items():
+        pmf = mux_outcome_distribution(size, cell_distribution)
+        defects = _convolve(defects, _power(pmf.sum(axis=0), count, defect_len), defect_len)
+        unusable_pmf = pmf.sum(axis=1)
+        unusable = _convolve(unusable, _power(unusable_pmf, count, total_muxes + 1),
+                             total_muxes + 1)
+
+    return CountDistribution(defects), CountDistribution(unusable)
+
+
+def expected_rates(mux_size: int, cell_type, p: float = None, pSA0: float = 0.,
+                   pSA1: float = 0., pUD: float = 0.):
+    """Return exact (unusable ratio, defect edge ratio) of a single mux, as in standalone_sim."""
+    if p is not None:
+        pSA0 = pSA1 = pUD = p
+    cell_distribution = cell_type.error_distribution(
+        RandomErrorGen(pSA0=pSA0, pSA1=pSA1, pUD=pUD).get_distribution())
+    pmf = mux_outcome_distribution(mux_size, cell_distribution)
+    defect_pmf = pmf.sum(axis=0)
+    return float(pmf[1].sum()), float((np.arange(mux_size + 1) * defect_pmf).sum() / mux_size)
@@ -0,0 +1,129 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Exact per-edge defect probabilities of a rr_graph, for fault-aware routing.
+
+Instead of sampling many faulty rr_graphs, every mux edge is annotated with the
+probability that it is removed. Input i of a block of s cells (RoutingMuxBlock
+rules) is usable iff its cell is FF or SA1 and every other cell of the block is FF
+or SA0, so
+
+    P(usable) = (q_FF + q_SA1) * (q_FF + q_SA0) ** (s - 1)
+
+with q the cell error distribution (cell_type.error_distribution, from its
+error_LUT). A mux input goes through one first stage block (the cells of its
+block, fewer for the partial block) and one second stage block, whose cells are
+disjoint, so an edge only depends on the size of its two blocks.
+
+The probabilities are aligned with the <edge> elements of the rr_graph (0 for
+edges that are not mux edges), saved as a .npy sidecar or written as an attribute
+of every mux edge.
+
+>>> probabilities = edge_defect_probabilities(scan_rr_edges(file_pathname), ProtoVoterCell,
+...                                           p=0.003)
+>>> annotate_rr_graph(file_pathname, "rr_graph_prob.xml", probabilities)
+"""
+from math import ceil
+import numpy as np
+
+from .memristor_errors import Errors, RandomErrorGen
+from .mux import optimal_block_size
+from .rr_graph_parser import RRGraphStreamer
+
+# Attribute of the annotated <edge> elements
+PROBABILITY_ATTRIBUTE = "defect_probability"
+
+
+def input_defect_probabilities(mux_size: int, cell_distribution, block_size: int = None):
+    """Return P(input i is a defect edge) of every input of a 2-stage routing mux.
+
+    :param cell_distribution: Probability of each cell error, e.g. from
+                              cell_type.error_distribution()
+    :param block_size: First stage block size, the memory-optimal one by default
+    :return: Array of mux_size probabilities, inputs in src_node_list order
+    """
+    block_size = block_size or optimal_block_size(mux_size)
+    n_blocks = ceil(mux_size / block_size)
+    q = np.asarray(cell_distribution, dtype=float)
+    selected, passive = q[Errors.FF] + q[Errors.SA1], q[Errors.FF] + q[Errors.SA0]
+
+    inputs = np.arange(mux_size)
+    # Size of the first stage block of every input (the last block may be partial)
+    first_block = np.minimum(block_size, mux_size - inputs // block_size * block_size)
+    return 1. - selected ** 2 * passive ** (first_block - 1 + n_blocks - 1)
+
+
+def mux_edge_positions(edges):
+    """Return (mask of mux edges, mux size, input index) of the mux edges of EdgeArrays.
+
+    Inputs of a mux are numbered in file order, as the src_node_list of RRGraphParser.
+    """
+    mask = np.isin(edges.switch, edges.mux_switch_ids())
+    _, inverse, counts = np.unique(edges.sink[mask], return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    position = np.empty(order.size, dtype=np.int64)
+    position[order] = np.arange(order.size) - offsets[inverse[order]]
+    return mask, counts[inverse], position
+
+
+def edge_defect_probabilities(edges, cell_type, p: float = None, pSA0: float = 0.,
+                              pSA1: float = 0., pUD: float = 0.):
+    """Return the defect probability of every edge of EdgeArrays, in file order.
+
+    An edge listed twice in the same mux (rare) gets the probability of its own input,
+    although a defect of either input removes both edges.
+    :param p: Equal probability for all errors, otherwise pSA0, pSA1 and pUD are used
+    """
+    if p is not None:
+        pSA0 = pSA1 = pUD = p
+    cell_distribution = cell_type.error_distribution(
+        RandomErrorGen(pSA0=pSA0, pSA1=pSA1, pUD=pUD).get_distribution())
+
+    mask, sizes, position = mux_edge_positions(edges)
+    mux_probabilities = np.empty(sizes.size)
+    for size in np.unique(sizes).tolist():
+        selected = sizes == size
+        mux_probabilities[selected] = \
+            input_defect_probabilities(size, cell_distribution)[position[selected]]
+    probabilities = np.zeros(edges.src.size)
+    probabilities[mask] = mux_probabilities
+    return probabilities
+
+
+def annotate_rr_graph(rr_graph_file, out_file, probabilities, mux_mask=None):
+    """Copy rr_graph_file to out_file with the defect probability of every mux edge.
+
+    :param probabilities: Probabilities aligned with the <edge> elements of rr_graph_file
+    :param mux_mask: Edges to annotate, those of non-zero probability if None
+    """
+    probabilities = np.asarray(probabilities)
+    if mux_mask is None:
+        mux_mask = probabilities > 0
+    values = [f"{p:.6g}" if annotate else None
+              for p, annotate in zip(probabilities.tolist(), mux_mask.tolist())]
+    index = iter(range(len(values)))
+
+    def annotate_edge(edge):
+        i = next(index, None)
+        if i is None:
+            raise ValueError(f"{rr_graph_file} has more edges than probabilities")
+        value = values[i]
+        if value is not None:
+            edge.set(PROBABILITY_ATTRIBUTE, value)
+        return True
+
+    RRGraphStreamer(rr_graph_file).write_rr_graph(out_file, annotate_edge)
+    if next(index, None) is not None:
+        raise ValueError(f"{rr_graph_file} has fewer edges than probabilities")
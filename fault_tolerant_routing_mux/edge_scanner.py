@@ -0,0 +1,247 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Fast extraction of <rr_edges> into integer arrays.
+
+The <edge> records written by VTR are a fixed sequence of three numeric attributes.
+The file is memory-mapped, the <rr_edges> byte range is split at <edge> boundaries
+and every chunk is decoded by a vectorized byte scanner (digit runs to integers) in
+a worker process, without creating one Python object per element.
+
+Every chunk checks that each number is preceded by the expected attribute name. Any
+other layout (reordered or extra attributes, numeric child elements, ...) falls back
+to the streaming XML parser, so the result is always the same as a full parse.
+
+>>> edges = scan_rr_edges(file_pathname, workers=8)
+>>> edges.src, edges.sink, edges.switch
+>>> sinks, srcs = edges.mux_edges()
+>>> mux_edges, num_edges = scan_mux_edges(file_pathname)  # memory bounded by the mux edges
+"""
+import mmap
+import os
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple
+import numpy as np
+
+from .rr_graph_parser import CBLOCK_SWITCH_NAME, SWITCHBOX_SWITCH_NAME, RRGraphStreamer
+
+EDGE_ATTRIBUTES = ("src_node", "sink_node", "switch_id")
+_EDGE_TAG = b"<edge"
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+class UnexpectedLayout(ValueError):
+    """The rr_graph does not have the layout expected by the fast scanner."""
+
+
+class EdgeArrays(NamedTuple):
+    """Edges in file order and switch names by switch id."""
+
+    src: np.ndarray
+    sink: np.ndarray
+    switch: np.ndarray
+    switch_names: Dict[int, str]
+
+    def mux_switch_ids(self):
+        """Return the ids of the routing mux switches (same switches as RRGraphParser)."""
+        return _mux_switch_ids(self.switch_names)
+
+    def mux_edges(self):
+        """Return (sinks, srcs) of every routing mux edge in file order."""
+        mask = np.isin(self.switch, self.mux_switch_ids())
+        return self.sink[mask], self.src[mask]
+
+
+def _mux_switch_ids(switch_names):
+    return [i for i, name in switch_names.items()
+            if name in (SWITCHBOX_SWITCH_NAME, CBLOCK_SWITCH_NAME)]
+
+
+def _narrow(values):
+    """Return values as int32 when they fit, int64 otherwise."""
+    if values.size == 0 or values.max() <= np.iinfo(np.int32).max:
+        return values.astype(np.int32)
+    return values
+
+
+def _section(mm, tag):
+    """Return the byte range of the content of the first <tag> element."""
+    start = mm.find(b"<" + tag)
+    if start < 0:
+        raise UnexpectedLayout(f"no <{tag.decode()}> section")
+    start = mm.find(b">", start) + 1
+    end = mm.find(b"</" + tag + b">", start)
+    if start == 0 or end < 0:
+        raise UnexpectedLayout(f"unterminated <{tag.decode()}> section")
+    return start, end
+
+
+def _attribute_order(mm, start, end):
+    """Return the attribute names of the first edge, in file order."""
+    first = mm.find(_EDGE_TAG, start, end)
+    if first < 0:
+        return EDGE_ATTRIBUTES
+    tag_end = mm.find(b">", first, end)
+    attrib = ET.fromstring(mm[first:tag_end].rstrip(b"/") + b"/>").attrib
+    if sorted(attrib) != sorted(EDGE_ATTRIBUTES):
+        raise UnexpectedLayout(f"unexpected edge attributes {sorted(attrib)}")
+    return tuple(attrib)
+
+
+def _scan_chunk(buffer, order):
+    """Decode the edges of a chunk of the <rr_edges> section.
+
+    :return: int64 array of shape (number of edges, 3) with columns in EDGE_ATTRIBUTES order
+    """
+    num_edges = buffer.count(_EDGE_TAG)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    digits = np.flatnonzero((data >= ord("0")) & (data <= ord("9")))
+
+    # Digit runs: run_start indexes digits, each run is one attribute value
+    new_run = np.ones(digits.size, dtype=bool)
+    new_run[1:] = digits[1:] != digits[:-1] + 1
+    run_start = np.flatnonzero(new_run)
+    if run_start.size != 3 * num_edges:
+        raise UnexpectedLayout("edges do not hold exactly three numbers")
+    if num_edges == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    run_end = np.append(run_start[1:], digits.size)
+    run_length = run_end - run_start
+    if run_length.max() >= _POW10.size:
+        raise UnexpectedLayout("number too large")
+    exponent = np.repeat(run_end, run_length) - np.arange(digits.size) - 1
+    values = np.add.reduceat((data[digits] - ord("0")).astype(np.int64) * _POW10[exponent],
+                             run_start)
+
+    # Every value must be quoted and preceded by the expected attribute name
+    first_byte = digits[run_start].reshape(-1, 3)
+    for column, name in enumerate(order):
+        prefix = np.frombuffer(f'{name}="'.encode(), dtype=np.uint8)
+        offsets = np.arange(-prefix.size, 0)
+        positions = first_byte[:, column, None] + offsets
+        if positions.min() < 0 or not (data[positions] == prefix).all():
+            raise UnexpectedLayout(f"attribute {name} out of place")
+    if not (data[digits[run_end - 1] + 1] == ord('"')).all():
+        raise UnexpectedLayout("unquoted attribute value")
+
+    values = values.reshape(-1, 3)
+    return values[:, [order.index(name) for name in EDGE_ATTRIBUTES]]
+
+
+def _scan_range(mm, start, end, order, mux_ids=None):
+    """Return (edges in [start, end), number of edges), only mux edges if mux_ids is given."""
+    values = _scan_chunk(mm[start:end], order)
+    if mux_ids is None:
+        return values, values.shape[0]
+    return values[np.isin(values[:, 2], mux_ids)], values.shape[0]
+
+
+def _scan_file_range(rr_graph_file, start, end, order, mux_ids=None):
+    """Worker entry point: map the file and decode edges in [start, end)."""
+    with open(rr_graph_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _scan_range(mm, start, end, order, mux_ids)
+
+
+def _split(mm, start, end, chunk_bytes):
+    """Return chunk boundaries of [start, end), each chunk starting at an <edge> tag."""
+    bounds = [start]
+    while bounds[-1] + chunk_bytes < end:
+        next_edge = mm.find(_EDGE_TAG, bounds[-1] + chunk_bytes, end)
+        if next_edge < 0:
+            break
+        bounds.append(next_edge)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _scan_switches(mm):
+    start, end = _section(mm, b"switches")
+    switches = ET.fromstring(b"<switches>" + mm[start:end] + b"</switches>")
+    return {int(s.attrib['id']): s.attrib['name'] for s in switches.iter('switch')}
+
+
+def _fast_scan(rr_graph_file, workers, chunk_bytes, mux_only: bool = False):
+    """Return (EdgeArrays, number of edges in the file), chunks filtered if mux_only."""
+    with open(rr_graph_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        switch_names = _scan_switches(mm)
+        mux_ids = _mux_switch_ids(switch_names) if mux_only else None
+        start, end = _section(mm, b"rr_edges")
+        order = _attribute_order(mm, start, end)
+        chunks = _split(mm, start, end, chunk_bytes)
+
+        if workers <= 1 or len(chunks) == 1:
+            parts = [_scan_range(mm, s, e, order, mux_ids) for s, e in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                parts = list(pool.map(_scan_file_range, [rr_graph_file] * len(chunks),
+                                      *zip(*chunks), [order] * len(chunks),
+                                      [mux_ids] * len(chunks)))
+
+    edges = np.concatenate([values for values, _ in parts])
+    return EdgeArrays(*(_narrow(edges[:, i]) for i in range(3)), switch_names), \
+        sum(num_edges for _, num_edges in parts)
+
+
+def _full_scan(rr_graph_file, mux_only: bool = False):
+    """Fallback: extract the same arrays with the streaming XML parser."""
+    columns = [array('q') for _ in EDGE_ATTRIBUTES]
+    switch_names = dict()
+    mux_ids = None
+    num_edges = 0
+    for record in RRGraphStreamer(rr_graph_file).iter_records():
+        if record.tag == 'edge':
+            num_edges += 1
+            if mux_only:
+                if mux_ids is None:
+                    # VTR writes <switches> before <rr_edges>
+                    mux_ids = set(_mux_switch_ids(switch_names))
+                if int(record.attrib['switch_id']) not in mux_ids:
+                    continue
+            for column, name in zip(columns, EDGE_ATTRIBUTES):
+                column.append(int(record.attrib[name]))
+        elif record.tag == 'switch':
+            switch_names[int(record.attrib['id'])] = record.attrib['name']
+    return EdgeArrays(*(_narrow(np.array(column, dtype=np.int64)) for column in columns),
+                      switch_names), num_edges
+
+
+def scan_rr_edges(rr_graph_file, workers: int = None, chunk_bytes: int = 1 << 22):
+    """Return every edge of a rr_graph as arrays, using the fast scanner when possible.
+
+    :param rr_graph_file: rr_graph XML file
+    :param workers: Number of worker processes (default: number of cores), 0 or 1 scans
+                    in this process
+    :param chunk_bytes: Approximate size of the <rr_edges> chunk given to each task
+    """
+    return _scan(rr_graph_file, workers, chunk_bytes)[0]
+
+
+def scan_mux_edges(rr_graph_file, workers: int = None, chunk_bytes: int = 1 << 22):
+    """Return (EdgeArrays of the routing mux edges only, number of edges of the rr_graph).
+
+    Every chunk is filtered down to mux edges before it is kept, so memory is bounded
+    by the mux edges and not by all the edges of the rr_graph.
+    """
+    return _scan(rr_graph_file, workers, chunk_bytes, mux_only=True)
+
+
+def _scan(rr_graph_file, workers, chunk_bytes, mux_only: bool = False):
+    workers = os.cpu_count() if workers is None else workers
+    try:
+        return _fast_scan(str(rr_graph_file), workers, chunk_bytes, mux_only)
+    except (UnexpectedLayout, ET.ParseError):
+        return _full_scan(rr_graph_file, mux_only)
@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # =============================================================================
-""""""
-import numpy as np
+"""Robustness sweep of a small routing mux for every cell architecture."""
 from .memristor_errors import RandomErrorGen
 from .control_cell import MemCell, ProtoVoterCell
 from .mux import RoutingMux
-from .plotter import plot_all_equal
+
+# Seed of the paper experiment, as the random module seed of memristor_errors
+SEED = 42
 
 
 def count_failure(failure_list, max):
@@ -66,14 +67,31 @@ def simulate_failure_equal(failure_probabilities, cell_type, iterations):
     return results
 
 
-def main():
+def compare_failure_equal(failure_probabilities, iterations, seed=SEED):
+    """Return the ComparisonRows of MemCell and ProtoVoterCell on the same draws."""
+    from .comparison import compare_architectures
+
+    return compare_architectures(failure_probabilities, [MemCell, ProtoVoterCell], iterations,
+                                 seed=seed)
+
+
+def main(report: bool = False):
+    """Plot the paper experiment, also write comparison.rpt if report."""
+    # numpy and matplotlib are only needed here, keep module import cheap
+    import numpy as np
+    from .comparison import comparison_curves, write_comparison_report
+    from .plotter import plot_all_equal
+
     failure_probabilities = np.arange(0, .155, .005)
     # print(failure_probabilities)
     # failure_probabilities = [0, 0.001, 0.005, 0.01, 0.025, 0.05, 0.10, 0.25]
 
-    res_base = simulate_failure_equal(failure_probabilities, MemCell, 10000)
-    res_proto_voter = simulate_failure_equal(failure_probabilities, ProtoVoterCell, 10000)
-    plot_all_equal(failure_probabilities, res_base, res_proto_voter)
+    # Both architectures on the same draws
+    rows = compare_failure_equal(failure_probabilities, 10000)
+    if report:
+        write_comparison_report(rows)
+    curves = comparison_curves(rows)
+    plot_all_equal(failure_probabilities, curves["MemCell"], curves["ProtoVoterCell"])
 
 
 if __name__ == "__main__":
@@ -57,3 +57,8 @@ class RandomErrorGen():
     def get_probabilities(self):
         # Convert cumulative back to absolute before returning
         return self.pSA0 - self.pUD, self.pSA1 - self.pSA0, self.pUD
+
+    def get_distribution(self):
+        """Return the probability of each error of a single memristor, indexed by Errors code."""
+        pSA0, pSA1, pUD = self.get_probabilities()
+        return (1 - self.pSA1, pSA0, pSA1, pUD)
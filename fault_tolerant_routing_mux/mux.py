@@ -13,11 +13,66 @@
 # limitations under the License.
 # =============================================================================
 """Mux representations."""
+from functools import lru_cache
 from math import ceil
 from .control_cell import ProtoVoterCell
 from .memristor_errors import Errors, RandomErrorGen
 
 
+def optimal_block_size(mux_size):
+    """Return the first stage block size minimizing memory cells of a 2-stage routing mux."""
+    block_size = mux_size
+    n_mem_cells = mux_size
+    partial_block = False
+
+    for new_block_size in range(1, mux_size + 1):
+        partial_block = (mux_size % new_block_size) != 0
+        new_n_mem_cell = new_block_size + (mux_size // new_block_size) + partial_block
+
+        if (new_n_mem_cell < n_mem_cells):
+            n_mem_cells = new_n_mem_cell
+            block_size = new_block_size
+
+    return block_size
+
+
+# Largest block evaluated with block_outcome_table (4**8 entries), larger ones scan the cells
+MAX_TABLE_BLOCK_SIZE = 8
+
+
+@lru_cache(maxsize=None)
+def block_outcome_table(block_size):
+    """Return the (unusable, defect mask) tables of every cell error vector of a block.
+
+    The cell errors of a block are encoded as the base-4 code sum(error_i * 4**i).
+    unusable[code] is the block_unusable flag and bit i of defect_mask[code] is set when
+    input i is a defect edge, following the rules of RoutingMuxBlock.
+    """
+    all_inputs = (1 << block_size) - 1
+    unusable = bytearray(4 ** block_size)
+    defect_mask = [0] * 4 ** block_size
+    for code in range(4 ** block_size):
+        errors = [(code >> 2 * i) & 3 for i in range(block_size)]
+        # UD in block or multiple SA1 in block: all inputs are defect
+        if Errors.UD in errors or errors.count(Errors.SA1) > 1:
+            unusable[code] = 1
+            defect_mask[code] = all_inputs
+        # All but SA1 are defect
+        elif Errors.SA1 in errors:
+            defect_mask[code] = all_inputs & ~(1 << errors.index(Errors.SA1))
+        else:
+            defect_mask[code] = sum(1 << i for i, error in enumerate(errors)
+                                    if error == Errors.SA0)
+    return bytes(unusable), tuple(defect_mask)
+
+
+@lru_cache(maxsize=None)
+def _mask_inputs(block_size):
+    """Return the input indices of every defect mask of a block."""
+    return tuple(tuple(i for i in range(block_size) if mask >> i & 1)
+                 for mask in range(1 << block_size))
+
+
 class RoutingMuxBlock():
     """Representation of a mux block."""
 
@@ -27,6 +82,12 @@ class RoutingMuxBlock():
         self.sink_node = sink_node
         self.ctr_cell_list = cell_list[:len(src_node_list)]
         self.block_unusable = False
+        # Base-4 code of the cell errors at the last compute_block_error (0: all FF)
+        self.block_code = 0
+        self.outcome_table = None
+        if len(self.ctr_cell_list) <= MAX_TABLE_BLOCK_SIZE:
+            self.outcome_table = block_outcome_table(len(self.ctr_cell_list))
+            self.mask_inputs = _mask_inputs(len(self.ctr_cell_list))
 
     def set_errors(self, reg: RandomErrorGen) -> None:
         """Set error for every cell in block.
@@ -42,17 +103,32 @@ class RoutingMuxBlock():
 
     def compute_block_error(self):
         """Compute global block error."""
+        if self.outcome_table is not None:
+            code = 0
+            for cell in reversed(self.ctr_cell_list):
+                code = (code << 2) | cell.get_cell_error()
+            self.set_block_code(code)
+            return
+
         memcell_errors = [m.get_cell_error() for m in self.ctr_cell_list]
-        # print(memCellErrors)
 
-        if Errors.UD in memcell_errors:
-            self.block_unusable = True
-            # print("UD in block")
-        elif memcell_errors.count(Errors.SA1) > 1:
-            self.block_unusable = True
-            # print("Multiple SA1 in block")
+        # Assign rather than only set, so that a block can be reused across simulations
+        # (UD in block or multiple SA1 in block)
+        self.block_unusable = Errors.UD in memcell_errors or memcell_errors.count(Errors.SA1) > 1
+
+    def set_block_code(self, code):
+        """Set the block outcome from the base-4 code of its cell errors (table lookup)."""
+        self.block_code = code
+        self.block_unusable = bool(self.outcome_table[0][code])
+
+    def defect_inputs(self):
+        """Return the indices of the defect inputs given by the outcome table."""
+        return self.mask_inputs[self.outcome_table[1][self.block_code]]
 
     def get_defect_edges(self):
+        if self.outcome_table is not None:
+            return [self.src_node_list[i] for i in self.defect_inputs()]
+
         if self.block_unusable:
             defect_edges = self.src_node_list
             return defect_edges
@@ -74,6 +150,9 @@ class RoutingMuxBlock():
 
 class SecondStageMuxBlock(RoutingMuxBlock):
     def get_defect_edges(self):
+        if self.outcome_table is not None:
+            return [edge for i in self.defect_inputs() for edge in self.src_node_list[i]]
+
         if self.block_unusable:
             # Flatten inputs and return all
             defect_edges = [edge for block_edges in self.src_node_list for edge in block_edges]
@@ -118,20 +197,7 @@ class RoutingMux():
 
     def compute_num_stages(self):
         """Compute optimal block size for a 2-stage routing mux."""
-        mux_size = len(self.src_node_list)
-        block_size = mux_size
-        n_mem_cells = mux_size
-        partial_block = False
-
-        for new_block_size in range(1, mux_size + 1):
-            partial_block = (mux_size % new_block_size) != 0
-            new_n_mem_cell = new_block_size + (mux_size // new_block_size) + partial_block
-
-            if (new_n_mem_cell < n_mem_cells):
-                n_mem_cells = new_n_mem_cell
-                block_size = new_block_size
-
-        return block_size
+        return optimal_block_size(len(self.src_node_list))
 
     def build_mux(self, cell_type):
         """Build a 2-stage routing mux."""
@@ -164,9 +230,25 @@ class RoutingMux():
         self.second_stage_block.set_errors(reg)
 
     def compute_block_errors(self):
+        if self.second_stage_block.outcome_table is None or \
+                self.first_stage_blocks[0].outcome_table is None:
+            for block in self.first_stage_blocks:
+                block.compute_block_error()
+            self.second_stage_block.compute_block_error()
+            return
+
+        # First stage blocks share their cells: a block of k inputs reads the code of the
+        # first k cells, evaluate every cell once and build the prefix codes
+        errors = self.get_cell_errors()
+        prefix_codes = [0]
+        for i, error in enumerate(errors[:self.optimal_block_size]):
+            prefix_codes.append(prefix_codes[-1] | error << 2 * i)
         for block in self.first_stage_blocks:
-            block.compute_block_error()
-        self.second_stage_block.compute_block_error()
+            block.set_block_code(prefix_codes[len(block.ctr_cell_list)])
+        code = 0
+        for error in reversed(errors[self.optimal_block_size:]):
+            code = (code << 2) | error
+        self.second_stage_block.set_block_code(code)
 
     def get_defect_edges(self):
         """Return a dict of defect source nodes indexed by the sink node."""
@@ -0,0 +1,192 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Asynchronous orchestration of fault injection and external router runs.
+
+Fault injection (FaultSimulator.run_simulation) runs in a process pool while the
+router (e.g. the VTR fork) runs as a subprocess, so the injection of run k + 1
+overlaps with the routing of run k.
+
+The router command is a template formatted for every run with the keys
+{rr_graph}, {faulty_rr_graph}, {run} and {seed}:
+>>> runs = expand_runs("rr_graph.xml", "ProtoVoterCell", [0.001, 0.002], repeats=10)
+>>> results = run_pipeline(runs, "vpr arch.xml circuit.blif --read_rr_graph {faulty_rr_graph}")
+"""
+import asyncio
+import os
+import random
+import shlex
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .control_cell import CELL_TYPES
+
+
+def expand_runs(rr_graph_file, cell_type: str, probabilities, repeats: int = 1, base_seed: int = 0):
+    """Return one run description per (probability, repetition).
+
+    :param probabilities: Either equal probabilities (floats) or dicts with pSA0, pSA1 and pUD
+    """
+    runs = []
+    for p in probabilities:
+        for _ in range(repeats):
+            run = len(runs)
+            runs.append({
+                "run": run,
+                "rr_graph": str(rr_graph_file),
+                "cell_type": cell_type,
+                "probabilities": dict(p) if isinstance(p, dict) else {"p": p},
+                "seed": base_seed + run,
+            })
+    return runs
+
+
+def inject_faults(run: dict, stream: bool = False):
+    """Write the faulty rr_graph of a run and return its statistics.
+
+    Executed in a worker process. Every run gets its own faulty rr_graph and report
+    file so that concurrent runs on the same rr_graph do not overwrite each other.
+    """
+    if stream:
+        from .streaming import StreamingFaultSimulator as FaultSimulator
+    else:
+        from .core import FaultSimulator
+
+    start = time.perf_counter()
+    random.seed(run["seed"])
+    fault_sim = FaultSimulator(CELL_TYPES[run["cell_type"]], Path(run["rr_graph"]),
+                               **run["probabilities"])
+    # [:-4] gets name up to extension (.xml)
+    run_name = f"{fault_sim.faulty_rr_graph_file[:-4]}_run{run['run']}"
+    fault_sim.faulty_rr_graph_file = f"{run_name}.xml"
+    fault_sim.out_file = Path(f"{run_name}.out")
+    fault_sim.run_simulation()
+
+    return {
+        "faulty_rr_graph": fault_sim.faulty_rr_graph_file,
+        "report": str(fault_sim.out_file),
+        "unusable_count": fault_sim.unusable_count,
+        "defect_edge_count": fault_sim.defect_edge_count,
+        "injection_time": time.perf_counter() - start,
+    }
+
+
+def _available_memory():
+    """Return available physical memory in bytes, None if unknown on this platform."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class Orchestrator():
+    """Pipeline fault injection and router runs under core and memory limits.
+
+    :param command_template: Router command, formatted with the keys of every run
+    :param max_jobs: Maximum number of concurrent injections and of concurrent router
+                     runs, defaults to the number of cores
+    :param memory_per_job: Expected peak memory of one run in bytes, lowers max_jobs
+                           so that all jobs fit in the available memory
+    :param prefetch: Number of runs injected ahead of the routers
+    :param keep_faulty: Keep the faulty rr_graph files after routing
+    :param stream: Inject faults with the streaming simulator
+    :param cwd: Working directory of the router
+    """
+
+    def __init__(self, command_template: str, max_jobs: int = None, memory_per_job: int = None,
+                 prefetch: int = 1, keep_faulty: bool = True, stream: bool = False, cwd=None):
+        """Compute the concurrency limits."""
+        self.command_template = command_template
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        if memory_per_job:
+            available = _available_memory()
+            if available is not None:
+                self.max_jobs = max(1, min(self.max_jobs, available // memory_per_job))
+        self.prefetch = prefetch
+        self.keep_faulty = keep_faulty
+        self.stream = stream
+        self.cwd = cwd
+
+    async def run(self, runs):
+        """Run all runs and return their results in run order."""
+        loop = asyncio.get_running_loop()
+        self._t0 = loop.time()
+        self._in_flight = asyncio.Semaphore(self.max_jobs + self.prefetch)
+        self._routers = asyncio.Semaphore(self.max_jobs)
+        with ProcessPoolExecutor(max_workers=self.max_jobs) as pool:
+            return await asyncio.gather(*(self._run_one(pool, run) for run in runs))
+
+    def _now(self):
+        return asyncio.get_running_loop().time() - self._t0
+
+    async def _run_one(self, pool, run):
+        result = dict(run)
+        async with self._in_flight:
+            result["inject_start"] = self._now()
+            try:
+                result.update(await asyncio.get_running_loop().run_in_executor(
+                    pool, inject_faults, run, self.stream))
+            except Exception as e:  # report and go on with the other runs
+                result["error"] = f"injection failed: {e!r}"
+                result["returncode"] = None
+                return result
+            result["inject_end"] = self._now()
+
+            async with self._routers:
+                await self._route(result)
+
+        if not self.keep_faulty:
+            Path(result["faulty_rr_graph"]).unlink()
+        return result
+
+    async def _route(self, result):
+        """Run the router on the faulty rr_graph, logging its output next to it."""
+        # Split before formatting, so that paths with spaces or quotes stay one argument
+        argv = [token.format(rr_graph=result["rr_graph"],
+                             faulty_rr_graph=result["faulty_rr_graph"],
+                             run=result["run"], seed=result["seed"])
+                for token in shlex.split(self.command_template)]
+        result["command"] = shlex.join(argv)
+        result["log"] = f"{result['faulty_rr_graph'][:-4]}.log"
+
+        result["route_start"] = self._now()
+        with open(result["log"], "wb") as log:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *argv, stdout=log, stderr=asyncio.subprocess.STDOUT,
+                    cwd=self.cwd)
+                result["returncode"] = await proc.wait()
+            except OSError as e:
+                result["error"] = f"router failed to start: {e!r}"
+                result["returncode"] = None
+        result["route_end"] = self._now()
+        result["route_time"] = result["route_end"] - result["route_start"]
+
+
+def run_pipeline(runs, command_template: str, **kwargs):
+    """Run the orchestrator synchronously, see Orchestrator for the keyword arguments."""
+    return asyncio.run(Orchestrator(command_template, **kwargs).run(runs))
+
+
+def write_results(results, out_file):
+    """Write the results as a tab separated table."""
+    columns = ["run", "seed", "cell_type", "probabilities", "unusable_count",
+               "defect_edge_count", "injection_time", "route_time", "returncode",
+               "faulty_rr_graph", "error"]
+    with open(out_file, "w") as f:
+        f.write("\t".join(columns) + "\n")
+        for result in results:
+            f.write("\t".join(str(result.get(c, "")) for c in columns) + "\n")
+    print(f"Results written to {out_file}")
@@ -13,15 +13,15 @@
 # limitations under the License.
 # =============================================================================
 """Plot utilities for visualization."""
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import matplotlib.pyplot as plt
 
 
-def plot_3d_scatter(x_axis, y_axis, z_axis, z_axis_robust, pUD):
-    """Plot a 3D scatter plot."""
-    fig = plt.figure(figsize=(12, 12))
-    # fig = plt.figure()
+def _draw_3d_scatter(fig, x_axis, y_axis, z_axis, z_axis_robust, pUD):
+    """Draw the robustness scatter of a pUD slice on an empty figure."""
     ax = fig.add_subplot(projection='3d')
 
     ax.scatter(x_axis, y_axis, z_axis, label="Base arch")
@@ -30,15 +30,19 @@ def plot_3d_scatter(x_axis, y_axis, z_axis, z_axis_robust, pUD):
     ax.set_xlabel('SA0 probability')
     ax.set_ylabel('SA1 probability')
     ax.set_zlabel('Ratio of usable units')
-    # ax.xlim()
-    # ax.ylim()
     ax.set_zlim3d(0, 1.0)
 
-    plt.title(f"Robustness analysis at p(UD) = {100 * pUD:.2f}%")
-    plt.legend()
-    plt.tight_layout()
-    # plt.show()
-    plt.savefig(f'{pUD:.2f}-UD.png')
+    ax.set_title(f"Robustness analysis at p(UD) = {100 * pUD:.2f}%")
+    ax.legend()
+    fig.tight_layout()
+
+
+def plot_3d_scatter(x_axis, y_axis, z_axis, z_axis_robust, pUD):
+    """Plot a 3D scatter plot."""
+    fig = plt.figure(figsize=(12, 12))
+    _draw_3d_scatter(fig, x_axis, y_axis, z_axis, z_axis_robust, pUD)
+    fig.savefig(f'{pUD:.2f}-UD.png')
+    plt.close(fig)
 
 
 def plot_scatter(x_axis, y_axis, y_axis_robust):
@@ -60,20 +64,11 @@ def plot_scatter(x_axis, y_axis, y_axis_robust):
     plt.tight_layout()
     # plt.show()
     plt.savefig('failure-percent.png')
+    plt.close(fig)
 
 
 def plot_all(probs, res_base, res_proto_voter):
-    for p in probs:
-        # print(str(p))
-        k_filter = [k for k in list(res_base.keys()) if k.split(",")[-1] == str(p)]
-        # print(k_filter)
-
-        x_axis = [float(k.split(",")[0]) for k in k_filter]
-        y_axis = [float(k.split(",")[1]) for k in k_filter]
-        z_axis = [res_base[k] for k in k_filter]
-        z_axis_robust = [res_proto_voter[k] for k in k_filter]
-
-        plot_3d_scatter(x_axis, y_axis, z_axis, z_axis_robust, p)
+    plot_all_batch(probs, res_base, res_proto_voter, workers=1)
 
 
 def plot_all_equal(probs, res_base, res_proto_voter):
@@ -87,3 +82,71 @@ def plot_all_equal(probs, res_base, res_proto_voter):
     y_axis_robust = [v for v in res_proto_voter.values()]
 
     plot_scatter(x_axis, y_axis, y_axis_robust)
+
+
+def results_to_array(probs, results):
+    """Return simulate_failure results as an array indexed by [pSA0, pSA1, pUD] positions.
+
+    :param results: {"pSA0,pSA1,pUD": value} with keys formatted from probs; both are
+                    compared as floats, so 0 and 0.0 designate the same probability
+    """
+    index = {float(p): i for i, p in enumerate(probs)}
+    array = np.full((len(probs),) * 3, np.nan)
+    for key, value in results.items():
+        array[tuple(index[float(k)] for k in key.split(","))] = value
+    return array
+
+
+def _render_3d_slices(probs, base, robust, slices, out_pattern, pdf_file=None):
+    """Render pUD slices on a single reused figure, to PNG files or to an open PDF."""
+    x_axis, y_axis = (a.ravel() for a in np.meshgrid(probs, probs, indexing="ij"))
+    fig = plt.figure(figsize=(12, 12))
+    try:
+        for k in slices:
+            fig.clf()
+            _draw_3d_scatter(fig, x_axis, y_axis, base[:, :, k].ravel(),
+                             robust[:, :, k].ravel(), probs[k])
+            if pdf_file is not None:
+                pdf_file.savefig(fig)
+            else:
+                fig.savefig(out_pattern.format(pUD=probs[k]))
+    finally:
+        plt.close(fig)
+
+
+def _render_worker(probs, base, robust, slices, out_pattern):
+    plt.switch_backend("Agg")  # workers never open windows
+    _render_3d_slices(probs, base, robust, slices, out_pattern)
+
+
+def plot_all_batch(probs, res_base, res_proto_voter, workers=None, pdf=None,
+                   out_pattern="{pUD:.2f}-UD.png"):
+    """Batch version of plot_all: one 3D scatter per pUD value.
+
+    :param res_base, res_proto_voter: simulate_failure results, as dicts or as arrays
+                                      indexed by [pSA0, pSA1, pUD] positions
+    :param workers: Render PNG files on this many processes (default: number of cores),
+                    each reusing a single figure
+    :param pdf: Write every slice as a page of this single PDF file instead of PNG files
+    """
+    probs = np.asarray(probs, dtype=float)
+    base, robust = (r if isinstance(r, np.ndarray) else results_to_array(probs, r)
+                    for r in (res_base, res_proto_voter))
+
+    if pdf is not None:
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        with PdfPages(pdf) as pdf_file:
+            _render_3d_slices(probs, base, robust, range(probs.size), out_pattern, pdf_file)
+        return
+
+    workers = min(os.cpu_count() if workers is None else workers, probs.size)
+    if workers <= 1:
+        _render_3d_slices(probs, base, robust, range(probs.size), out_pattern)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_worker, probs, base, robust,
+                               range(w, probs.size, workers), out_pattern)
+                   for w in range(workers)]
+        for future in futures:
+            future.result()
@@ -0,0 +1,205 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Indexed in-memory model of a rr_graph with vectorized queries.
+
+RRGraphParser only keeps the routing muxes. RRGraphIndex keeps nodes, edges and
+switches as numpy arrays, so per-type or per-region analyses of defects do not
+need another parse of the XML file.
+
+>>> index = RRGraphIndex(file_pathname)
+>>> index.breakdown_by_type(fault_sim.defect_edges)
+{'CHANX': 120, 'CHANY': 98, 'IPIN': 311}
+>>> index.breakdown_by_region(fault_sim.defect_edges, tile_size=4)
+"""
+from array import array
+from typing import Dict
+import numpy as np
+
+from .rr_graph_parser import CBLOCK_SWITCH_NAME, SWITCHBOX_SWITCH_NAME, RRGraphStreamer
+
+# Known VTR node types, unknown ones are appended to the instance table when found
+NODE_TYPES = ("SOURCE", "SINK", "OPIN", "IPIN", "CHANX", "CHANY")
+
+
+class RRGraphIndex():
+    """Numpy arrays for nodes, edges and switches of a rr_graph.
+
+    Nodes (one row per <node>, in file order):
+    :self.node_id, self.node_type: node id and index into self.node_types
+    :self.xlow, self.ylow, self.xhigh, self.yhigh, self.ptc: <loc> attributes
+    Edges (one row per <edge>, in file order):
+    :self.edge_src, self.edge_sink, self.edge_switch: node ids and switch id
+    Switches:
+    :self.switch_names: switch name by switch id
+    """
+
+    def __init__(self, rr_graph_file):
+        """Build the index in a single streaming pass over the file."""
+        self.rr_graph_file = rr_graph_file
+        self.node_types = list(NODE_TYPES)
+        self.switch_names = dict()
+        self._parse(RRGraphStreamer(rr_graph_file))
+        self._index_nodes()
+
+    def _parse(self, streamer):
+        type_codes = {name: code for code, name in enumerate(self.node_types)}
+        nodes = {key: array('q') for key in ("id", "type", "xlow", "ylow", "xhigh", "yhigh",
+                                             "ptc")}
+        edges = {key: array('q') for key in ("src", "sink", "switch")}
+
+        for record in streamer.iter_records():
+            if record.tag == 'node':
+                node_type = record.attrib['type']
+                if node_type not in type_codes:
+                    type_codes[node_type] = len(self.node_types)
+                    self.node_types.append(node_type)
+                nodes["id"].append(int(record.attrib['id']))
+                nodes["type"].append(type_codes[node_type])
+                loc = record.find('loc')
+                loc = loc.attrib if loc is not None else {}
+                for key in ("xlow", "ylow", "xhigh", "yhigh"):
+                    nodes[key].append(int(loc.get(key, -1)))
+                # ptc may be a comma separated list for multi-ptc nodes, keep the first
+                nodes["ptc"].append(int(loc.get('ptc', '-1').split(',')[0]))
+            elif record.tag == 'edge':
+                edges["src"].append(int(record.attrib['src_node']))
+                edges["sink"].append(int(record.attrib['sink_node']))
+                edges["switch"].append(int(record.attrib['switch_id']))
+            elif record.tag == 'switch':
+                self.switch_names[int(record.attrib['id'])] = record.attrib['name']
+
+        self.node_id = _to_array(nodes["id"])
+        self.node_type = _to_array(nodes["type"], np.int8)
+        self.xlow = _to_array(nodes["xlow"])
+        self.ylow = _to_array(nodes["ylow"])
+        self.xhigh = _to_array(nodes["xhigh"])
+        self.yhigh = _to_array(nodes["yhigh"])
+        self.ptc = _to_array(nodes["ptc"])
+        self.edge_src = _to_array(edges["src"])
+        self.edge_sink = _to_array(edges["sink"])
+        self.edge_switch = _to_array(edges["switch"], np.int16)
+
+    def _index_nodes(self):
+        """Prepare node id to row lookups; VTR ids are usually dense and sorted."""
+        self._dense_ids = np.array_equal(self.node_id, np.arange(self.node_id.size))
+        if not self._dense_ids:
+            self._id_order = np.argsort(self.node_id, kind="stable")
+            self._sorted_ids = self.node_id[self._id_order]
+
+    def node_rows(self, node_ids):
+        """Return the rows of the node arrays holding the given node ids."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if self._dense_ids:
+            return node_ids
+        rows = np.searchsorted(self._sorted_ids, node_ids)
+        rows = np.minimum(rows, self._sorted_ids.size - 1)
+        if not np.array_equal(self._sorted_ids[rows], node_ids):
+            raise KeyError("node id not found in rr_graph")
+        return self._id_order[rows]
+
+    def node_type_code(self, name: str):
+        """Return the code of a node type name, as stored in self.node_type."""
+        return self.node_types.index(name)
+
+    def switch_ids(self, *names):
+        """Return the ids of the switches with the given names."""
+        return np.array([i for i, name in self.switch_names.items() if name in names],
+                        dtype=np.int64)
+
+    def edges_by_switch(self, *names):
+        """Return the indices of edges using any of the named switches."""
+        return np.flatnonzero(np.isin(self.edge_switch, self.switch_ids(*names)))
+
+    def mux_edges(self):
+        """Return the indices of routing mux edges (same switches as RRGraphParser)."""
+        return self.edges_by_switch(SWITCHBOX_SWITCH_NAME, CBLOCK_SWITCH_NAME)
+
+    def get_mux_dict(self):
+        """Return {sink: [sources]} of routing muxes, same result as RRGraphParser."""
+        mux_dict = dict()
+        edges = self.mux_edges()
+        for sink, src in zip(self.edge_sink[edges].tolist(), self.edge_src[edges].tolist()):
+            mux_dict.setdefault(sink, []).append(src)
+        return mux_dict
+
+    def nodes_in_bbox(self, xmin, ymin, xmax, ymax):
+        """Return a mask of nodes whose span overlaps the inclusive bounding box."""
+        return (self.xlow <= xmax) & (self.xhigh >= xmin) & \
+               (self.ylow <= ymax) & (self.yhigh >= ymin)
+
+    def node_mask(self, node_ids, node_type: str = None, bbox=None):
+        """Return a mask of the given node ids matching a node type and/or bounding box.
+
+        :param bbox: Inclusive (xmin, ymin, xmax, ymax)
+        """
+        rows = self.node_rows(node_ids)
+        mask = np.ones(rows.size, dtype=bool)
+        if node_type is not None:
+            mask &= self.node_type[rows] == self.node_type_code(node_type)
+        if bbox is not None:
+            mask &= self.nodes_in_bbox(*bbox)[rows]
+        return mask
+
+    def mux_sinks(self, node_type: str = None, bbox=None):
+        """Return the sink nodes of routing muxes, filtered by node type and/or bounding box."""
+        sinks = np.unique(self.edge_sink[self.mux_edges()])
+        return sinks[self.node_mask(sinks, node_type, bbox)]
+
+    def mux_sizes(self, sinks=None):
+        """Return the number of mux inputs of each sink (all mux sinks if None, sorted)."""
+        mux_sinks, sizes = np.unique(self.edge_sink[self.mux_edges()], return_counts=True)
+        if sinks is None:
+            return sizes
+        return sizes[np.searchsorted(mux_sinks, sinks)]
+
+    @staticmethod
+    def defect_edge_arrays(defect_edges: Dict):
+        """Return (src, sink) arrays from a {sink: {sources}} defect dictionary."""
+        sinks = np.fromiter((sink for sink, srcs in defect_edges.items() for _ in srcs),
+                            dtype=np.int64)
+        srcs = np.fromiter((src for srcs in defect_edges.values() for src in srcs),
+                           dtype=np.int64)
+        return srcs, sinks
+
+    def breakdown_by_type(self, defect_edges: Dict, by: str = "sink"):
+        """Return the number of defect edges per node type of their sink (or src) node."""
+        srcs, sinks = self.defect_edge_arrays(defect_edges)
+        nodes = sinks if by == "sink" else srcs
+        counts = np.bincount(self.node_type[self.node_rows(nodes)].astype(np.intp),
+                             minlength=len(self.node_types))
+        return {name: int(c) for name, c in zip(self.node_types, counts) if c}
+
+    def breakdown_by_region(self, defect_edges: Dict, tile_size: int = 1):
+        """Return a 2D array of defect edge counts binned by the (xlow, ylow) of their sink.
+
+        counts[i, j] holds the defects whose sink lies in tiles
+        [i * tile_size, (i + 1) * tile_size) x [j * tile_size, (j + 1) * tile_size).
+        """
+        _, sinks = self.defect_edge_arrays(defect_edges)
+        rows = self.node_rows(sinks)
+        rows = rows[self.xlow[rows] >= 0]  # nodes without <loc> cannot be placed
+        shape = (self.xlow.max() // tile_size + 1, self.ylow.max() // tile_size + 1)
+        flat = np.ravel_multi_index((self.xlow[rows] // tile_size, self.ylow[rows] // tile_size),
+                                    shape)
+        return np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def _to_array(values, dtype=np.int32):
+    """Convert a packed array('q') to a numpy array, narrowing the dtype when it fits."""
+    arr = np.frombuffer(values, dtype=np.int64) if len(values) else np.zeros(0, np.int64)
+    info = np.iinfo(dtype)
+    if arr.size == 0 or (arr.min() >= info.min and arr.max() <= info.max):
+        return arr.astype(dtype)
+    return arr.copy()
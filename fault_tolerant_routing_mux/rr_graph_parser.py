@@ -13,8 +13,44 @@
 # limitations under the License.
 # =============================================================================
 """Module to parse rr_graph files into data structures."""
+import re
 import xml.etree.ElementTree as ET
+from array import array
 from collections import defaultdict
+from xml.sax.saxutils import escape
+
+# Switch names identifying the routing muxes in VTR rr_graphs
+SWITCHBOX_SWITCH_NAME = '0'
+CBLOCK_SWITCH_NAME = 'ipin_cblock'
+
+_ATTRIB_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}
+_attrib_needs_escape = re.compile('[&<>"\r\n\t]').search
+
+
+def _escape_text(text):
+    # Almost every value in a rr_graph is numeric, skip the replace calls then
+    if "&" in text or "<" in text or ">" in text:
+        return escape(text)
+    return text
+
+
+def _escape_attrib(value):
+    if _attrib_needs_escape(value):
+        return escape(value, _ATTRIB_ENTITIES)
+    return value
+
+
+def _start_tag(elem):
+    attrs = "".join(f' {k}="{_escape_attrib(v)}"' for k, v in elem.attrib.items())
+    return f"<{elem.tag}{attrs}"
+
+
+def _serialize(elem):
+    """Serialize an element without tail, same layout as ElementTree.tostring but faster."""
+    if not len(elem) and not elem.text:
+        return _start_tag(elem) + " />"
+    children = "".join(_serialize(child) + _escape_text(child.tail or "") for child in elem)
+    return f"{_start_tag(elem)}>{_escape_text(elem.text or '')}{children}</{elem.tag}>"
 
 
 class RRGraphParser():
@@ -36,9 +72,11 @@ class RRGraphParser():
         :self.switchbox_id: id of structure corresponding to the routing muxes in the XML
         :self.cblock_id: id of structure corresponding to the connection block in the XML
         :param mux_dict: Dictionary of routing multiplexers indexed by mux sink_node
+        :param mux_switches: Switch name of the routing multiplexers indexed by mux sink_node
         """
         self.tree = ET.parse(rr_graph_file)
         self.mux_dict = defaultdict(list)
+        self.mux_switches = dict()
         self.switchbox_id = None
         self.cblock_id = None
         self.parse_switches()
@@ -47,9 +85,9 @@ class RRGraphParser():
     def parse_switches(self):
         """Store the respective id of connection blocks and routing muxes based on switch name."""
         for s in self.tree.find('switches'):
-            if (s.attrib['name'] == '0'):
+            if (s.attrib['name'] == SWITCHBOX_SWITCH_NAME):
                 self.switchbox_id = s.attrib['id']
-            elif (s.attrib['name'] == 'ipin_cblock'):
+            elif (s.attrib['name'] == CBLOCK_SWITCH_NAME):
                 self.cblock_id = s.attrib['id']
 
     def parse_rr_edges(self):
@@ -57,18 +95,23 @@ class RRGraphParser():
 
         An edge is only parsed if mux id matches self.target_id.
         """
-        mux_ids = {self.cblock_id, self.switchbox_id}
+        mux_ids = {self.cblock_id: CBLOCK_SWITCH_NAME, self.switchbox_id: SWITCHBOX_SWITCH_NAME}
 
         for edge in self.tree.find('rr_edges'):
             if edge.attrib['switch_id'] in mux_ids:
                 sink_node = edge.attrib['sink_node']
                 src_node = edge.attrib['src_node']
                 self.mux_dict[int(sink_node)].append(int(src_node))
+                self.mux_switches[int(sink_node)] = mux_ids[edge.attrib['switch_id']]
 
     def get_mux_dict(self):
         """Return dictionary of mux nodes."""
         return self.mux_dict
 
+    def get_mux_switches(self):
+        """Return the switch name of every mux, indexed by sink node."""
+        return self.mux_switches
+
     def update_rr_graph(self, defect_filename, defect_edges_dict):
         # Since src-sink are unique we can use a set for efficiency
         defect_edges = {(str(source), str(sink))
@@ -90,3 +133,123 @@ class RRGraphParser():
 
     def get_total_num_edges(self):
         return len(self.tree.find('rr_edges'))
+
+
+class RRGraphStreamer():
+    """Streaming access to Routing Resource Graph files.
+
+    Unlike RRGraphParser the XML tree is never held in memory: every record
+    (a child of <switches>, <rr_nodes>, <rr_edges>, ...) is released as soon as
+    it has been processed, so memory does not depend on the size of the file.
+
+    >>> streamer = RRGraphStreamer(file_pathname)
+    >>> sinks, srcs = streamer.scan_mux_edges()
+    >>> streamer.write_rr_graph(out_pathname, keep_edge=lambda edge: True)
+
+    :param rr_graph_file: The rr_graph file to be streamed
+    """
+
+    def __init__(self, rr_graph_file):
+        """Store the file name; nothing is read until a pass is requested."""
+        self.rr_graph_file = rr_graph_file
+        self.switchbox_id = None
+        self.cblock_id = None
+        self.total_num_edges = 0
+
+    def iter_records(self):
+        """Yield every element two levels below the root, then release it."""
+        level = 0
+        parents = []
+        for event, elem in ET.iterparse(self.rr_graph_file, events=("start", "end")):
+            if event == "start":
+                if level < 2:
+                    parents.append(elem)
+                level += 1
+                continue
+
+            level -= 1
+            if level == 2:
+                yield elem
+                elem.clear()
+                parents[-1].remove(elem)
+            elif level < 2:
+                parents.pop()
+
+    def set_switch(self, switch_id, name):
+        """Record the id of a switch if it identifies routing muxes."""
+        if name == SWITCHBOX_SWITCH_NAME:
+            self.switchbox_id = str(switch_id)
+        elif name == CBLOCK_SWITCH_NAME:
+            self.cblock_id = str(switch_id)
+
+    def get_mux_switch_ids(self):
+        """Return the switch ids of routing muxes found in the last pass."""
+        return {self.cblock_id, self.switchbox_id}
+
+    def scan_mux_edges(self):
+        """First pass: return sink and source node arrays of every mux edge in file order.
+
+        Node ids are packed as 64-bit integers (array('q')), which bounds the memory of
+        the pass by the number of mux edges. Switch ids are parsed along the way.
+        """
+        sinks = array('q')
+        srcs = array('q')
+        mux_ids = None
+        self.total_num_edges = 0
+
+        for record in self.iter_records():
+            if record.tag == 'switch':
+                self.set_switch(record.attrib['id'], record.attrib['name'])
+            elif record.tag == 'edge':
+                if mux_ids is None:
+                    # VTR writes <switches> before <rr_edges>
+                    mux_ids = self.get_mux_switch_ids()
+                self.total_num_edges += 1
+                if record.attrib['switch_id'] in mux_ids:
+                    sinks.append(int(record.attrib['sink_node']))
+                    srcs.append(int(record.attrib['src_node']))
+
+        return sinks, srcs
+
+    def write_rr_graph(self, out_file, keep_edge):
+        """Second pass: copy the rr_graph to out_file, dropping edges on the fly.
+
+        :param out_file: Path of the rr_graph file to be written
+        :param keep_edge: Callable receiving each <edge> element in file order,
+                          returns False if the edge must be removed
+        """
+        level = 0
+        parents = []
+        # Text following a tag is only complete once the parser emits the next event,
+        # so it is written then: (element, "text" or "tail", write it, release element)
+        pending = None
+
+        with open(out_file, "w", encoding="utf-8") as f:
+            for event, elem in ET.iterparse(self.rr_graph_file, events=("start", "end")):
+                if pending is not None:
+                    owner, attr, write, release = pending
+                    if write:
+                        f.write(_escape_text(getattr(owner, attr) or ""))
+                    if release:
+                        owner.clear()
+                        parents[-1].remove(owner)
+                    pending = None
+
+                if event == "start":
+                    if level < 2:
+                        f.write(_start_tag(elem) + ">")
+                        parents.append(elem)
+                        pending = (elem, "text", True, False)
+                    level += 1
+                    continue
+
+                level -= 1
+                if level == 2:
+                    keep = elem.tag != 'edge' or keep_edge(elem)
+                    if keep:
+                        f.write(_serialize(elem))
+                    pending = (elem, "tail", keep, True)
+                elif level < 2:
+                    f.write(f"</{elem.tag}>")
+                    parents.pop()
+                    pending = (elem, "tail", True, False)
@@ -0,0 +1,182 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Parallel sweep scheduler for standalone and main.py experiments.
+
+A sweep is expanded into work units (experiment, cell type, probability point,
+seed chunk). Units are submitted one by one to a process pool, so an idle worker
+always takes the next pending unit and uneven unit costs balance out. Every unit
+seeds its own random state from its coordinates and results are merged as integer
+counts, so the final curves do not depend on the number of workers.
+
+>>> scheduler = SweepScheduler(workers=8)
+>>> scheduler.add_standalone(p_array, 100000, ProtoVoterCell)
+>>> scheduler.add_equal(p_array, 10000, MemCell)
+>>> results = scheduler.run()
+>>> results["standalone", "ProtoVoterCell"][p]
+"""
+import json
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from math import ceil
+from typing import NamedTuple
+
+from .control_cell import CELL_TYPES
+from .memristor_errors import RandomErrorGen
+from .mux import RoutingMux
+from .stats import SimulationStats
+
+# Experiments: the 12-input mux of FaultSimulator.standalone_sim with equal pSA0, pSA1
+# and pUD, and the 2-input mux of main.simulate_failure_equal with pUD only
+STANDALONE, EQUAL = "standalone", "equal"
+
+
+class WorkUnit(NamedTuple):
+    experiment: str
+    cell_type: str
+    p_index: int
+    p: float
+    chunk: int
+    num_iters: int
+    seed: str
+
+
+def run_unit(unit: WorkUnit):
+    """Simulate one work unit and return its statistics (executed in a worker)."""
+    random.seed(unit.seed)
+    cell_type = CELL_TYPES[unit.cell_type]
+    stats = SimulationStats()
+    # A single mux is enough: set_errors overwrites every cell at each iteration
+    if unit.experiment == STANDALONE:
+        reg = RandomErrorGen(pSA0=unit.p, pSA1=unit.p, pUD=unit.p)
+        mux = RoutingMux(sink_node=0, src_node_list=list(range(12)), cell_type=cell_type)
+        for _ in range(unit.num_iters):
+            mux.set_errors(reg)
+            mux.compute_block_errors()
+            stats.add_mux(mux)
+    else:
+        reg = RandomErrorGen(pSA0=0, pSA1=0, pUD=unit.p)
+        mux = RoutingMux(2, [4, 3], cell_type)
+        for _ in range(unit.num_iters):
+            mux.set_errors(reg)
+            stats.unusable.update(mux.get_mux_unusable())
+    return stats
+
+
+class SweepScheduler():
+    """Expand sweeps into work units and run them on a process pool.
+
+    :param workers: Number of worker processes, 0 runs every unit in this process
+    :param chunk_iters: Iterations per work unit
+    :param seed: Base seed, every unit derives its own seed from it
+    :param on_result: Optional callback(unit, aggregated_stats) called as units complete
+    :param checkpoint: Optional JSON file rewritten with the aggregated stats as units complete
+    """
+
+    def __init__(self, workers: int = None, chunk_iters: int = 1000, seed: int = 0,
+                 on_result=None, checkpoint=None):
+        """Create an empty sweep."""
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_iters = chunk_iters
+        self.seed = seed
+        self.on_result = on_result
+        self.checkpoint = checkpoint
+        self.units = []
+        self.p_arrays = dict()
+
+    def _add(self, experiment, p_array, num_iters, cell_type):
+        name = cell_type if isinstance(cell_type, str) else cell_type.__name__
+        self.p_arrays[experiment, name] = list(p_array)
+        for p_index, p in enumerate(p_array):
+            for chunk in range(ceil(num_iters / self.chunk_iters)):
+                n = min(self.chunk_iters, num_iters - chunk * self.chunk_iters)
+                seed = f"{self.seed}:{experiment}:{name}:{p_index}:{chunk}"
+                self.units.append(WorkUnit(experiment, name, p_index, float(p), chunk, n, seed))
+
+    def add_standalone(self, p_array, num_iters: int, cell_type):
+        """Add a FaultSimulator.standalone_sim sweep."""
+        self._add(STANDALONE, p_array, num_iters, cell_type)
+
+    def add_equal(self, p_array, num_iters: int, cell_type):
+        """Add a main.simulate_failure_equal sweep."""
+        self._add(EQUAL, p_array, num_iters, cell_type)
+
+    def run(self):
+        """Run all units and return the aggregated curves.
+
+        :return: {(experiment, cell type name): {p: result}} where result is the
+                 standalone_sim tuple for standalone sweeps and the unusable ratio
+                 keyed by str(p) (as in simulate_failure_equal) for equal sweeps
+        """
+        self.stats = {(u.experiment, u.cell_type, u.p_index): SimulationStats()
+                      for u in self.units}
+        # Costly units first, so that cheap ones fill the gaps at the end
+        units = sorted(self.units, key=lambda u: (u.num_iters, u.p), reverse=True)
+
+        if self.workers == 0:
+            for unit in units:
+                self._collect(unit, run_unit(unit))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = {pool.submit(run_unit, unit): unit for unit in units}
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(pending.pop(future), future.result())
+
+        return self.results()
+
+    def _collect(self, unit, stats):
+        aggregated = self.stats[unit.experiment, unit.cell_type, unit.p_index]
+        aggregated.merge(stats)
+        if self.on_result is not None:
+            self.on_result(unit, aggregated)
+        if self.checkpoint is not None:
+            self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        partial = {":".join(map(str, key)): stats.to_dict() for key, stats in self.stats.items()}
+        tmp_file = f"{self.checkpoint}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(partial, f)
+        os.replace(tmp_file, self.checkpoint)
+
+    def results(self):
+        """Return the curves aggregated so far, see run()."""
+        results = dict()
+        for (experiment, cell_type), p_array in self.p_arrays.items():
+            curve = results.setdefault((experiment, cell_type), dict())
+            for p_index, p in enumerate(p_array):
+                stats = self.stats[experiment, cell_type, p_index]
+                if experiment == STANDALONE:
+                    curve[p] = stats.summary()
+                else:
+                    curve[f"{p}"] = stats.unusable.rate()
+        return results
+
+
+def parallel_standalone_sim(p_array, num_iters: int, cell_type, workers: int = None,
+                            chunk_iters: int = 1000, seed: int = 0):
+    """Parallel counterpart of FaultSimulator.standalone_sim, writing the same report."""
+    from .core import FaultSimulator
+
+    start = datetime.now()
+    scheduler = SweepScheduler(workers, chunk_iters, seed)
+    scheduler.add_standalone(p_array, num_iters, cell_type)
+    results = scheduler.run()[STANDALONE, cell_type.__name__]
+    sim_time = (datetime.now() - start).total_seconds()
+    FaultSimulator._write_standalone_report(cell_type, num_iters, sim_time, results)
+    return results
@@ -0,0 +1,131 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Sparse defect sampling for low defect probabilities.
+
+The memristors of all muxes are numbered in one flat index space. Instead of one
+draw per memristor, the gaps between defective memristors are drawn from a
+geometric distribution, and the error of each defective memristor from the
+distribution conditioned on being defective. Only muxes that received a defect
+are evaluated; all others are counted as fault-free in bulk. The cost therefore
+scales with the expected number of defects, not with the size of the device.
+
+>>> fault_sim = SparseFaultSimulator(ProtoVoterCell, rr_graph_file=file_pathname, p=1e-4, seed=0)
+>>> fault_sim.run_simulation(delta=True)
+"""
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+from .core import FaultSimulator
+from .memristor_errors import Errors, RandomErrorGen
+from .stats import SimulationStats
+
+
+def sample_sparse_defects(rng, reg: RandomErrorGen, num_memristors: int):
+    """Return (sorted memristor indices, Errors codes) of the defective memristors.
+
+    Each memristor is defective with probability reg.pSA1 (the sum of the error
+    probabilities), independently, as with one RandomErrorGen draw per memristor.
+    """
+    p_defect = reg.pSA1
+    if p_defect <= 0 or num_memristors == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    indices = []
+    last = -1
+    expected = p_defect * num_memristors
+    while last < num_memristors:
+        batch = int(expected + 5 * np.sqrt(expected) + 16)
+        positions = last + np.cumsum(rng.geometric(p_defect, size=batch))
+        indices.append(positions[positions < num_memristors])
+        last = positions[-1]
+    indices = np.concatenate(indices)
+
+    # Conditional error of a defective memristor, same intervals as RandomErrorGen.gen
+    u = rng.random(indices.size) * p_defect
+    errors = np.where(u < reg.pUD, Errors.UD, np.where(u < reg.pSA0, Errors.SA0, Errors.SA1))
+    return indices, errors
+
+
+class SparseFaultSimulator(FaultSimulator):
+    """FaultSimulator drawing only the defective memristors.
+
+    Produces the same outputs (defect_edges, statistics, report, faulty rr_graph or delta)
+    as FaultSimulator, from a numpy random generator instead of the random module.
+    :param seed: Seed or numpy Generator of the defect draws
+    """
+
+    def __init__(self, cell_type, rr_graph_file: Path, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0., seed=None):  # noqa: E501, E252
+        """Build the muxes once and index their memristors."""
+        super().__init__(cell_type, rr_graph_file, p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+        self.rng = np.random.default_rng(seed)
+        # Memristors of mux i are numbered memristor_offsets[i]:memristor_offsets[i + 1]
+        self.num_cells = np.array([len(mux.cell_list) for mux in self.muxes], dtype=np.int64)
+        self.memristor_offsets = np.concatenate(
+            ([0], np.cumsum(self.num_cells * cell_type.num_memristors)))
+        self.mux_sizes = np.array([len(mux.src_node_list) for mux in self.muxes], dtype=np.int64)
+        # Every mux of a given size has the same number of cells
+        self.sizes, first, self.size_counts = np.unique(self.mux_sizes, return_index=True,
+                                                        return_counts=True)
+        self.size_cells = self.num_cells[first]
+
+    def _simulate_defective_mux(self, mux, memristors, errors, stats, defect_edges):
+        num_memristors = self.cell_type.num_memristors
+        for memristor, error in zip(memristors, errors):
+            mux.cell_list[memristor // num_memristors].set_memristor(
+                memristor % num_memristors, error)
+        mux.compute_block_errors()
+        mux_defect_edges = mux.get_defect_edges()
+        defect_edges.update(mux_defect_edges)
+        stats.add_mux(mux, mux_defect_edges)
+        # Leave the mux fault-free for the next run
+        for memristor in memristors:
+            mux.cell_list[memristor // num_memristors].set_memristor(
+                memristor % num_memristors, Errors.FF)
+
+    def simulate(self):
+        """Sample the defective memristors only and return the SimulationStats."""
+        # Setup
+        stats = SimulationStats()
+        defect_edges = dict()
+        sim_start = datetime.now()
+
+        # Simulation itself, only muxes holding a defective memristor
+        indices, errors = sample_sparse_defects(self.rng, self.reg,
+                                                int(self.memristor_offsets[-1]))
+        mux_ids = np.searchsorted(self.memristor_offsets, indices, side="right") - 1
+        defective, starts = np.unique(mux_ids, return_index=True)
+        bounds = np.append(starts, indices.size)
+        local = indices - self.memristor_offsets[mux_ids]
+        for k, i in enumerate(defective.tolist()):
+            self._simulate_defective_mux(self.muxes[i], local[bounds[k]:bounds[k + 1]].tolist(),
+                                         errors[bounds[k]:bounds[k + 1]].tolist(),
+                                         stats, defect_edges)
+
+        # Every other mux is fault-free
+        fault_free = self.size_counts - np.bincount(
+            np.searchsorted(self.sizes, self.mux_sizes[defective]), minlength=self.sizes.size)
+        for size, num_cells, count in zip(self.sizes.tolist(), self.size_cells.tolist(),
+                                          fault_free.tolist()):
+            if count:
+                stats.add_fault_free(size, num_cells, count)
+
+        self.sim_time = (datetime.now() - sim_start).total_seconds()
+        self.stats = stats
+        self.unusable_count = stats.unusable.unusable
+        self.defect_edges = defect_edges
+        self.cell_errors_counter = stats.cell_errors
+        self.defect_edge_count = self.get_mux_edge_count(self.defect_edges)
+        return stats
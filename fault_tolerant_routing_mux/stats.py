@@ -0,0 +1,236 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Constant-memory statistics accumulators for fault simulations.
+
+Every accumulator folds a batch of results into fixed-size counters, so memory
+does not grow with the number of iterations or the size of the device. Accumulators
+of independent shards (processes, chunks, checkpoints) are combined with merge().
+
+>>> stats = SimulationStats()
+>>> stats.add_mux(mux)
+>>> stats.merge(other_shard_stats)
+>>> stats.save("checkpoint.json")
+"""
+import json
+import numpy as np
+
+from .memristor_errors import Errors
+
+NUM_ERRORS = 4  # FF, SA0, SA1, UD
+
+
+class ErrorHistogram():
+    """Number of cells per error, indexed by Errors code."""
+
+    def __init__(self, counts=None):
+        """Initialize empty or from given counts."""
+        self.counts = np.zeros(NUM_ERRORS, dtype=np.int64)
+        if counts is not None:
+            self.counts += np.asarray(counts, dtype=np.int64)
+
+    def update(self, errors):
+        """Count a batch of cell errors (any array-like of Errors codes)."""
+        errors = np.asarray(errors, dtype=np.intp).ravel()
+        self.counts += np.bincount(errors, minlength=NUM_ERRORS)
+
+    def merge(self, other):
+        """Add the counts of another histogram."""
+        self.counts += other.counts
+        return self
+
+    def total(self):
+        """Return the number of counted cells."""
+        return int(self.counts.sum())
+
+    def __getitem__(self, error):
+        return int(self.counts[error])
+
+    def __eq__(self, other):
+        return isinstance(other, ErrorHistogram) and np.array_equal(self.counts, other.counts)
+
+    def to_dict(self):
+        return {"counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["counts"])
+
+
+class UnusableCounter():
+    """Number of unusable muxes among all counted muxes."""
+
+    def __init__(self, unusable: int = 0, total: int = 0):
+        """Initialize empty or from given counts."""
+        self.unusable = unusable
+        self.total = total
+
+    def update(self, unusable_flags):
+        """Count a batch of unusable flags (bool or array-like of bools)."""
+        flags = np.asarray(unusable_flags, dtype=bool)
+        self.unusable += int(flags.sum())
+        self.total += flags.size
+
+    def merge(self, other):
+        """Add the counts of another counter."""
+        self.unusable += other.unusable
+        self.total += other.total
+        return self
+
+    def rate(self):
+        """Return the ratio of unusable muxes."""
+        return self.unusable / self.total if self.total else 0.
+
+    def __eq__(self, other):
+        return isinstance(other, UnusableCounter) and \
+            (self.unusable, self.total) == (other.unusable, other.total)
+
+    def to_dict(self):
+        return {"unusable": self.unusable, "total": self.total}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["unusable"], d["total"])
+
+
+class DefectSizeHistogram():
+    """Histogram of the number of defect edges per mux, kept separately per mux size.
+
+    counts[size][k] is the number of muxes with size inputs and k defect edges.
+    """
+
+    def __init__(self, counts=None):
+        """Initialize empty or from given {size: histogram}."""
+        self.counts = dict()
+        for size, hist in (counts or {}).items():
+            self.counts[int(size)] = np.asarray(hist, dtype=np.int64).copy()
+
+    def _histogram(self, size):
+        if size not in self.counts:
+            self.counts[size] = np.zeros(size + 1, dtype=np.int64)
+        return self.counts[size]
+
+    def update(self, mux_sizes, defect_counts):
+        """Count a batch of muxes given their sizes and defect edge counts."""
+        mux_sizes = np.asarray(mux_sizes, dtype=np.intp).ravel()
+        defect_counts = np.asarray(defect_counts, dtype=np.intp).ravel()
+        for size in np.unique(mux_sizes):
+            size = int(size)
+            self._histogram(size)[:] += np.bincount(defect_counts[mux_sizes == size],
+                                                    minlength=size + 1)
+
+    def add(self, mux_size: int, defect_count: int, count: int = 1):
+        """Count a single mux (or count identical ones), cheaper than update()."""
+        self._histogram(mux_size)[defect_count] += count
+
+    def merge(self, other):
+        """Add the counts of another histogram."""
+        for size, hist in other.counts.items():
+            self._histogram(size)[:] += hist
+        return self
+
+    def defect_edges(self):
+        """Return the total number of defect edges."""
+        return int(sum((hist * np.arange(hist.size)).sum() for hist in self.counts.values()))
+
+    def edges(self):
+        """Return the total number of mux edges."""
+        return int(sum(hist.sum() * size for size, hist in self.counts.items()))
+
+    def defect_rate(self):
+        """Return the ratio of defect edges among all mux edges."""
+        edges = self.edges()
+        return self.defect_edges() / edges if edges else 0.
+
+    def __eq__(self, other):
+        return isinstance(other, DefectSizeHistogram) and \
+            self.counts.keys() == other.counts.keys() and \
+            all(np.array_equal(hist, other.counts[size]) for size, hist in self.counts.items())
+
+    def to_dict(self):
+        return {"counts": {str(size): hist.tolist() for size, hist in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["counts"])
+
+
+class SimulationStats():
+    """Cell errors, unusable muxes and defect edges of a simulation."""
+
+    def __init__(self, cell_errors=None, unusable=None, defects=None):
+        """Initialize empty accumulators."""
+        self.cell_errors = cell_errors or ErrorHistogram()
+        self.unusable = unusable or UnusableCounter()
+        self.defects = defects or DefectSizeHistogram()
+
+    def add_mux(self, mux, mux_defect_edges=None):
+        """Fold a simulated RoutingMux into the accumulators.
+
+        :param mux_defect_edges: Result of mux.get_defect_edges() if already computed
+        """
+        if mux_defect_edges is None:
+            mux_defect_edges = mux.get_defect_edges()
+        self.cell_errors.update(mux.get_cell_errors())
+        self.unusable.update(mux.get_mux_unusable())
+        defect_count = sum(len(edges) for edges in mux_defect_edges.values())
+        self.defects.add(len(mux.src_node_list), defect_count)
+
+    def add_fault_free(self, mux_size: int, num_cells: int, count: int = 1):
+        """Count muxes whose cells are all fault-free without simulating them."""
+        self.cell_errors.counts[Errors.FF] += num_cells * count
+        self.unusable.total += count
+        self.defects.add(mux_size, 0, count)
+
+    def merge(self, other):
+        """Add the counts of another SimulationStats."""
+        self.cell_errors.merge(other.cell_errors)
+        self.unusable.merge(other.unusable)
+        self.defects.merge(other.defects)
+        return self
+
+    def summary(self):
+        """Return (% unusable, % defect edges, # SA0, # SA1, # UD) as ratios and counts."""
+        return (self.unusable.rate(),
+                self.defects.defect_rate(),
+                self.cell_errors[Errors.SA0],
+                self.cell_errors[Errors.SA1],
+                self.cell_errors[Errors.UD])
+
+    def __eq__(self, other):
+        return isinstance(other, SimulationStats) and \
+            (self.cell_errors, self.unusable, self.defects) == \
+            (other.cell_errors, other.unusable, other.defects)
+
+    def to_dict(self):
+        return {"cell_errors": self.cell_errors.to_dict(),
+                "unusable": self.unusable.to_dict(),
+                "defects": self.defects.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(ErrorHistogram.from_dict(d["cell_errors"]),
+                   UnusableCounter.from_dict(d["unusable"]),
+                   DefectSizeHistogram.from_dict(d["defects"]))
+
+    def save(self, path):
+        """Write a checkpoint that can be loaded and merged later."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """Read a checkpoint written by save()."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
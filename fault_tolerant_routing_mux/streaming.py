@@ -0,0 +1,138 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Two-pass streaming fault simulation for rr_graphs that do not fit in memory as a DOM."""
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+from .core import FaultSimulator
+from .edge_scanner import scan_mux_edges
+from .mux import RoutingMux
+from .rr_graph_parser import RRGraphStreamer
+from .stats import SimulationStats
+
+
+class StreamingFaultSimulator(FaultSimulator):
+    """FaultSimulator that streams the rr_graph instead of loading it.
+
+    The first pass (at init) extracts the mux <edge>s with scan_mux_edges, which drops
+    every other edge chunk by chunk, and keeps only the per-sink input lists of muxes as
+    packed integer arrays. run_simulation samples the defects one mux at a time and then
+    streams the input file to the faulty rr_graph, dropping defect edges on the fly. Peak
+    memory is therefore bounded by a few integers per mux edge, not by the size of the
+    XML tree nor by the total number of edges.
+
+    Muxes are visited in the same order and with the same inputs as in FaultSimulator,
+    so both produce the same defects for the same random state.
+    >>> fault_sim = StreamingFaultSimulator(ProtoVoterCell, rr_graph_file=file_pathname, p=0.003)
+    >>> fault_sim.run_simulation()
+    """
+
+    def __init__(self, cell_type, rr_graph_file: Path, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0., workers: int=None):  # noqa: E501, E252
+        """Scan mux edges of the rr_graph into compact arrays.
+
+        :param workers: Worker processes of the edge scanner, see scan_mux_edges
+        """
+        self.streamer = RRGraphStreamer(rr_graph_file)
+        self.base_rr_graph_file = rr_graph_file
+        edges, self.total_edge_count = scan_mux_edges(rr_graph_file, workers=workers)
+        for switch_id, name in edges.switch_names.items():
+            self.streamer.set_switch(switch_id, name)
+        sinks, srcs = edges.sink, edges.src
+        self.mux_edge_count = sinks.size
+        self._group_mux_edges(sinks, srcs)
+        self.defect_edges = dict()
+        # [:-4] gets name up to extension (.xml)
+        self.rr_graph_file = str(rr_graph_file)[:-4]
+        self.out_file = rr_graph_file.parents[0] / "fault_sim.out"
+        self.cell_type = cell_type
+        self.set_probabilities(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+
+    def _group_mux_edges(self, sinks, srcs):
+        """Group mux edges by sink, muxes ordered by first appearance in the file.
+
+        :self.mux_sinks: sink node of each mux
+        :self.mux_offsets: mux i owns grouped edges mux_offsets[i]:mux_offsets[i + 1]
+        :self.mux_srcs: source nodes grouped by mux, in file order within each mux
+        :self.mux_edge_index: position in the file's mux edge sequence of each grouped edge
+        """
+        unique_sinks, first_index, inverse, counts = np.unique(
+            sinks, return_index=True, return_inverse=True, return_counts=True)
+        mux_order = np.argsort(first_index, kind="stable")
+        rank = np.empty_like(mux_order)
+        rank[mux_order] = np.arange(mux_order.size)
+
+        self.mux_sinks = unique_sinks[mux_order]
+        self.num_muxes = self.mux_sinks.size
+        self.mux_offsets = np.concatenate(([0], np.cumsum(counts[mux_order])))
+        self.mux_edge_index = np.argsort(rank[inverse], kind="stable")
+        self.mux_srcs = srcs[self.mux_edge_index]
+        if self.mux_edge_index.size <= np.iinfo(np.int32).max:
+            self.mux_edge_index = self.mux_edge_index.astype(np.int32)
+
+    def simulate(self):
+        """Sample defects one transient RoutingMux at a time and return the SimulationStats.
+
+        Also records the positions of the defect edges in the file's mux edge sequence,
+        used by the second pass.
+        """
+        # Setup
+        stats = SimulationStats()
+        defect_edges = dict()
+        defect_mask = np.zeros(self.mux_edge_count, dtype=bool)
+        sim_start = datetime.now()
+
+        # Simulation itself, one transient RoutingMux at a time
+        for i in range(self.num_muxes):
+            start, end = self.mux_offsets[i], self.mux_offsets[i + 1]
+            sources = self.mux_srcs[start:end].tolist()
+            mux = RoutingMux(int(self.mux_sinks[i]), sources, self.cell_type)
+            mux.set_errors(self.reg)
+            mux.compute_block_errors()
+            mux_defects = mux.get_defect_edges()
+            stats.add_mux(mux, mux_defects)
+            if mux_defects:
+                defect_edges.update(mux_defects)
+                defect_sources = mux_defects[mux.sink_node]
+                defect_mask[self.mux_edge_index[start:end][
+                    [src in defect_sources for src in sources]]] = True
+
+        self.sim_time = (datetime.now() - sim_start).total_seconds()
+        self.stats = stats
+        self.unusable_count = stats.unusable.unusable
+        self.defect_edges = defect_edges
+        self.defect_positions = np.flatnonzero(defect_mask)
+        self.cell_errors_counter = stats.cell_errors
+        self.defect_edge_count = self.get_mux_edge_count(self.defect_edges)
+        return stats
+
+    def _write_defect_rr_graph_file(self):
+        """Second pass: stream the rr_graph dropping the defect mux edge positions."""
+        mux_ids = self.streamer.get_mux_switch_ids()
+        defect_positions = iter(self.defect_positions.tolist())
+        next_defect = next(defect_positions, -1)
+        mux_edge_position = -1
+
+        def keep_edge(edge):
+            nonlocal next_defect, mux_edge_position
+            if edge.attrib['switch_id'] not in mux_ids:
+                return True
+            mux_edge_position += 1
+            if mux_edge_position != next_defect:
+                return True
+            next_defect = next(defect_positions, -1)
+            return False
+
+        self.streamer.write_rr_graph(self.faulty_rr_graph_file, keep_edge)
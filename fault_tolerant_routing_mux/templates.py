@@ -0,0 +1,198 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Tile-template deduplication of the routing muxes of a rr_graph.
+
+rr_graphs repeat the same tiles over the whole device, so most muxes only differ
+by their node ids. The muxes parsed by RRGraphParser are grouped by structural
+signature (switch type and number of inputs): a MuxTemplate holds the shared
+structure once and the node ids of its instances as (instances,) and
+(instances, size) integer arrays. No RoutingMux object is built; every template
+is simulated as one batch of independent trials with the bit-sliced evaluation
+of bitsliced.py, instance t of the batch being trial t.
+
+>>> fault_sim = TemplateFaultSimulator(ProtoVoterCell, rr_graph_file=file_pathname, p=0.003)
+>>> fault_sim.run_simulation(delta=True)
+"""
+from datetime import datetime
+from math import ceil
+from pathlib import Path
+from typing import Dict, NamedTuple
+import numpy as np
+
+from .bitsliced import cell_planes, count_cell_errors, evaluate_mux_inputs, sample_memristors, \
+    unpack_bits
+from .core import FaultSimulator
+from .memristor_errors import RandomErrorGen
+from .mux import optimal_block_size
+from .rr_graph_parser import RRGraphParser
+from .stats import SimulationStats
+
+
+class MuxTemplate(NamedTuple):
+    """Muxes sharing a structure: instance i has output sinks[i] and inputs srcs[i]."""
+
+    switch: str
+    size: int
+    sinks: np.ndarray
+    srcs: np.ndarray
+
+    @property
+    def num_cells(self):
+        """Number of control cells of the mux structure (both stages)."""
+        block_size = optimal_block_size(self.size)
+        return block_size + ceil(self.size / block_size)
+
+    def __len__(self):
+        return self.sinks.size
+
+
+def group_muxes(mux_dict: Dict, mux_switches: Dict = None):
+    """Group the muxes of {sink: [source nodes]} by (switch name, number of inputs).
+
+    :param mux_switches: {sink: switch name} as RRGraphParser.get_mux_switches(),
+                         every mux has the same switch if None
+    :return: List of MuxTemplate sorted by signature, instances in mux_dict order
+    """
+    groups = dict()
+    for sink, sources in mux_dict.items():
+        switch = mux_switches[sink] if mux_switches is not None else None
+        groups.setdefault((switch, len(sources)), []).append(sink)
+
+    templates = []
+    for (switch, size), sinks in sorted(groups.items(), key=_signature_order):
+        srcs = np.array([mux_dict[sink] for sink in sinks], dtype=np.int64).reshape(-1, size)
+        templates.append(MuxTemplate(switch, size, np.array(sinks, dtype=np.int64), srcs))
+    return templates
+
+
+def _signature_order(group):
+    (switch, size), _ = group
+    return str(switch), size
+
+
+def group_mux_edges(edges):
+    """Group the muxes of scanned EdgeArrays, same templates as group_muxes of RRGraphParser.
+
+    Vectorized: no per-mux Python object is created, muxes are ordered by first
+    appearance of their sink and inputs in file order, as in RRGraphParser.
+    """
+    mask = np.isin(edges.switch, edges.mux_switch_ids())
+    sinks, srcs, switches = edges.sink[mask], edges.src[mask], edges.switch[mask]
+    unique_sinks, first_index, inverse, counts = np.unique(
+        sinks, return_index=True, return_inverse=True, return_counts=True)
+    mux_order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(mux_order)
+    rank[mux_order] = np.arange(mux_order.size)
+    edge_order = np.argsort(rank[inverse], kind="stable")
+
+    grouped_srcs = srcs[edge_order].astype(np.int64)
+    mux_sinks = unique_sinks[mux_order].astype(np.int64)
+    mux_sizes = counts[mux_order]
+    offsets = np.concatenate(([0], np.cumsum(mux_sizes)))
+    # The switch of a mux is the one of its last edge, as in RRGraphParser
+    mux_switches = switches[edge_order][offsets[1:] - 1]
+
+    groups = dict()
+    for switch_id in np.unique(mux_switches).tolist():
+        for size in np.unique(mux_sizes[mux_switches == switch_id]).tolist():
+            muxes = np.flatnonzero((mux_switches == switch_id) & (mux_sizes == size))
+            groups[edges.switch_names[switch_id], size] = muxes
+
+    templates = []
+    for (switch, size), muxes in sorted(groups.items(), key=_signature_order):
+        srcs = grouped_srcs[offsets[muxes][:, None] + np.arange(size)]
+        templates.append(MuxTemplate(switch, size, mux_sinks[muxes], srcs))
+    return templates
+
+
+def evaluate_template(template: MuxTemplate, cells, num_trials: int):
+    """Return (unusable flags (instances,), defect input mask (instances, size)).
+
+    :param cells: One-hot cell planes of the instances (see bitsliced.cell_planes),
+                  instance t being trial t
+    """
+    unusable, inputs = evaluate_mux_inputs(template.size, cells)
+    dead = unpack_bits(np.stack(inputs), num_trials).T
+    return unpack_bits(unusable, num_trials), dead
+
+
+def simulate_template(template: MuxTemplate, cell_type, reg: RandomErrorGen, rng,
+                      stats: SimulationStats, defect_edges: Dict, batch_muxes: int = 1 << 16):
+    """Sample the defects of every instance of a template, in batches of batch_muxes.
+
+    Folds the instances into stats and their defect edges into {sink: {sources}}.
+    """
+    num_memristors = template.num_cells * cell_type.num_memristors
+    for start in range(0, len(template), batch_muxes):
+        sinks = template.sinks[start:start + batch_muxes]
+        srcs = template.srcs[start:start + batch_muxes]
+        hi, lo = sample_memristors(rng, reg, num_memristors, sinks.size)
+        cells = cell_planes(cell_type, hi, lo)
+        unusable, dead = evaluate_template(template, cells, sinks.size)
+
+        defect_counts = np.zeros(sinks.size, dtype=np.int64)
+        for i in np.flatnonzero(dead.any(axis=1)).tolist():
+            sources = set(srcs[i][dead[i]].tolist())
+            defect_edges[int(sinks[i])] = sources
+            defect_counts[i] = len(sources)
+
+        stats.cell_errors.counts += count_cell_errors(cells, sinks.size)
+        stats.unusable.update(unusable)
+        stats.defects.update(np.full(sinks.size, template.size), defect_counts)
+
+
+class TemplateFaultSimulator(FaultSimulator):
+    """FaultSimulator evaluating template batches instead of RoutingMux objects.
+
+    Produces the same outputs (defect_edges, statistics, report, faulty rr_graph or delta)
+    as FaultSimulator, from a numpy random generator instead of the random module.
+    :param seed: Seed or numpy Generator of the defect draws
+    :param batch_muxes: Instances of a template evaluated together, bounds memory
+    """
+
+    def __init__(self, cell_type, rr_graph_file: Path, p: float=None, pSA0: float=0., pSA1: float=0., pUD: float=0., seed=None, batch_muxes: int=1 << 16):  # noqa: E501, E252
+        """Parse the rr_graph and group its muxes into templates."""
+        self.rrg = RRGraphParser(rr_graph_file)
+        self.base_rr_graph_file = rr_graph_file
+        self.total_edge_count = self.get_total_edge_count()
+        self.mux_edge_count = self.get_mux_edge_count(self.rrg.get_mux_dict())
+        self.templates = group_muxes(self.rrg.get_mux_dict(), self.rrg.get_mux_switches())
+        self.num_muxes = sum(len(template) for template in self.templates)
+        self.defect_edges = dict()
+        # [:-4] gets name up to extension (.xml)
+        self.rr_graph_file = str(rr_graph_file)[:-4]
+        self.out_file = rr_graph_file.parents[0] / "fault_sim.out"
+        self.cell_type = cell_type
+        self.rng = np.random.default_rng(seed)
+        self.batch_muxes = batch_muxes
+        self.set_probabilities(p=p, pSA0=pSA0, pSA1=pSA1, pUD=pUD)
+
+    def simulate(self):
+        """Sample defects of every template batch and return the SimulationStats."""
+        stats = SimulationStats()
+        defect_edges = dict()
+        sim_start = datetime.now()
+
+        for template in self.templates:
+            simulate_template(template, self.cell_type, self.reg, self.rng, stats, defect_edges,
+                              self.batch_muxes)
+
+        self.sim_time = (datetime.now() - sim_start).total_seconds()
+        self.stats = stats
+        self.unusable_count = stats.unusable.unusable
+        self.defect_edges = defect_edges
+        self.cell_errors_counter = stats.cell_errors
+        self.defect_edge_count = self.get_mux_edge_count(self.defect_edges)
+        return stats
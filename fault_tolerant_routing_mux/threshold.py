@@ -0,0 +1,206 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Inverse query: highest defect probability keeping a rate below a target.
+
+The unusable mux ratio and the defect edge ratio grow with the memristor defect
+probability p (pSA0 = pSA1 = pUD = p, as in standalone_sim). The threshold p* where
+a rate reaches its target is found by root finding on p:
+
+- exactly, with the rates of distribution.expected_rates and the Illinois variant
+  of regula falsi, which keeps a bracket of the root and converges superlinearly,
+- by noisy bisection on bit-sliced simulations otherwise: the midpoint is only
+  classified once the confidence interval of its rate is entirely below or above
+  the target, doubling the trials until it is. If max_trials is reached first the
+  search stops with the current bracket, the threshold is not resolvable below it.
+
+>>> threshold = max_tolerable_probability(0.01, ProtoVoterCell, metric="unusable")
+>>> threshold.p, threshold.high - threshold.low
+"""
+from statistics import NormalDist
+from typing import NamedTuple
+import numpy as np
+
+from .comparison import METRICS
+from .distribution import expected_rates
+from .memristor_errors import RandomErrorGen
+from .stats import SimulationStats
+
+EXACT, NOISY = "exact", "noisy"
+# pSA0 + pSA1 + pUD = 3p cannot exceed 1
+MAX_PROBABILITY = 1 / 3
+
+
+class Threshold(NamedTuple):
+    """Threshold estimate p, bracketed by [low, high], and the evaluations it took."""
+
+    p: float
+    low: float
+    high: float
+    evaluations: int
+    method: str
+
+
+def _mux_sizes(mux_sizes):
+    if isinstance(mux_sizes, int):
+        return {mux_sizes: 1}
+    if not isinstance(mux_sizes, dict):
+        return {size: 1 for size in mux_sizes}
+    return mux_sizes
+
+
+def exact_rate(p: float, cell_type, metric: str = "unusable", mux_sizes=12):
+    """Return the exact rate of a metric over muxes of the given sizes.
+
+    :param mux_sizes: A mux size, a sequence of sizes or {mux size: number of muxes}
+    """
+    mux_sizes = _mux_sizes(mux_sizes)
+    rates = {size: expected_rates(size, cell_type, p=p) for size in mux_sizes}
+    if metric == "unusable":
+        return sum(n * rates[size][0] for size, n in mux_sizes.items()) / sum(mux_sizes.values())
+    return sum(n * size * rates[size][1] for size, n in mux_sizes.items()) / \
+        sum(n * size for size, n in mux_sizes.items())
+
+
+def _size_rate(stats: SimulationStats, size: int, metric: str):
+    """Return (rate, variance of a single mux outcome) of the muxes of one size."""
+    if metric == "unusable":
+        rate = stats.unusable.rate()
+        return rate, rate * (1 - rate)
+    hist = stats.defects.counts[size]
+    ratios = np.arange(size + 1) / size
+    rate = (hist * ratios).sum() / hist.sum()
+    return rate, (hist * (ratios - rate) ** 2).sum() / hist.sum()
+
+
+class _NoisyRate():
+    """Simulated rate at one probability, refined by adding trials."""
+
+    def __init__(self, p, cell_type, metric, mux_sizes, rng):
+        from .bitsliced import simulate_muxes
+
+        self.simulate = simulate_muxes
+        self.reg = RandomErrorGen(pSA0=p, pSA1=p, pUD=p)
+        self.cell_type = cell_type
+        self.metric = metric
+        self.mux_sizes = mux_sizes
+        self.rng = rng
+        self.stats = {size: SimulationStats() for size in mux_sizes}
+        self.num_trials = 0
+
+    def add_trials(self, num_trials: int):
+        for size, stats in self.stats.items():
+            stats.merge(self.simulate(size, self.cell_type, self.reg, num_trials, self.rng))
+        self.num_trials += num_trials
+
+    def interval(self, z: float):
+        """Return the (low, high) confidence interval of the rate."""
+        if self.metric == "unusable":
+            weights = dict(self.mux_sizes)
+        else:
+            weights = {size: n * size for size, n in self.mux_sizes.items()}
+        total = sum(weights.values())
+        rate = variance = 0.
+        for size, stats in self.stats.items():
+            size_rate, size_variance = _size_rate(stats, size, self.metric)
+            rate += weights[size] / total * size_rate
+            variance += (weights[size] / total) ** 2 * size_variance / self.num_trials
+        half_width = z * np.sqrt(variance)
+        return rate - half_width, rate + half_width
+
+
+def _illinois(f, low, high, f_low, f_high, tolerance, max_evaluations):
+    """Illinois regula falsi on f increasing, f(low) <= 0 < f(high)."""
+    evaluations = 0
+    side = 0
+    while high - low > tolerance and evaluations < max_evaluations:
+        p = (low * f_high - high * f_low) / (f_high - f_low)
+        # Never let the secant point stick to a bracket end
+        p = min(max(p, low + tolerance / 4), high - tolerance / 4)
+        f_p = f(p)
+        evaluations += 1
+        if f_p == 0:
+            return p, p, evaluations
+        if f_p < 0:
+            low, f_low = p, f_p
+            if side == -1:
+                f_high /= 2
+            side = -1
+        else:
+            high, f_high = p, f_p
+            if side == 1:
+                f_low /= 2
+            side = 1
+    return low, high, evaluations
+
+
+def max_tolerable_probability(target: float, cell_type, metric: str = "unusable", mux_sizes=12,
+                              method: str = None, tolerance: float = 1e-5,
+                              num_trials: int = 100000, max_trials: int = 10**7,
+                              confidence: float = .95, seed=None, max_evaluations: int = 60):
+    """Return the Threshold of p where the rate of metric reaches target.
+
+    :param target: Highest acceptable rate, e.g. 0.01 for 1% unusable muxes
+    :param metric: "unusable" (unusable mux ratio) or "defects" (defect edge ratio)
+    :param mux_sizes: A mux size, a sequence of sizes or {mux size: number of muxes}
+                      (e.g. the Counter of the mux sizes of a rr_graph)
+    :param method: EXACT or NOISY, EXACT if the cell type provides error_distribution
+    :param tolerance: Width of the bracket at which the search stops
+    :param num_trials: Initial trials per mux size of a NOISY evaluation
+    :param max_trials: Trials per mux size at which a NOISY evaluation gives up
+    :param seed: Seed or numpy Generator of the NOISY simulations
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric!r}, expected one of {METRICS}")
+    if not 0 < target < 1:
+        raise ValueError("target must be a rate between 0 and 1")
+    if method is None:
+        method = EXACT if hasattr(cell_type, "error_distribution") else NOISY
+    mux_sizes = _mux_sizes(mux_sizes)
+
+    if method == EXACT:
+        def excess(p):
+            return exact_rate(p, cell_type, metric, mux_sizes) - target
+
+        f_high = excess(MAX_PROBABILITY)
+        if f_high <= 0:
+            return Threshold(MAX_PROBABILITY, MAX_PROBABILITY, MAX_PROBABILITY, 1, method)
+        low, high, evaluations = _illinois(excess, 0., MAX_PROBABILITY, -target, f_high,
+                                           tolerance, max_evaluations)
+        return Threshold((low + high) / 2, low, high, evaluations + 1, method)
+
+    if method != NOISY:
+        raise ValueError(f"unknown method {method!r}")
+    rng = np.random.default_rng(seed)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    low, high, evaluations = 0., MAX_PROBABILITY, 0
+    while high - low > tolerance and evaluations < max_evaluations:
+        p = (low + high) / 2
+        rate = _NoisyRate(p, cell_type, metric, mux_sizes, rng)
+        rate.add_trials(num_trials)
+        evaluations += 1
+        while True:
+            rate_low, rate_high = rate.interval(z)
+            if rate_high < target:
+                low = p
+                break
+            if rate_low > target:
+                high = p
+                break
+            if rate.num_trials * 2 > max_trials:
+                # Rate indistinguishable from the target at max_trials
+                return Threshold(p, low, high, evaluations, method)
+            rate.add_trials(rate.num_trials)
+            evaluations += 1
+    return Threshold((low + high) / 2, low, high, evaluations, method)
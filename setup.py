@@ -8,7 +8,11 @@ setup(
     description="Analysis and simulation of fault tolerant routing multiplexers",
     license="Apache 2.0",
     version="0.1.0",
-    packages="",
+    packages=["fault_tolerant_routing_mux"],
     install_requires=['numpy'],
+    extras_require={'plot': ['matplotlib']},
+    entry_points={
+        'console_scripts': ['ftrm=fault_tolerant_routing_mux.cli:main'],
+    },
     python_requires='>=3.8'
 )
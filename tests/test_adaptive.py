@@ -0,0 +1,76 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the adaptive probability grid."""
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.adaptive import adaptive_grid, adaptive_standalone_sim, \
+    interval_scores
+from fault_tolerant_routing_mux.control_cell import ProtoVoterCell
+
+
+def knee(p):
+    """Logistic curve bending sharply around p = 0.06."""
+    return 1 / (1 + np.exp(-(p - 0.06) * 200))
+
+
+def evaluate(p_array):
+    return {p: knee(p) for p in p_array}
+
+
+def test_interval_scores():
+    change, curvature = interval_scores([0, 1, 2, 3], [0, 0, 1, 1])
+    assert change.tolist() == [0, 1, 0]
+    assert curvature.tolist() == [0.5, 0.5, 0.5]
+    change, curvature = interval_scores([0, 1, 3], [[0, 0], [1, 2], [3, 6]])
+    assert change.tolist() == [2, 4]
+    assert curvature.tolist() == [0, 0]
+
+def test_linear_curve_is_not_refined():
+    grid = adaptive_grid(lambda ps: {p: 2 * p for p in ps}, [0, .05, .1, .15], tolerance=.2)
+    assert grid.p == [0, .05, .1, .15] and grid.rounds == 0
+
+def test_refines_around_knee():
+    grid = adaptive_grid(evaluate, np.arange(0, .155, .05), tolerance=.02, max_points=40)
+    assert len(grid.p) <= 40 and grid.rounds > 0
+    assert grid.p == sorted(grid.p) and list(grid.results) == grid.p
+    spacing = np.diff(grid.p)
+    near_knee = [s for q, s in zip(grid.p, spacing) if .04 <= q <= .08]
+    far = [s for q, s in zip(grid.p, spacing) if q >= .1]
+    assert max(near_knee) < min(far)
+    # Much fewer points than the uniform grid reaching the same resolution
+    assert len(grid.p) < .15 / spacing.min() / 2
+
+def test_point_budget():
+    grid = adaptive_grid(evaluate, [0, .15], tolerance=1e-6, max_points=9)
+    assert len(grid.p) == 9
+    calls = []
+    adaptive_grid(lambda ps: calls.append(list(ps)) or evaluate(ps), [0, .15],
+                  tolerance=1e-6, max_points=9)
+    assert sum(len(c) for c in calls) == 9
+
+def test_min_width():
+    grid = adaptive_grid(lambda ps: {p: float(p > .07) for p in ps}, [0, .16],
+                         tolerance=.01, max_points=1000, min_width=.01)
+    assert min(np.diff(grid.p)) > .005
+    with pytest.raises(ValueError):
+        adaptive_grid(evaluate, [.1])
+
+def test_adaptive_standalone_sim(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    grid = adaptive_standalone_sim([0, .1, .2], 2000, ProtoVoterCell, tolerance=.05,
+                                   max_points=8, seed=0)
+    assert 3 <= len(grid.p) <= 8
+    assert grid.results[0][:2] == (0., 0.)
+    assert (tmp_path / "fault_sim.rpt").exists()
@@ -0,0 +1,81 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the event-driven aging simulation."""
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.aging import AgingSimulator
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.memristor_errors import Errors
+from fault_tolerant_routing_mux.mux import RoutingMux
+
+
+def build_muxes(cell_type, n=200):
+    return [RoutingMux(i, list(range(4 + i % 9)), cell_type) for i in range(n)]
+
+def full_state(muxes):
+    for mux in muxes:
+        mux.compute_block_errors()
+    return (sum(mux.get_mux_unusable() for mux in muxes),
+            sum(len(s) for mux in muxes for s in mux.get_defect_edges().values()))
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_set_memristor(cell_type):
+    cell = cell_type()
+    for index in range(cell.num_memristors):
+        cell.set_memristor(index, Errors.UD)
+        assert cell.get_memristor(index) == Errors.UD
+    assert cell.get_cell_error() == Errors.UD
+
+def test_no_failures():
+    aging = AgingSimulator(build_muxes(MemCell), seed=0)
+    series = aging.run([0., 10., 100.])
+    assert series.unusable.tolist() == [0, 0, 0]
+    assert series.defect_edges.tolist() == [0, 0, 0]
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_incremental_matches_full_evaluation(cell_type):
+    muxes = build_muxes(cell_type)
+    aging = AgingSimulator(muxes, rate_SA0=1e-3, rate_SA1=1e-3, rate_UD=5e-4, seed=1)
+    first = aging.run(np.linspace(0, 50, 6))
+    assert (first.unusable[-1], first.defect_edges[-1]) == full_state(muxes)
+    assert np.all(np.diff(first.failed_memristors) >= 0)
+    assert first.times[-1] == aging.time
+
+def test_continue_after_drawing_longer_horizon():
+    muxes = build_muxes(ProtoVoterCell)
+    aging = AgingSimulator(muxes, rate_SA0=1e-3, rate_SA1=1e-3, rate_UD=1e-3, seed=2)
+    aging.draw_failures(100.)
+    aging.run([0., 50.])
+    series = aging.run([75., 100.])
+    assert (series.unusable[-1], series.defect_edges[-1]) == full_state(muxes)
+    with pytest.raises(ValueError):
+        aging.run([150.])
+
+def test_failure_fraction():
+    muxes = build_muxes(MemCell, 2000)
+    aging = AgingSimulator(muxes, rate_SA0=1e-2, rate_SA1=1e-2, seed=3)
+    series = aging.run([10.])
+    expected = aging.num_memristors * (1 - np.exp(-0.2))
+    assert series.failed_memristors[0] == pytest.approx(expected, rel=0.05)
+
+def test_production_defects_are_kept():
+    muxes = build_muxes(MemCell, 10)
+    for mux in muxes:
+        for cell in mux.cell_list:
+            cell.set_errors(Errors.SA0, Errors.SA0)
+    aging = AgingSimulator(muxes, rate_UD=1., seed=4)
+    series = aging.run([100.])
+    assert series.failed_memristors[0] == 0
+    assert all(cell.get_memristor(0) == Errors.SA0 for mux in muxes for cell in mux.cell_list)
@@ -0,0 +1,115 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the batch driver over manifests of rr_graphs."""
+import asyncio
+import json
+import os
+import shutil
+import pytest
+from fault_tolerant_routing_mux.batch import PARSE_MEMORY_RATIO, STATS, XML, BatchRunner, \
+    load_manifest, parse_graph, run_batch, simulate_run, write_batch_results
+from fault_tolerant_routing_mux.control_cell import MemCell
+from fault_tolerant_routing_mux.delta import read_delta
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+from fault_tolerant_routing_mux.templates import TemplateFaultSimulator
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def manifest(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        shutil.copy(os.path.join(BASE_DIR, "simple.xml"), tmp_path / name / "simple.xml")
+    entries = [{"rr_graph": "a/simple.xml", "cell": "MemCell", "probabilities": [0.1, 0.3],
+                "repeats": 2},
+               {"rr_graph": "b/simple.xml",
+                "probabilities": [{"pSA0": 0.2, "pSA1": 0., "pUD": 0.1}], "seed": 5}]
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps(entries))
+    return manifest
+
+def test_load_manifest(manifest, tmp_path):
+    runs = load_manifest(manifest)
+    assert [run["run"] for run in runs] == list(range(5))
+    assert runs[0]["rr_graph"] == str(tmp_path / "a" / "simple.xml")
+    assert [run["cell_type"] for run in runs] == ["MemCell"] * 4 + ["ProtoVoterCell"]
+    assert runs[4]["probabilities"] == {"pSA0": 0.2, "pSA1": 0., "pUD": 0.1}
+    assert runs[4]["seed"] == 5
+
+def test_run_batch(manifest, tmp_path):
+    runs = load_manifest(manifest)
+    results = run_batch(runs, workers=2)
+    assert [result["run"] for result in results] == list(range(5))
+    assert all("error" not in result for result in results)
+    for result in results:
+        delta = read_delta(result["output_file"])
+        assert delta.index.size == result["defect_edge_count"]
+        assert result["output_file"].endswith(f"_run{result['run']}.delta")
+    write_batch_results(results, tmp_path / "results.tsv")
+    rows = (tmp_path / "results.tsv").read_text().splitlines()
+    assert len(rows) == 6 and rows[0].startswith("run\trr_graph")
+
+def test_matches_template_simulator(manifest, tmp_path):
+    runs = load_manifest(manifest)[:1]
+    result = run_batch(runs, workers=1, output=XML)[0]
+    fault_sim = TemplateFaultSimulator(MemCell, tmp_path / "a" / "simple.xml", p=0.1,
+                                       seed=runs[0]["seed"])
+    fault_sim.simulate()
+    assert result["defect_edge_count"] == fault_sim.defect_edge_count
+    assert result["unusable_count"] == fault_sim.unusable_count
+    faulty = RRGraphParser(result["output_file"])
+    assert faulty.get_total_num_edges() == \
+        fault_sim.total_edge_count - fault_sim.defect_edge_count
+
+def test_memory_limit_serializes_graphs(manifest):
+    runs = load_manifest(manifest)
+    runner = BatchRunner(workers=2, memory_limit=1, output=STATS)
+    results = asyncio.run(runner.run(runs))
+    assert all("output_file" not in result and "error" not in result for result in results)
+    # Graphs larger than the limit still run, one at a time and one task at a time
+    estimate = int(os.path.getsize(runs[0]["rr_graph"]) * PARSE_MEMORY_RATIO)
+    parsed = parse_graph(runs[0]["rr_graph"])
+    assert runner.peak_reserved == max(estimate, 2 * parsed.nbytes)
+
+def test_reservation_covers_tasks_in_flight(manifest):
+    runs = load_manifest(manifest)
+    nbytes = parse_graph(runs[0]["rr_graph"]).nbytes
+    runner = BatchRunner(workers=3, memory_limit=10**12, output=STATS)
+    asyncio.run(runner.run(runs[:4]))
+    # Parent copy plus one copy per task in flight (3 workers, 4 runs)
+    assert runner.peak_reserved == 4 * nbytes
+    runner = BatchRunner(workers=3, memory_limit=3 * nbytes, output=STATS)
+    asyncio.run(runner.run(runs[:4]))
+    assert runner.peak_reserved == 3 * nbytes
+
+def test_limit_holds_across_graphs(manifest):
+    runs = load_manifest(manifest)
+    estimate = int(os.path.getsize(runs[0]["rr_graph"]) * PARSE_MEMORY_RATIO)
+    # Both parse estimates fit, but not both graphs once parsed
+    runner = BatchRunner(workers=3, memory_limit=2 * estimate, output=STATS)
+    results = asyncio.run(runner.run(runs))
+    assert all("error" not in result for result in results)
+    assert runner.peak_reserved <= runner.memory_limit
+
+def test_errors_are_reported(tmp_path):
+    runs = [{"run": 0, "rr_graph": str(tmp_path / "missing.xml"), "cell_type": "MemCell",
+             "probabilities": {"p": 0.1}, "seed": 0}]
+    results = run_batch(runs, workers=1)
+    assert results[0]["error"].startswith("parse failed")
+
+def test_simulate_run_is_seeded(manifest):
+    run = load_manifest(manifest)[1]
+    templates = parse_graph(run["rr_graph"]).templates
+    assert simulate_run(templates, run)[:2] == simulate_run(templates, run)[:2]
@@ -0,0 +1,98 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the bit-sliced simulation engine."""
+import itertools
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux import bitsliced
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.memristor_errors import Errors, RandomErrorGen
+from fault_tolerant_routing_mux.mux import RoutingMux
+
+
+def test_pack_bits_roundtrip():
+    bits = np.random.default_rng(0).random((3, 130)) < 0.5
+    planes = bitsliced.pack_bits(bits)
+    assert planes.shape == (3, 3) and planes.dtype == np.uint64
+    assert np.array_equal(bitsliced.unpack_bits(planes, 130), bits)
+    assert bitsliced.popcount(planes) == bits.sum()
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_cell_luts(cell_type):
+    n = cell_type.num_memristors
+    errors = np.array(list(itertools.product(range(4), repeat=n))).T  # (memristor, trial)
+    hi, lo = bitsliced.pack_bits(errors >= 2), bitsliced.pack_bits(errors % 2 == 1)
+    [planes] = bitsliced.cell_planes(cell_type, hi, lo)
+
+    for trial, memristors in enumerate(errors.T):
+        cell = cell_type()
+        if cell_type is ProtoVoterCell:
+            cell.set_errors(memristors[:2], memristors[2:])
+        else:
+            cell.set_errors(*memristors)
+        bits = [bitsliced.unpack_bits(p, errors.shape[1])[trial] for p in planes]
+        assert bits == [e == cell.get_cell_error() for e in range(4)]
+
+@pytest.mark.parametrize("mux_size", [1, 3, 5, 7])
+def test_mux_matches_object_model(mux_size):
+    mux = RoutingMux(0, list(range(mux_size)), MemCell)
+    cell_errors = np.array(list(itertools.product(range(4), repeat=len(mux.cell_list)))).T
+    # MemCell memristors (pullUp, pullDown), pullDown fault free: cell error = pullUp error
+    errors = np.zeros((2 * cell_errors.shape[0], cell_errors.shape[1]), dtype=int)
+    errors[::2] = cell_errors
+    hi, lo = bitsliced.pack_bits(errors >= 2), bitsliced.pack_bits(errors % 2 == 1)
+    unusable, counter = bitsliced.evaluate_mux(mux_size, bitsliced.cell_planes(MemCell, hi, lo))
+
+    num_trials = cell_errors.shape[1]
+    unusable = bitsliced.unpack_bits(unusable, num_trials)
+    defects = sum(bitsliced.unpack_bits(p, num_trials).astype(int) << i
+                  for i, p in enumerate(counter))
+    for trial, trial_errors in enumerate(cell_errors.T):
+        for cell, error in zip(mux.cell_list, trial_errors):
+            cell.set_errors(error, Errors.FF)
+        mux.compute_block_errors()
+        assert unusable[trial] == mux.get_mux_unusable()
+        assert defects[trial] == sum(len(s) for s in mux.get_defect_edges().values())
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_rates_match_exact_distribution(cell_type):
+    reg = RandomErrorGen(pSA0=0.03, pSA1=0.03, pUD=0.03)
+    stats = bitsliced.simulate_muxes(12, cell_type, reg, 200000, np.random.default_rng(1),
+                                     batch_trials=30000)
+    unusable, defect = expected_rates(12, cell_type, p=0.03)
+    assert stats.unusable.total == 200000
+    assert stats.unusable.rate() == pytest.approx(unusable, abs=5e-3)
+    assert stats.defects.defect_rate() == pytest.approx(defect, abs=5e-3)
+    num_cells = 3 + 4  # 12-input mux: block size 3 and 4 second stage cells
+    assert stats.cell_errors.total() == 200000 * num_cells
+
+def test_standalone_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = bitsliced.bitsliced_standalone_sim([0., 0.01], 1000, ProtoVoterCell, seed=0)
+    assert results[0.][:2] == (0., 0.)
+    assert (tmp_path / "fault_sim.rpt").exists()
+
+def test_progress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    reg = RandomErrorGen(pUD=0.01)
+    bitsliced.simulate_muxes(12, MemCell, reg, 1000, batch_trials=300,
+                             progress=lambda *args: calls.append(args))
+    assert calls == [(300, 1000), (600, 1000), (900, 1000), (1000, 1000)]
+    calls.clear()
+    bitsliced.bitsliced_standalone_sim([0., 0.01], 10, MemCell, seed=0,
+                                       progress=lambda *args: calls.append(args))
+    assert calls == [(0., 10, 10), (0.01, 10, 10)]
@@ -0,0 +1,129 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the content-addressed result cache."""
+import os
+import shutil
+import pytest
+from fault_tolerant_routing_mux import cache as cache_module
+from fault_tolerant_routing_mux.cache import (ResultCache, cached_run_simulation,
+                                              cached_standalone_sim)
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.edge_scanner import scan_rr_edges
+from fault_tolerant_routing_mux.templates import TemplateFaultSimulator
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+def _edge_set(rr_graph_file):
+    edges = scan_rr_edges(rr_graph_file, workers=0)
+    return set(zip(edges.src.tolist(), edges.sink.tolist(), edges.switch.tolist()))
+
+
+def test_key(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.key("vtr", p=0.1, seed=1)
+    assert key == cache.key("vtr", seed=1, p=0.1)
+    assert key != cache.key("vtr", p=0.1, seed=2)
+    assert key != cache.key("standalone", p=0.1, seed=1)
+    monkeypatch.setattr(cache_module, "__version__", "99.0")
+    assert key != cache.key("vtr", p=0.1, seed=1)
+
+def test_file_digest(tmp_path, rr_graph):
+    from fault_tolerant_routing_mux.delta import file_sha256
+    cache = ResultCache(tmp_path / "cache")
+    assert cache.file_digest(rr_graph) == file_sha256(rr_graph)
+    assert len(os.listdir(tmp_path / "cache" / "digests")) == 1
+    assert cache.file_digest(rr_graph) == file_sha256(rr_graph)
+    assert len(os.listdir(tmp_path / "cache" / "digests")) == 1
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=2500)
+    keys = [cache.key("test", i=i) for i in range(3)]
+    assert cache.get(keys[0]) is None
+    cache.put(keys[0], {"data": "x" * 1000})
+    assert (cache.get(keys[0]) / "data").read_text() == "x" * 1000
+    cache.put(keys[1], {"data": "y" * 1000})
+    # Use the first entry again: the second one becomes the least recently used
+    os.utime(cache.get(keys[1]) / "meta.json", ns=(1, 1))
+    os.utime(cache.get(keys[0]) / "meta.json", ns=(2, 2))
+    cache.put(keys[2], {"data": "z" * 1000})
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert len(cache) == 2 and cache.size() <= 2500
+    cache.clear()
+    assert len(cache) == 0
+    assert os.listdir(tmp_path / "cache" / "tmp") == []
+
+@pytest.mark.parametrize("delta", [True, False])
+def test_cached_run_simulation(tmp_path, rr_graph, monkeypatch, delta):
+    cache = ResultCache(tmp_path / "cache")
+    miss = cached_run_simulation(cache, ProtoVoterCell, rr_graph, p=0.2, seed=3, delta=delta)
+    assert not miss.hit
+    report = miss.report_file.read_text()
+    output = open(miss.output_file, "rb").read()
+    expected_edges = _edge_set(miss.output_file) if not delta else None
+    os.remove(miss.report_file)
+    os.remove(miss.output_file)
+
+    # A hit never parses the rr_graph
+    def fail(*args, **kwargs):
+        raise AssertionError("rr_graph parsed on a cache hit")
+    monkeypatch.setattr("fault_tolerant_routing_mux.core.RRGraphParser", fail)
+    hit = cached_run_simulation(cache, ProtoVoterCell, rr_graph, p=0.2, seed=3, delta=delta)
+    assert hit.hit
+    assert hit.stats == miss.stats
+    assert hit.report_file.read_text() == report
+    if delta:
+        assert open(hit.output_file, "rb").read() == output
+    else:
+        assert _edge_set(hit.output_file) == expected_edges
+
+def test_cached_run_simulation_keys(tmp_path, rr_graph):
+    cache = ResultCache(tmp_path / "cache")
+    first = cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=1, delta=True)
+    assert not cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=2, delta=True).hit
+    assert not cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=1, delta=True,
+                                     sparse=True).hit
+    # Streaming draws the same defects as FaultSimulator and shares its entries
+    streamed = cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=1, delta=True,
+                                     stream=True)
+    assert streamed.hit and streamed.stats == first.stats
+    # Template runs draw with numpy and have their own entries
+    templates = cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=1, delta=True,
+                                      templates=True)
+    assert not templates.hit
+    expected = TemplateFaultSimulator(MemCell, rr_graph, p=0.2, seed=1).simulate()
+    assert templates.stats == expected
+    assert cached_run_simulation(cache, MemCell, rr_graph, p=0.2, seed=1, delta=True,
+                                 templates=True).stats == expected
+
+def test_cached_standalone_sim(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ResultCache(tmp_path / "cache")
+    results, hit = cached_standalone_sim(cache, [0.01, 0.05], 50, MemCell, seed=4)
+    assert not hit
+    report = (tmp_path / "fault_sim.rpt").read_text()
+    os.remove(tmp_path / "fault_sim.rpt")
+    cached, hit = cached_standalone_sim(cache, [0.01, 0.05], 50, MemCell, seed=4)
+    assert hit and cached == results
+    assert (tmp_path / "fault_sim.rpt").read_text() == report
+    assert not cached_standalone_sim(cache, [0.01, 0.05], 50, MemCell, seed=4,
+                                     engine="bitsliced")[1]
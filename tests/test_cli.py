@@ -0,0 +1,164 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the ftrm command line entry point."""
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+from fault_tolerant_routing_mux import cli
+
+BASE_DIR = "tests/sample_files"
+
+def test_arange_matches_numpy():
+    np = pytest.importorskip("numpy")
+    assert cli._arange(0, .155, .005) == list(np.arange(0, .155, .005))
+
+def test_import_is_lightweight():
+    code = ("import sys, fault_tolerant_routing_mux.cli; "
+            "print(any(m in sys.modules for m in ('numpy', 'matplotlib')))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+def test_missing_command():
+    with pytest.raises(SystemExit):
+        cli.main([])
+
+def test_standalone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cli.main(["standalone", "--cell", "MemCell", "--iters", "10", "--p", "0.01", "0.02"])
+    report = (tmp_path / "fault_sim.rpt").read_text()
+    assert "MemCell" in report
+    assert "01.00" in report and "02.00" in report
+
+def test_standalone_seed_with_and_without_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    argv = ["standalone", "--cell", "MemCell", "--iters", "200", "--p", "0.05", "--seed", "3"]
+    tables = []
+    for extra in ([], ["--cache", str(tmp_path / "cache")]):
+        cli.main(argv + extra)
+        tables.append((tmp_path / "fault_sim.rpt").read_text().split("=" * 80)[1])
+    assert tables[0] == tables[1]
+
+def test_vtr(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    cli.main(["vtr", str(rr_graph), "--p", "0.01"])
+    assert (tmp_path / "fault_sim.out").exists()
+    assert (tmp_path / "simple_1.0.xml").exists()
+
+def test_vtr_sparse(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    cli.main(["vtr", str(rr_graph), "--p", "0.01", "--sparse", "--seed", "1", "--delta"])
+    assert (tmp_path / "simple_1.0.delta").exists()
+
+def test_vtr_templates(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    cli.main(["vtr", str(rr_graph), "--p", "0.01", "--templates", "--seed", "1"])
+    assert (tmp_path / "simple_1.0.xml").exists()
+
+def test_vtr_cache(tmp_path, capsys):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    argv = ["vtr", str(rr_graph), "--p", "0.1", "--delta", "--cache", str(tmp_path / "cache")]
+    cli.main(argv)
+    cli.main(argv)
+    assert capsys.readouterr().out.splitlines()[-1].startswith("Cache hit")
+    cli.main(["cache", "--dir", str(tmp_path / "cache"), "--clear"])
+    assert "0 entries" in capsys.readouterr().out
+
+def test_vtr_templates_cache(tmp_path, capsys):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    argv = ["vtr", str(rr_graph), "--p", "0.1", "--delta", "--cache", str(tmp_path / "cache")]
+    cli.main(argv)
+    cli.main(argv + ["--templates"])
+    assert not capsys.readouterr().out.splitlines()[-1].startswith("Cache hit")
+    cli.main(argv + ["--templates"])
+    assert capsys.readouterr().out.splitlines()[-1].startswith("Cache hit")
+
+def test_screen(tmp_path, capsys):
+    from fault_tolerant_routing_mux.delta import write_delta
+    nodes = os.path.join(BASE_DIR, "nodes.xml")
+    write_delta(tmp_path / "d.delta", nodes, {9: {4, 7}})
+    with pytest.raises(SystemExit, match="Rejected"):
+        cli.main(["screen", nodes, str(tmp_path / "d.delta"), "--max-unreachable-sinks", "0"])
+    assert "Removed edges:\t2" in capsys.readouterr().out
+
+def test_sweep(capsys):
+    cli.main(["sweep", "--iters", "10", "--p", "0", "--cells", "MemCell"])
+    out = capsys.readouterr().out.splitlines()
+    assert out == ["p(UD)\tMemCell", "0.0000\t0.0000"]
+
+def test_sweep_paired(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    cli.main(["sweep", "--iters", "10", "--p", "0", "--paired"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[-2:] == ["p(UD)\tMemCell\tProtoVoterCell", "0.0000\t0.0000\t0.0000"]
+    assert (tmp_path / "comparison.rpt").exists()
+
+def test_sweep_adaptive(capsys):
+    cli.main(["sweep", "--iters", "200", "--p", "0", "0.4", "--cells", "MemCell",
+              "--adaptive", "6", "--tolerance", "0.05"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].endswith("refinement rounds")
+    assert 3 <= len(out[2:]) <= 6
+    assert out[2].startswith("0.0000") and out[-1].startswith("0.4000")
+
+def test_standalone_bitsliced(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cli.main(["standalone", "--engine", "bitsliced", "--iters", "100", "--p", "0.01"])
+    assert "ProtoVoterCell" in (tmp_path / "fault_sim.rpt").read_text()
+
+def test_aging(capsys):
+    cli.main(["aging", os.path.join(BASE_DIR, "simple.xml"), "--rate-UD", "0.1",
+              "--horizon", "100", "--steps", "4", "--seed", "0"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "time\tunusable muxes\tdefect edges\tfailed memristors"
+    assert out[1] == "0\t0\t0\t0"
+    assert out[-1].startswith("100\t2\t")
+
+def test_design(tmp_path):
+    report = tmp_path / "design.rpt"
+    cli.main(["design", os.path.join(BASE_DIR, "simple.xml"), "--p", "0.05", "--iters", "500",
+              "--seed", "0", "--output", str(report)])
+    rows = report.read_text().splitlines()[4:]
+    assert rows and all(row.count("\t") == 7 for row in rows)
+    assert any("*" in row.split("\t")[2] for row in rows)
+
+def test_threshold(capsys):
+    cli.main(["threshold", "--cell", "ProtoVoterCell", "--target", "0.01"])
+    out = capsys.readouterr().out
+    assert out.startswith("p = 0.01099") and "(exact," in out
+
+def test_batch(tmp_path):
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), tmp_path / "simple.xml")
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('[{"rr_graph": "simple.xml", "probabilities": [0.01, 0.1]}]')
+    results = tmp_path / "results.tsv"
+    cli.main(["batch", str(manifest), "--jobs", "2", "--results", str(results)])
+    assert len(results.read_text().splitlines()) == 3
+    assert len(list(tmp_path.glob("*_run*.delta"))) == 2
+
+def test_annotate(tmp_path, capsys):
+    np = pytest.importorskip("numpy")
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    cli.main(["annotate", str(rr_graph), "--p", "0.01", "--xml"])
+    assert capsys.readouterr().out.startswith("Expected defect edges:")
+    assert np.load(tmp_path / "simple_1.0.prob.npy").size > 0
+    assert (tmp_path / "simple_1.0_prob.xml").exists()
@@ -0,0 +1,82 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the paired architecture comparison."""
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.comparison import (compare_architectures, comparison_curves,
+                                                   paired_difference, paired_trials,
+                                                   sample_memristor_errors,
+                                                   write_comparison_report)
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.main import compare_failure_equal
+from fault_tolerant_routing_mux.memristor_errors import RandomErrorGen
+from fault_tolerant_routing_mux.scheduler import STANDALONE
+
+BASE_DIR = "tests/sample_files"
+
+def test_sample_memristor_errors():
+    reg = RandomErrorGen(pSA0=0.1, pSA1=0.2, pUD=0.05)
+    errors = sample_memristor_errors(np.random.default_rng(0), reg, (1000, 100))
+    assert np.bincount(errors.ravel(), minlength=4) / errors.size == \
+        pytest.approx(reg.get_distribution(), abs=0.005)
+
+def test_paired_difference():
+    diff = paired_difference([1, 0, 1, 1], [0, 0, 1, 0])
+    assert diff.mean == 0.5
+    assert diff.low < 0.5 < diff.high
+    assert diff.mean - diff.low == pytest.approx(diff.high - diff.mean)
+    assert paired_difference([1, 1, 1], [0, 0, 0]) == (1., 1., 1.)
+
+def test_paired_trials_rates():
+    reg = RandomErrorGen(pSA0=0.05, pSA1=0.05, pUD=0.05)
+    outcomes = paired_trials(12, [MemCell, ProtoVoterCell], reg, 4000, np.random.default_rng(1))
+    for cell_type in (MemCell, ProtoVoterCell):
+        unusable, defects = outcomes[cell_type.__name__]
+        expected_unusable, expected_defects = expected_rates(12, cell_type, p=0.05)
+        assert unusable.mean() == pytest.approx(expected_unusable, abs=0.03)
+        assert defects.mean() == pytest.approx(expected_defects, abs=0.03)
+    # Shared draws make the outcomes of both architectures correlated
+    a, b = outcomes["MemCell"][1], outcomes["ProtoVoterCell"][1]
+    assert np.corrcoef(a, b)[0, 1] > 0.2
+
+def test_compare_architectures():
+    rows = compare_architectures([0., 0.05], [MemCell, ProtoVoterCell], 500,
+                                 experiment=STANDALONE, seed=3)
+    assert len(rows) == 4
+    assert rows == compare_architectures([0., 0.05], [MemCell, ProtoVoterCell], 500,
+                                         experiment=STANDALONE, seed=3)
+    zero = [row for row in rows if row.p == 0.]
+    assert all(row.baseline_rate == row.cell_rate == 0. for row in zero)
+    for row in rows:
+        assert row.baseline == "MemCell" and row.cell == "ProtoVoterCell"
+        assert row.difference.mean == pytest.approx(row.cell_rate - row.baseline_rate)
+        assert row.difference.low <= row.difference.mean <= row.difference.high
+    curves = comparison_curves(rows)
+    assert curves["MemCell"]["0.05"] == rows[2].baseline_rate
+    with pytest.raises(ValueError):
+        compare_architectures([0.], [MemCell], 10, experiment="unknown")
+
+def test_write_comparison_report(tmp_path):
+    rows = compare_architectures([0.1], None, 200, seed=0)
+    write_comparison_report(rows, tmp_path / "comparison.rpt")
+    lines = (tmp_path / "comparison.rpt").read_text().splitlines()
+    assert lines[-2].startswith("0.1000\tunusable\tMemCell\tProtoVoterCell")
+    assert len(lines[-1].split("\t")) == 9
+
+def test_main_experiment_is_reproducible():
+    rows = compare_failure_equal([0., .05, .1], 500)
+    assert compare_failure_equal([0., .05, .1], 500) == rows
+    assert [row.baseline for row in rows] == ["MemCell"] * len(rows)
@@ -0,0 +1,69 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the CSR connectivity pre-screen."""
+import os
+import sys
+import numpy as np
+from fault_tolerant_routing_mux.connectivity import CSRGraph, ConnectivityScreen, weak_components
+from fault_tolerant_routing_mux.delta import read_delta, write_delta
+from fault_tolerant_routing_mux.rr_graph_index import RRGraphIndex
+
+BASE_DIR = "tests/sample_files"
+NODES_FILE = os.path.join(BASE_DIR, "nodes.xml")
+
+def test_csr_successors():
+    csr = CSRGraph.from_edges(np.array([2, 0, 2, 1]), np.array([0, 1, 1, 2]), 3)
+    assert csr.indptr.tolist() == [0, 1, 2, 4]
+    assert sorted(csr.successors([2, 0]).tolist()) == [0, 1, 1]
+    mask = np.array([True, True, False, True])
+    assert sorted(csr.successors([2, 0], mask).tolist()) == [0, 1]
+    assert csr.successors(np.zeros(0, dtype=np.int64)).size == 0
+
+def test_base_graph():
+    screen = ConnectivityScreen(RRGraphIndex(NODES_FILE))
+    assert screen.reachable_base.all()
+    assert screen.components_base == 1
+    report = screen.analyze({})
+    assert report.removed_edges == 0
+    assert report.undriven == {} and report.unreachable == {}
+    assert report.components_faulty == 1
+    assert report.passes(max_unreachable={"SINK": 0}, max_new_components=0)
+
+def test_lost_ipin():
+    screen = ConnectivityScreen(RRGraphIndex(NODES_FILE))
+    report = screen.analyze({8: {2, 3, 5, 6}})
+    assert report.removed_edges == 4
+    assert report.undriven == {"IPIN": 1}
+    assert report.unreachable == {"IPIN": 1, "SINK": 1}
+    assert report.components_faulty == 2
+    assert not report.passes(max_unreachable={"SINK": 0})
+    assert report.passes(max_unreachable={"SINK": 1}, max_undriven={"IPIN": 1})
+    assert not report.passes(max_new_components=0)
+    # Losing some drivers only does not disconnect anything
+    report = screen.analyze({8: {2, 3}, 7: {4}})
+    assert report.undriven == {} and report.unreachable == {}
+
+def test_removed_from_delta(tmp_path):
+    screen = ConnectivityScreen(RRGraphIndex(NODES_FILE))
+    write_delta(tmp_path / "d.delta", NODES_FILE, {9: {4, 7}})
+    report = screen.analyze(removed=read_delta(tmp_path / "d.delta").index)
+    assert report == screen.analyze({9: {4, 7}})
+    assert report.unreachable == {"IPIN": 1, "SINK": 1}
+
+def test_components_without_scipy(monkeypatch):
+    src, sink = np.array([0, 1, 3, 5, 6]), np.array([1, 2, 4, 6, 5])
+    expected = weak_components(8, src, sink)
+    monkeypatch.setitem(sys.modules, "scipy.sparse", None)
+    assert weak_components(8, src, sink) == expected == 4
@@ -0,0 +1,128 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the simulation daemon and its client."""
+import asyncio
+import os
+import random
+import shutil
+import threading
+import time
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.core import FaultSimulator
+from fault_tolerant_routing_mux.daemon import (DaemonClient, DaemonError, RemoteFaultSimulator,
+                                               SimulationDaemon, _RESIDENT, _resident,
+                                               load_graph)
+from fault_tolerant_routing_mux.delta import read_delta
+from fault_tolerant_routing_mux.edge_scanner import scan_rr_edges
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+@pytest.fixture
+def client(tmp_path):
+    socket_path = str(tmp_path / "ftrm.sock")
+    daemon = SimulationDaemon(socket_path, workers=2)
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    with DaemonClient(socket_path, timeout=60) as client:
+        yield client
+        client.request("shutdown")
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+
+def _local_stats(rr_graph, cell_type, p, seed):
+    fault_sim = FaultSimulator(cell_type, rr_graph, p=p)
+    random.seed(seed)
+    return fault_sim.simulate()
+
+
+def test_remote_matches_local(client, rr_graph):
+    fault_sim = RemoteFaultSimulator(ProtoVoterCell, rr_graph, p=0.2, client=client)
+    assert fault_sim.num_muxes == FaultSimulator(ProtoVoterCell, rr_graph).num_muxes
+    stats = fault_sim.run_simulation(delta=True, seed=5)
+    assert stats == _local_stats(rr_graph, ProtoVoterCell, 0.2, 5)
+    assert fault_sim.defect_edge_count == stats.defects.defect_edges()
+    assert read_delta(fault_sim.delta_file).index.size == fault_sim.defect_edge_count
+    assert fault_sim.out_file.exists()
+    # The resident graph is reused, same seed gives the same run
+    assert fault_sim.run_simulation(output="stats", seed=5) == stats
+
+def test_remote_xml_output(client, rr_graph):
+    fault_sim = RemoteFaultSimulator(MemCell, rr_graph, p=0.3, client=client)
+    fault_sim.run_simulation(seed=2)
+    base, faulty = scan_rr_edges(rr_graph, workers=0), \
+        scan_rr_edges(fault_sim.get_faulty_rr_graph(), workers=0)
+    assert faulty.src.size == base.src.size - fault_sim.defect_edge_count
+
+def test_concurrent_requests(client, rr_graph):
+    ids = {client.submit(rr_graph=str(rr_graph), cell="MemCell", p=p, seed=1, output="stats"): p
+           for p in (0.05, 0.1, 0.2, 0.3)}
+    responses = list(client.results())
+    assert sorted(r["id"] for r in responses) == sorted(ids)
+    for response in responses:
+        expected = _local_stats(rr_graph, MemCell, ids[response["id"]], 1)
+        assert response["stats"] == expected.to_dict()
+
+def test_errors(client, rr_graph):
+    with pytest.raises(DaemonError, match="FileNotFoundError"):
+        client.request(rr_graph=str(rr_graph) + ".missing", cell="MemCell", p=0.1)
+    with pytest.raises(DaemonError, match="output"):
+        client.request(rr_graph=str(rr_graph), cell="MemCell", p=0.1, output="pdf")
+    assert client.request("ping")["status"] == "done"
+
+def test_many_pipelined_responses(client):
+    ids = [client.submit("ping") for _ in range(500)]
+    assert sorted(r["id"] for r in client.results()) == ids
+
+def test_failed_load_is_not_resident(tmp_path, rr_graph):
+    daemon = SimulationDaemon(str(tmp_path / "ftrm.sock"), workers=1)
+    missing = str(rr_graph) + ".missing"
+    try:
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(daemon._run(0, (missing, "MemCell"), load_graph, missing, "MemCell"))
+        assert not daemon.resident[0] and not daemon.busy[0]
+        graph = (str(rr_graph), "MemCell")
+        asyncio.run(daemon._run(0, graph, load_graph, str(rr_graph), "MemCell"))
+        assert daemon.resident[0] == {graph}
+    finally:
+        for pool in daemon.pools:
+            pool.shutdown()
+
+
+def test_response_without_id(client):
+    client.socket.sendall(b"{not json\n")
+    client.submit("ping")
+    with pytest.raises(DaemonError, match="Expecting"):
+        list(client.results())
+
+
+def test_rewritten_graph_replaces_resident(rr_graph):
+    _resident(rr_graph, "MemCell")
+    os.utime(rr_graph, ns=(0, os.stat(rr_graph).st_mtime_ns + 10**9))
+    _resident(rr_graph, "MemCell")
+    path = os.path.realpath(rr_graph)
+    try:
+        assert [key[1] for key in _RESIDENT if key[0] == path] == \
+            [os.stat(rr_graph).st_mtime_ns]
+    finally:
+        _RESIDENT.clear()
@@ -0,0 +1,84 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the compact defect deltas."""
+import os
+import random
+import shutil
+import xml.etree.ElementTree as ET
+import pytest
+from fault_tolerant_routing_mux import cli
+from fault_tolerant_routing_mux.control_cell import MemCell
+from fault_tolerant_routing_mux.core import FaultSimulator
+from fault_tolerant_routing_mux.delta import materialize, read_delta, write_delta
+from fault_tolerant_routing_mux.streaming import StreamingFaultSimulator
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+def normalized(path):
+    return ET.tostring(ET.parse(path).getroot())
+
+def test_delta_format(tmp_path, rr_graph):
+    write_delta(tmp_path / "d.delta", rr_graph, {10: {24670, 24684}, 13: {24673}})
+    delta = read_delta(tmp_path / "d.delta")
+    assert delta.base_edges == 25
+    assert delta.index.tolist() == [4, 13, 16]
+    assert delta.src.tolist() == [24670, 24684, 24673]
+    assert delta.sink.tolist() == [10, 10, 13]
+    assert (tmp_path / "d.delta").read_text().splitlines()[4] == "4 24670 10"
+
+@pytest.mark.parametrize("simulator", [FaultSimulator, StreamingFaultSimulator])
+def test_materialize_matches_full_copy(tmp_path, rr_graph, simulator):
+    random.seed(3)
+    StreamingFaultSimulator(MemCell, rr_graph, p=0.05).run_simulation()
+    random.seed(3)
+    fault_sim = simulator(MemCell, rr_graph, p=0.05)
+    fault_sim.run_simulation(delta=True)
+    assert fault_sim.delta_file.endswith("simple_5.0.delta")
+    assert read_delta(fault_sim.delta_file).index.size == fault_sim.defect_edge_count
+
+    materialize(fault_sim.delta_file, rr_graph, tmp_path / "faulty.xml")
+    assert normalized(tmp_path / "faulty.xml") == \
+        normalized(fault_sim.get_faulty_rr_graph())
+
+def test_materialize_last_edge(tmp_path, rr_graph):
+    write_delta(tmp_path / "d.delta", rr_graph, {13: {24704}})
+    assert read_delta(tmp_path / "d.delta").index.tolist() == [24]
+    materialize(tmp_path / "d.delta", rr_graph, tmp_path / "faulty.xml")
+    assert len(ET.parse(tmp_path / "faulty.xml").getroot().find("rr_edges")) == 24
+
+def test_empty_delta(tmp_path, rr_graph):
+    write_delta(tmp_path / "d.delta", rr_graph, {})
+    assert read_delta(tmp_path / "d.delta").index.size == 0
+    materialize(tmp_path / "d.delta", rr_graph, tmp_path / "copy.xml")
+    assert (tmp_path / "copy.xml").read_bytes() == rr_graph.read_bytes()
+
+def test_materialize_checks_base(tmp_path, rr_graph):
+    write_delta(tmp_path / "d.delta", rr_graph, {10: {24670}})
+    other = tmp_path / "other.xml"
+    other.write_text(rr_graph.read_text().replace("<rr_graph>", "<rr_graph tool_name='x'>"))
+    with pytest.raises(ValueError):
+        materialize(tmp_path / "d.delta", other, tmp_path / "faulty.xml")
+
+def test_cli(tmp_path, rr_graph):
+    cli.main(["vtr", str(rr_graph), "--p", "0.05", "--delta"])
+    assert not (tmp_path / "simple_5.0.xml").exists()
+    cli.main(["materialize", str(tmp_path / "simple_5.0.delta"), str(rr_graph)])
+    assert (tmp_path / "simple_5.0.xml").exists()
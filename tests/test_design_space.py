@@ -0,0 +1,71 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the block size design-space exploration."""
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.bitsliced import simulate_muxes
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.design_space import design_cells, explore_block_sizes, \
+    pareto_front, write_design_report
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.memristor_errors import RandomErrorGen
+from fault_tolerant_routing_mux.mux import RoutingMux, optimal_block_size
+
+def test_design_cells():
+    for size in (2, 7, 12, 30):
+        assert design_cells(size, optimal_block_size(size)) == \
+            len(RoutingMux(0, list(range(size)), MemCell).cell_list)
+    assert design_cells(12, 1) == 13 and design_cells(12, 12) == 13
+
+def test_pareto_front():
+    costs = [(1, 3), (2, 2), (3, 1), (2, 3), (3, 3), (1, 3)]
+    assert pareto_front(costs).tolist() == [True, True, True, False, False, True]
+
+def test_explore_block_sizes():
+    reg = RandomErrorGen(pSA0=.02, pSA1=.02, pUD=.02)
+    points = explore_block_sizes({12: 40, 5: 3}, ProtoVoterCell, reg, 2000, seed=0)
+    assert [(p.mux_size, p.block_size) for p in points] == \
+        [(5, b) for b in range(1, 6)] + [(12, b) for b in range(1, 13)]
+    assert {p.num_muxes for p in points if p.mux_size == 12} == {40}
+    for size in (5, 12):
+        front = [p for p in points if p.mux_size == size and p.pareto]
+        # The design with fewest cells and the most robust one are never dominated
+        assert min(p.num_cells for p in front) == \
+            min(design_cells(size, b) for b in range(1, size + 1))
+        best = min((p for p in points if p.mux_size == size), key=lambda p: p.unusable)
+        assert best.pareto or any(p.unusable == best.unusable for p in front)
+    # Same draws for every design: a fault-free draw is fault-free for all of them
+    assert explore_block_sizes([4], MemCell, RandomErrorGen(), 100)[0].unusable == 0
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_optimal_block_size_matches_expected_rates(cell_type):
+    reg = RandomErrorGen(pSA0=.03, pSA1=.03, pUD=.03)
+    points = explore_block_sizes([12], cell_type, reg, 40000, seed=1,
+                                 block_sizes={12: [optimal_block_size(12)]})
+    unusable, defects = expected_rates(12, cell_type, p=.03)
+    assert points[0].unusable == pytest.approx(unusable, abs=.01)
+    assert points[0].defect_rate == pytest.approx(defects, abs=.01)
+    stats = simulate_muxes(12, cell_type, reg, 40000, np.random.default_rng(1))
+    assert points[0].unusable == pytest.approx(stats.unusable.rate(), abs=.01)
+
+def test_write_design_report(tmp_path):
+    points = explore_block_sizes([6], MemCell, RandomErrorGen(pUD=.05), 500, seed=0)
+    write_design_report(points, tmp_path / "all.rpt")
+    write_design_report(points, tmp_path / "front.rpt", pareto_only=True)
+    rows = (tmp_path / "all.rpt").read_text().splitlines()[4:]
+    assert len(rows) == 6
+    assert rows[optimal_block_size(6) - 1].split("\t")[2].endswith("*")
+    front = (tmp_path / "front.rpt").read_text().splitlines()[4:]
+    assert len(front) == sum(p.pareto for p in points)
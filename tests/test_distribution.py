@@ -0,0 +1,100 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the exact device-level distributions."""
+import itertools
+import os
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import (CountDistribution, device_distribution,
+                                                     expected_rates, mux_outcome_distribution,
+                                                     mux_size_histogram)
+from fault_tolerant_routing_mux.memristor_errors import Errors, RandomErrorGen
+from fault_tolerant_routing_mux.mux import RoutingMux
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+
+BASE_DIR = "tests/sample_files"
+CELL_DISTRIBUTION = (0.7, 0.1, 0.15, 0.05)
+
+
+def enumerate_mux(mux_size):
+    """Exhaustive P[unusable, defects] over every assignment of cell errors."""
+    mux = RoutingMux(0, list(range(mux_size)), MemCell)
+    pmf = np.zeros((2, mux_size + 1))
+    for errors in itertools.product(range(4), repeat=len(mux.cell_list)):
+        for cell, error in zip(mux.cell_list, errors):
+            # Fault-free pull-down: the cell error is the pull-up error
+            cell.set_errors(error, Errors.FF)
+        mux.compute_block_errors()
+        defects = sum(len(srcs) for srcs in mux.get_defect_edges().values())
+        pmf[int(mux.get_mux_unusable()), defects] += np.prod(
+            [CELL_DISTRIBUTION[e] for e in errors])
+    return pmf
+
+@pytest.mark.parametrize("mux_size", [1, 2, 3, 5, 7])
+def test_mux_outcome_matches_enumeration(mux_size):
+    assert np.allclose(mux_outcome_distribution(mux_size, CELL_DISTRIBUTION),
+                       enumerate_mux(mux_size))
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_cell_error_distribution(cell_type):
+    distribution = cell_type.error_distribution(
+        RandomErrorGen(pSA0=0.1, pSA1=0.2, pUD=0.05).get_distribution())
+    assert sum(distribution) == pytest.approx(1)
+    assert cell_type.error_distribution((1, 0, 0, 0)) == [1, 0, 0, 0]
+
+def test_mux_size_histogram():
+    mux_dict = RRGraphParser(os.path.join(BASE_DIR, "nodes.xml")).get_mux_dict()
+    assert mux_size_histogram(mux_dict) == {1: 3, 2: 3, 3: 1, 4: 1}
+
+def test_device_distribution_moments():
+    mux_sizes = {12: 40, 5: 7, 30: 3}
+    defects, unusable = device_distribution(mux_sizes, ProtoVoterCell, p=0.02)
+    unusable_rate, defect_rate = zip(*(expected_rates(size, ProtoVoterCell, p=0.02)
+                                       for size in mux_sizes))
+    counts, sizes = list(mux_sizes.values()), list(mux_sizes)
+    assert defects.pmf.sum() == pytest.approx(1)
+    assert defects.mean() == pytest.approx(sum(np.multiply(counts, sizes) * defect_rate))
+    assert unusable.mean() == pytest.approx(sum(np.multiply(counts, unusable_rate)))
+    assert unusable.tail(1) == pytest.approx(1 - np.prod((1 - np.array(unusable_rate)) ** counts))
+
+def test_device_distribution_truncation():
+    mux_sizes = {12: 100}
+    full, _ = device_distribution(mux_sizes, MemCell, p=0.01)
+    truncated, _ = device_distribution(mux_sizes, MemCell, p=0.01, max_defect_edges=20)
+    assert truncated.pmf.size == 21
+    assert np.allclose(truncated.pmf, full.pmf[:21], atol=1e-12)
+    assert truncated.truncated_mass == pytest.approx(full.tail(21), abs=1e-9)
+
+def test_count_distribution():
+    dist = CountDistribution([0.25, 0.5, 0.25])
+    assert dist.mean() == pytest.approx(1)
+    assert dist.std() == pytest.approx(np.sqrt(0.5))
+    assert dist.cdf(0) == 0.25 and dist.cdf(5) == 1
+    assert dist.tail(1) == 0.75 and dist.tail(0) == 1
+    assert [dist.quantile(q) for q in (0.1, 0.25, 0.5, 0.99)] == [0, 0, 1, 2]
+    assert CountDistribution([0.5, 0.3]).quantile(0.9) is None
+
+def test_standalone_sim_agrees():
+    # 12-input MemCell mux, as in FaultSimulator.standalone_sim
+    reg = RandomErrorGen(pSA0=0.05, pSA1=0.05, pUD=0.05)
+    mux = RoutingMux(0, list(range(12)), MemCell)
+    unusable = 0
+    for _ in range(4000):
+        mux.set_errors(reg)
+        mux.compute_block_errors()
+        unusable += mux.get_mux_unusable()
+    expected, _ = expected_rates(12, MemCell, p=0.05)
+    assert unusable / 4000 == pytest.approx(expected, abs=0.03)
@@ -0,0 +1,96 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the exact per-edge defect probabilities."""
+import itertools
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.bitsliced import cell_planes, sample_memristors
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.edge_probability import PROBABILITY_ATTRIBUTE, \
+    annotate_rr_graph, edge_defect_probabilities, input_defect_probabilities, mux_edge_positions
+from fault_tolerant_routing_mux.edge_scanner import scan_rr_edges
+from fault_tolerant_routing_mux.memristor_errors import RandomErrorGen
+from fault_tolerant_routing_mux.mux import block_outcome_table
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+from fault_tolerant_routing_mux.templates import MuxTemplate, evaluate_template
+
+BASE_DIR = "tests/sample_files"
+
+
+def _cell_distribution(cell_type, p):
+    return cell_type.error_distribution(RandomErrorGen(pSA0=p, pSA1=p, pUD=p).get_distribution())
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 4])
+def test_single_block_matches_outcome_table(block_size):
+    q = np.array([.7, .1, .15, .05])
+    _, defect_mask = block_outcome_table(block_size)
+    expected = np.zeros(block_size)
+    for errors in itertools.product(range(4), repeat=block_size):
+        code = sum(error << 2 * i for i, error in enumerate(errors))
+        mask = defect_mask[code]
+        expected += np.prod(q[list(errors)]) * np.array([mask >> i & 1 for i in range(block_size)])
+    # Divide out the single second stage cell, usable with probability q_FF + q_SA1
+    probabilities = 1 - (1 - input_defect_probabilities(block_size, q, block_size)) / (q[0] + q[2])
+    assert np.allclose(probabilities, expected)
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+@pytest.mark.parametrize("size", [2, 5, 7, 12, 30])
+def test_mean_matches_expected_rates(cell_type, size):
+    probabilities = input_defect_probabilities(size, _cell_distribution(cell_type, .05))
+    assert probabilities.mean() == pytest.approx(expected_rates(size, cell_type, p=.05)[1])
+
+@pytest.mark.parametrize("size", [7, 12])
+def test_matches_simulated_inputs(size):
+    num_trials = 100000
+    reg = RandomErrorGen(pSA0=.05, pSA1=.05, pUD=.05)
+    template = MuxTemplate("0", size, np.zeros(1), np.zeros((1, size)))
+    hi, lo = sample_memristors(np.random.default_rng(0), reg,
+                               template.num_cells * ProtoVoterCell.num_memristors, num_trials)
+    _, dead = evaluate_template(template, cell_planes(ProtoVoterCell, hi, lo), num_trials)
+    probabilities = input_defect_probabilities(size, _cell_distribution(ProtoVoterCell, .05))
+    sigma = np.sqrt(probabilities * (1 - probabilities) / num_trials)
+    assert (np.abs(dead.mean(axis=0) - probabilities) < 5 * sigma).all()
+
+def test_mux_edge_positions():
+    rr_graph = os.path.join(BASE_DIR, "simple.xml")
+    edges = scan_rr_edges(rr_graph, workers=0)
+    mux_dict = RRGraphParser(rr_graph).get_mux_dict()
+    mask, sizes, position = mux_edge_positions(edges)
+    for sink, src, size, i in zip(edges.sink[mask].tolist(), edges.src[mask].tolist(),
+                                  sizes.tolist(), position.tolist()):
+        assert len(mux_dict[sink]) == size and mux_dict[sink][i] == src
+
+def test_edge_defect_probabilities():
+    edges = scan_rr_edges(os.path.join(BASE_DIR, "simple.xml"), workers=0)
+    probabilities = edge_defect_probabilities(edges, MemCell, p=.01)
+    mask, sizes, _ = mux_edge_positions(edges)
+    assert probabilities.shape == edges.src.shape
+    assert (probabilities[~mask] == 0).all() and (probabilities[mask] > 0).all()
+    expected = sum(expected_rates(size, MemCell, p=.01)[1] for size in sizes.tolist())
+    assert probabilities.sum() == pytest.approx(expected)
+
+def test_annotate_rr_graph(tmp_path):
+    rr_graph = os.path.join(BASE_DIR, "simple.xml")
+    probabilities = edge_defect_probabilities(scan_rr_edges(rr_graph, workers=0), MemCell, p=.01)
+    annotate_rr_graph(rr_graph, tmp_path / "prob.xml", probabilities)
+    values = [float(edge.get(PROBABILITY_ATTRIBUTE, 0))
+              for edge in ET.parse(tmp_path / "prob.xml").getroot().iter("edge")]
+    assert np.allclose(values, probabilities, rtol=1e-5)
+    with pytest.raises(ValueError):
+        annotate_rr_graph(rr_graph, tmp_path / "short.xml", probabilities[:-1])
@@ -0,0 +1,78 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the mmap edge scanner."""
+import os
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux import edge_scanner
+from fault_tolerant_routing_mux.edge_scanner import scan_mux_edges, scan_rr_edges
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+
+BASE_DIR = "tests/sample_files"
+
+
+def assert_same_edges(a, b):
+    for column in ("src", "sink", "switch"):
+        assert np.array_equal(getattr(a, column), getattr(b, column))
+    assert a.switch_names == b.switch_names
+
+@pytest.mark.parametrize("rr_graph", ["simple.xml", "nodes.xml", "minimal.xml"])
+def test_fast_scan_matches_full_parse(rr_graph):
+    rr_graph_file = os.path.join(BASE_DIR, rr_graph)
+    edges = scan_rr_edges(rr_graph_file, workers=0)
+    assert edges.src.dtype == np.int32
+    assert_same_edges(edges, edge_scanner._full_scan(rr_graph_file)[0])
+
+def test_mux_edges_match_parser():
+    rr_graph_file = os.path.join(BASE_DIR, "simple.xml")
+    sinks, srcs = scan_rr_edges(rr_graph_file, workers=0).mux_edges()
+    mux_dict = dict()
+    for sink, src in zip(sinks.tolist(), srcs.tolist()):
+        mux_dict.setdefault(sink, []).append(src)
+    assert mux_dict == RRGraphParser(rr_graph_file).get_mux_dict()
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_scan_mux_edges(workers):
+    rr_graph_file = os.path.join(BASE_DIR, "simple.xml")
+    edges = scan_rr_edges(rr_graph_file, workers=0)
+    mux_edges, num_edges = scan_mux_edges(rr_graph_file, workers=workers, chunk_bytes=64)
+    assert num_edges == edges.src.size
+    assert np.array_equal(mux_edges.sink, edges.mux_edges()[0])
+    assert np.array_equal(mux_edges.src, edges.mux_edges()[1])
+    full, num_edges = edge_scanner._full_scan(rr_graph_file, mux_only=True)
+    assert num_edges == edges.src.size
+    assert_same_edges(full, mux_edges)
+
+def test_chunks_on_workers():
+    rr_graph_file = os.path.join(BASE_DIR, "simple.xml")
+    assert_same_edges(scan_rr_edges(rr_graph_file, workers=2, chunk_bytes=64),
+                      scan_rr_edges(rr_graph_file, workers=0))
+
+@pytest.mark.parametrize("edge", [
+    '<edge src_node="1" sink_node="10" switch_id="2"/>',  # other attribute order
+    '<edge sink_node="10" src_node="1" switch_id="2"><metadata value="7"/></edge>',
+    '<edge sink_node="10" switch_id="2" src_node="1"/>',
+])
+
+def test_unexpected_layout_falls_back(tmp_path, edge):
+    rr_graph_file = tmp_path / "rr_graph.xml"
+    with open(os.path.join(BASE_DIR, "simple.xml")) as f:
+        text = f.read()
+    rr_graph_file.write_text(text.replace(
+        '<edge sink_node="13" src_node="4" switch_id="0"></edge>', edge))
+    with pytest.raises(edge_scanner.UnexpectedLayout):
+        edge_scanner._fast_scan(str(rr_graph_file), 0, 1 << 20)
+    assert_same_edges(scan_rr_edges(rr_graph_file, workers=0),
+                      edge_scanner._full_scan(rr_graph_file)[0])
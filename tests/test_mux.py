@@ -90,3 +90,19 @@ def test_second_stage_ud():
     rm.cell_list[5].set_errors(Errors.FF, Errors.UD)
     rm.compute_block_errors()
     assert rm.get_defect_edges() == {20: {i for i in range(16)}}
+
+def test_shared_codes_match_block_evaluation():
+    from fault_tolerant_routing_mux.memristor_errors import RandomErrorGen
+    reg = RandomErrorGen(pSA0=0.1, pSA1=0.1, pUD=0.05)
+    for size in (2, 11, 16, 30, 100):
+        rm = RoutingMux(TEST_SINK_NODE, list(range(size)), MemCell)
+        for _ in range(50):
+            for cell in rm.cell_list:
+                cell.set_errors(*reg.gen())
+            rm.compute_block_errors()
+            shared = [(b.block_unusable, b.get_defect_edges())
+                      for b in rm.first_stage_blocks + [rm.second_stage_block]]
+            for block in rm.first_stage_blocks + [rm.second_stage_block]:
+                block.compute_block_error()
+            assert shared == [(b.block_unusable, b.get_defect_edges())
+                              for b in rm.first_stage_blocks + [rm.second_stage_block]]
@@ -14,7 +14,8 @@
 # =============================================================================
 """Test suite for a routing mux block."""
 
-from fault_tolerant_routing_mux.mux import RoutingMuxBlock
+import itertools
+from fault_tolerant_routing_mux.mux import RoutingMuxBlock, block_outcome_table
 from fault_tolerant_routing_mux.control_cell import MemCell
 from fault_tolerant_routing_mux.memristor_errors import Errors
 
@@ -62,4 +63,42 @@ def test_single_sa0():
     ctr_cell_list[6].set_errors(Errors.FF, Errors.SA1)
     rmb = RoutingMuxBlock(TEST_SRC_NODE_LIST, TEST_SINK_NODE, ctr_cell_list)
     rmb.compute_block_error()
-    assert rmb.get_defect_edges()  == [5, 6]
\ No newline at end of file
+    assert rmb.get_defect_edges()  == [5, 6]
+
+def _reference_outcome(errors):
+    """Block rules written out directly."""
+    if Errors.UD in errors or errors.count(Errors.SA1) > 1:
+        return True, list(range(len(errors)))
+    if Errors.SA1 in errors:
+        return False, [i for i in range(len(errors)) if i != errors.index(Errors.SA1)]
+    return False, [i for i, error in enumerate(errors) if error == Errors.SA0]
+
+
+def test_outcome_table():
+    for block_size in range(1, 5):
+        unusable, defect_mask = block_outcome_table(block_size)
+        assert len(unusable) == len(defect_mask) == 4 ** block_size
+        for errors in itertools.product(range(4), repeat=block_size):
+            code = sum(error << 2 * i for i, error in enumerate(errors))
+            expected_unusable, expected_inputs = _reference_outcome(list(errors))
+            assert unusable[code] == expected_unusable
+            assert defect_mask[code] == sum(1 << i for i in expected_inputs)
+
+def test_table_and_scan_agree():
+    # Blocks above MAX_TABLE_BLOCK_SIZE scan the cell errors instead
+    cell_errors = {(Errors.FF, Errors.SA0): Errors.SA1, (Errors.FF, Errors.SA1): Errors.SA0,
+                   (Errors.UD, Errors.UD): Errors.UD}
+    for size in (7, 10):
+        for errors in ([Errors.SA1, Errors.SA0], [Errors.SA0, Errors.SA0], [Errors.UD],
+                       [Errors.SA1], []):
+            ctr_cell_list = [MemCell() for i in range(size)]
+            for i, error in enumerate(errors):
+                memristors = next(m for m, e in cell_errors.items() if e == error)
+                ctr_cell_list[2 * i].set_errors(*memristors)
+            rmb = RoutingMuxBlock(list(range(size)), TEST_SINK_NODE, ctr_cell_list)
+            assert (rmb.outcome_table is None) == (size > 8)
+            rmb.compute_block_error()
+            expected_unusable, expected_inputs = _reference_outcome(
+                [cell.get_cell_error() for cell in ctr_cell_list])
+            assert rmb.block_unusable == expected_unusable
+            assert rmb.get_defect_edges() == expected_inputs
@@ -0,0 +1,92 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the injection/routing orchestrator, with a stand-in router."""
+import os
+import shutil
+import sys
+import pytest
+from fault_tolerant_routing_mux.orchestrator import expand_runs, run_pipeline, write_results
+
+BASE_DIR = "tests/sample_files"
+
+# Stand-in for the VTR router: fails if the faulty rr_graph is missing, else exits with argv[2]
+FAKE_ROUTER = """
+import os, sys, time
+time.sleep(float(sys.argv[3]))
+sys.exit(int(sys.argv[2]) if os.path.exists(sys.argv[1]) else 99)
+"""
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+@pytest.fixture
+def router(tmp_path):
+    script = tmp_path / "fake_router.py"
+    script.write_text(FAKE_ROUTER)
+    return f'"{sys.executable}" "{script}"'
+
+def test_expand_runs():
+    runs = expand_runs("g.xml", "MemCell", [0.1, {"pSA0": 0.1, "pSA1": 0, "pUD": 0}], repeats=2)
+    assert [r["run"] for r in runs] == [0, 1, 2, 3]
+    assert [r["seed"] for r in runs] == [0, 1, 2, 3]
+    assert runs[0]["probabilities"] == {"p": 0.1}
+    assert runs[3]["probabilities"] == {"pSA0": 0.1, "pSA1": 0, "pUD": 0}
+
+def test_exit_codes_and_timings(rr_graph, router, tmp_path):
+    runs = expand_runs(rr_graph, "ProtoVoterCell", [0.01, 0.05], repeats=2)
+    results = run_pipeline(runs, router + " {faulty_rr_graph} {run} 0", max_jobs=2)
+    assert [r["returncode"] for r in results] == [0, 1, 2, 3]
+    for r in results:
+        assert r["injection_time"] > 0
+        assert r["route_time"] > 0
+        assert os.path.exists(r["faulty_rr_graph"])
+        assert os.path.exists(r["report"])
+    # Every run writes its own faulty rr_graph
+    assert len({r["faulty_rr_graph"] for r in results}) == 4
+
+    write_results(results, tmp_path / "results.tsv")
+    assert len((tmp_path / "results.tsv").read_text().splitlines()) == 5
+
+def test_paths_with_spaces(tmp_path, router):
+    rr_graph = tmp_path / "my graphs" / "it's simple.xml"
+    rr_graph.parent.mkdir()
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    runs = expand_runs(rr_graph, "MemCell", [0.01])
+    results = run_pipeline(runs, router + " {faulty_rr_graph} 3 0")
+    assert results[0]["returncode"] == 3
+    assert os.path.exists(results[0]["log"])
+
+def test_injection_overlaps_routing(rr_graph, router):
+    runs = expand_runs(rr_graph, "MemCell", [0.01], repeats=3)
+    results = run_pipeline(runs, router + " {faulty_rr_graph} 0 0.5", max_jobs=1)
+    # Run k + 1 is injected while run k is being routed
+    for current, following in zip(results, results[1:]):
+        assert following["inject_end"] < current["route_end"]
+        assert following["route_start"] >= current["route_end"]
+
+def test_discard_faulty(rr_graph, router):
+    runs = expand_runs(rr_graph, "MemCell", [0.01])
+    results = run_pipeline(runs, router + " {faulty_rr_graph} 0 0", keep_faulty=False)
+    assert results[0]["returncode"] == 0
+    assert not os.path.exists(results[0]["faulty_rr_graph"])
+
+def test_missing_router(rr_graph):
+    runs = expand_runs(rr_graph, "MemCell", [0.01])
+    results = run_pipeline(runs, "/nonexistent/vpr {faulty_rr_graph}")
+    assert results[0]["returncode"] is None
+    assert "router failed" in results[0]["error"]
@@ -0,0 +1,53 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the batch plotting utilities."""
+import numpy as np
+import pytest
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from fault_tolerant_routing_mux import plotter  # noqa: E402
+
+PROBS = np.arange(0, .015, .005)
+
+
+def results(offset):
+    return {f"{a},{b},{c}": offset + a + b + c for a in PROBS for b in PROBS for c in PROBS}
+
+def test_results_to_array():
+    array = plotter.results_to_array(PROBS, results(0.5))
+    assert array.shape == (3, 3, 3)
+    assert array[1, 2, 0] == pytest.approx(0.5 + PROBS[1] + PROBS[2])
+
+def test_results_to_array_integer_probability():
+    probs = [0, 0.5]
+    keyed = {f"{a},{b},{c}": a + b + c for a in probs for b in probs for c in probs}
+    array = plotter.results_to_array(np.array(probs), keyed)
+    assert array[0, 0, 0] == 0
+    assert array[1, 0, 1] == pytest.approx(1.)
+
+def test_plot_all_batch_png(tmp_path):
+    plotter.plot_all_batch(PROBS, results(0.1), plotter.results_to_array(PROBS, results(0.2)),
+                           workers=2, out_pattern=str(tmp_path / "{pUD:.3f}-UD.png"))
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ["0.000-UD.png", "0.005-UD.png", "0.010-UD.png"]
+    assert not plt.get_fignums()
+
+def test_plot_all_batch_pdf(tmp_path):
+    plotter.plot_all_batch(PROBS, results(0.1), results(0.2), pdf=tmp_path / "sweep.pdf")
+    content = (tmp_path / "sweep.pdf").read_bytes()
+    assert content.count(b"/Type /Page") - content.count(b"/Type /Pages") == PROBS.size
+    assert not plt.get_fignums()
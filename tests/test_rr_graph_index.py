@@ -0,0 +1,51 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the indexed rr_graph query layer."""
+import os
+from fault_tolerant_routing_mux.rr_graph_index import RRGraphIndex
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+
+BASE_DIR = "tests/sample_files"
+NODES_FILE = os.path.join(BASE_DIR, "nodes.xml")
+
+def test_arrays():
+    index = RRGraphIndex(NODES_FILE)
+    assert index.node_id.tolist() == list(range(12))
+    assert [index.node_types[t] for t in index.node_type[[0, 1, 2, 5, 8, 10]]] == \
+        ["SOURCE", "OPIN", "CHANX", "CHANY", "IPIN", "SINK"]
+    assert index.xhigh[2] == 2 and index.ptc[3] == 1
+    assert index.edge_src.size == index.edge_sink.size == index.edge_switch.size == 19
+    assert index.switch_names == {0: "__vpr_delayless_switch__", 1: "ipin_cblock", 2: "0"}
+
+def test_mux_dict_matches_parser():
+    for f in ("nodes.xml", "simple.xml", "minimal.xml"):
+        expected = RRGraphParser(os.path.join(BASE_DIR, f)).get_mux_dict()
+        assert RRGraphIndex(os.path.join(BASE_DIR, f)).get_mux_dict() == expected
+
+def test_queries():
+    index = RRGraphIndex(NODES_FILE)
+    assert index.edges_by_switch("ipin_cblock").tolist() == [11, 12, 13, 14, 15, 16]
+    assert index.mux_sinks().tolist() == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert index.mux_sinks("IPIN").tolist() == [8, 9]
+    assert index.mux_sinks("CHANY", bbox=(1, 1, 1, 1)).tolist() == [5, 6]
+    assert index.mux_sinks(bbox=(3, 3, 3, 3)).tolist() == [7, 9]
+    assert index.mux_sizes([8, 4]).tolist() == [4, 3]
+
+def test_breakdowns():
+    index = RRGraphIndex(NODES_FILE)
+    defect_edges = {8: {2, 3}, 9: {4}, 4: {2, 7}}
+    assert index.breakdown_by_type(defect_edges) == {"IPIN": 3, "CHANX": 2}
+    assert index.breakdown_by_type(defect_edges, by="src") == {"CHANX": 4, "CHANY": 1}
+    assert index.breakdown_by_region(defect_edges, tile_size=2).tolist() == [[2, 0], [0, 3]]
@@ -0,0 +1,56 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the parallel sweep scheduler."""
+import json
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.scheduler import (EQUAL, STANDALONE, SweepScheduler,
+                                                  parallel_standalone_sim)
+
+P_ARRAY = [0., 0.02, 0.1]
+
+def sweep(workers, chunk_iters=50, **kwargs):
+    scheduler = SweepScheduler(workers=workers, chunk_iters=chunk_iters, seed=7, **kwargs)
+    scheduler.add_standalone(P_ARRAY, 120, ProtoVoterCell)
+    scheduler.add_equal(P_ARRAY, 120, MemCell)
+    return scheduler, scheduler.run()
+
+def test_units():
+    scheduler, _ = sweep(workers=0)
+    # 3 probabilities x ceil(120 / 50) chunks per sweep
+    assert len(scheduler.units) == 2 * 3 * 3
+    assert sorted(u.num_iters for u in scheduler.units)[:6] == [20] * 6
+
+def test_independent_of_worker_count():
+    _, serial = sweep(workers=0)
+    _, parallel = sweep(workers=3)
+    assert serial == parallel
+    assert set(serial) == {(STANDALONE, "ProtoVoterCell"), (EQUAL, "MemCell")}
+    assert list(serial[EQUAL, "MemCell"]) == ["0.0", "0.02", "0.1"]
+    assert serial[STANDALONE, "ProtoVoterCell"][0.] == (0., 0., 0, 0, 0)
+
+def test_streamed_partial_results(tmp_path):
+    seen = []
+    sweep(workers=2, on_result=lambda unit, stats: seen.append(stats.unusable.total),
+          checkpoint=tmp_path / "partial.json")
+    assert len(seen) == 18
+    assert max(seen) == 120
+    partial = json.loads((tmp_path / "partial.json").read_text())
+    assert partial["standalone:ProtoVoterCell:2"]["unusable"]["total"] == 120
+
+def test_parallel_standalone_sim(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = parallel_standalone_sim(P_ARRAY, 100, MemCell, workers=2, chunk_iters=30)
+    assert list(results) == P_ARRAY
+    assert (tmp_path / "fault_sim.rpt").exists()
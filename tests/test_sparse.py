@@ -0,0 +1,77 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the sparse defect sampler."""
+import os
+import shutil
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.memristor_errors import Errors, RandomErrorGen
+from fault_tolerant_routing_mux.sparse import SparseFaultSimulator, sample_sparse_defects
+from fault_tolerant_routing_mux.stats import SimulationStats
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+def test_sample_sparse_defects():
+    reg = RandomErrorGen(pSA0=0.002, pSA1=0.001, pUD=0.001)
+    indices, errors = sample_sparse_defects(np.random.default_rng(0), reg, 10**7)
+    assert np.all(np.diff(indices) > 0) and indices[-1] < 10**7
+    assert indices.size == pytest.approx(0.004 * 10**7, rel=0.02)
+    counts = np.bincount(errors, minlength=4) / indices.size
+    assert counts == pytest.approx([0, 0.5, 0.25, 0.25], abs=0.01)
+
+def test_sample_sparse_defects_edge_cases():
+    rng = np.random.default_rng(0)
+    assert sample_sparse_defects(rng, RandomErrorGen(), 100)[0].size == 0
+    indices, errors = sample_sparse_defects(rng, RandomErrorGen(pUD=1.), 100)
+    assert indices.tolist() == list(range(100))
+    assert np.all(errors == Errors.UD)
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_stats_match_expected_rates(rr_graph, cell_type):
+    fault_sim = SparseFaultSimulator(cell_type, rr_graph, p=0.05, seed=1)
+    total = SimulationStats()
+    for _ in range(300):
+        fault_sim.run_simulation(delta=True)
+        stats = fault_sim.stats
+        assert stats.unusable.total == fault_sim.num_muxes
+        assert stats.cell_errors.total() == fault_sim.num_cells.sum()
+        assert stats.defects.defect_edges() == fault_sim.defect_edge_count
+        total.merge(stats)
+
+    sizes = [len(mux.src_node_list) for mux in fault_sim.muxes]
+    unusable = np.mean([expected_rates(size, cell_type, p=0.05)[0] for size in sizes])
+    assert total.unusable.rate() == pytest.approx(unusable, abs=0.04)
+    # Muxes are left fault-free between runs
+    assert all(cell.get_cell_error() == Errors.FF
+               for mux in fault_sim.muxes for cell in mux.cell_list)
+
+def test_simulate_hook(rr_graph):
+    fault_sim = SparseFaultSimulator(MemCell, rr_graph, p=0.05, seed=2)
+    stats = fault_sim.simulate()
+    assert stats is fault_sim.stats
+    assert not os.path.exists(fault_sim.faulty_rr_graph_file)
+    # run_simulation is inherited and draws again from the same generator
+    fault_sim = SparseFaultSimulator(MemCell, rr_graph, p=0.05, seed=2)
+    fault_sim.run_simulation()
+    assert fault_sim.stats == stats
+    assert os.path.exists(fault_sim.faulty_rr_graph_file)
@@ -0,0 +1,47 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the chunked standalone simulation."""
+import tracemalloc
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.core import FaultSimulator
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_chunked_matches_monolithic(cell_type):
+    p_array = [0.01, 0.05, 0.1]
+    monolithic = FaultSimulator.standalone_sim(p_array, 1000, cell_type, seed=7)
+    for chunk_size in (1, 64, 999, 1000, 5000):
+        assert FaultSimulator.standalone_sim(p_array, 1000, cell_type, chunk_size=chunk_size,
+                                             seed=7) == monolithic
+
+def test_progress():
+    calls = []
+    FaultSimulator.standalone_sim([0., 0.1], 250, MemCell, chunk_size=100,
+                                  progress=lambda *args: calls.append(args))
+    assert calls == [(0., 100, 250), (0., 200, 250), (0., 250, 250),
+                     (0.1, 100, 250), (0.1, 200, 250), (0.1, 250, 250)]
+
+def test_memory_does_not_grow_with_iterations():
+    peaks = []
+    for num_iters in (500, 2000):
+        tracemalloc.start()
+        FaultSimulator.standalone_sim([0.05], num_iters, MemCell, chunk_size=100, seed=0)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < 1.5 * peaks[0]
@@ -0,0 +1,80 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the statistics accumulators."""
+from fault_tolerant_routing_mux.control_cell import MemCell
+from fault_tolerant_routing_mux.memristor_errors import Errors, RandomErrorGen
+from fault_tolerant_routing_mux.mux import RoutingMux
+from fault_tolerant_routing_mux.stats import (DefectSizeHistogram, ErrorHistogram,
+                                              SimulationStats, UnusableCounter)
+
+
+def simulated_muxes(n, sizes=(12, 7)):
+    reg = RandomErrorGen(pSA0=0.05, pSA1=0.05, pUD=0.05)
+    muxes = []
+    for i in range(n):
+        mux = RoutingMux(i, list(range(sizes[i % len(sizes)])), MemCell)
+        mux.set_errors(reg)
+        mux.compute_block_errors()
+        muxes.append(mux)
+    return muxes
+
+def test_error_histogram():
+    hist = ErrorHistogram()
+    hist.update([Errors.FF, Errors.UD, Errors.UD])
+    hist.update([[Errors.SA0], [Errors.UD]])
+    assert [hist[e] for e in (Errors.FF, Errors.SA0, Errors.SA1, Errors.UD)] == [1, 1, 0, 3]
+    assert hist.total() == 5
+
+def test_unusable_counter():
+    counter = UnusableCounter()
+    counter.update(True)
+    counter.update([False, True, False])
+    assert (counter.unusable, counter.total) == (2, 4)
+    assert counter.rate() == 0.5
+
+def test_defect_size_histogram():
+    hist = DefectSizeHistogram()
+    hist.update([12, 12, 7], [0, 3, 7])
+    hist.add(7, 1)
+    assert hist.counts[12].tolist() == [1, 0, 0, 1] + [0] * 9
+    assert hist.counts[7].tolist() == [0, 1, 0, 0, 0, 0, 0, 1]
+    assert hist.defect_edges() == 11
+    assert hist.edges() == 38
+
+def test_stats_match_mux_results():
+    muxes = simulated_muxes(50)
+    stats = SimulationStats()
+    for mux in muxes:
+        stats.add_mux(mux)
+    cell_errors = [e for mux in muxes for e in mux.get_cell_errors()]
+    defect_edges = sum(len(e) for mux in muxes for e in mux.get_defect_edges().values())
+    assert stats.unusable.unusable == sum(mux.get_mux_unusable() for mux in muxes)
+    assert stats.defects.defect_edges() == defect_edges
+    assert stats.cell_errors[Errors.UD] == cell_errors.count(Errors.UD)
+    assert stats.cell_errors.total() == len(cell_errors)
+
+def test_merge_shards_and_checkpoint(tmp_path):
+    muxes = simulated_muxes(60)
+    whole = SimulationStats()
+    shards = [SimulationStats() for _ in range(3)]
+    for i, mux in enumerate(muxes):
+        whole.add_mux(mux)
+        shards[i % 3].add_mux(mux)
+
+    shards[0].save(tmp_path / "checkpoint.json")
+    merged = SimulationStats.load(tmp_path / "checkpoint.json")
+    merged.merge(shards[1]).merge(shards[2])
+    assert merged == whole
+    assert merged.summary() == whole.summary()
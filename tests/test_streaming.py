@@ -0,0 +1,83 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the two-pass streaming simulation."""
+import os
+import random
+import shutil
+import xml.etree.ElementTree as ET
+from pathlib import Path
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.core import FaultSimulator
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser, RRGraphStreamer
+from fault_tolerant_routing_mux.streaming import StreamingFaultSimulator
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+def test_scan_mux_edges():
+    streamer = RRGraphStreamer(os.path.join(BASE_DIR, "simple.xml"))
+    sinks, srcs = streamer.scan_mux_edges()
+    mux_dict = RRGraphParser(os.path.join(BASE_DIR, "simple.xml")).get_mux_dict()
+    assert list(sinks) == [sink for sink, sources in mux_dict.items() for _ in sources]
+    assert list(srcs) == [src for sources in mux_dict.values() for src in sources]
+    assert streamer.total_num_edges == 25
+
+def test_write_matches_element_tree(tmp_path):
+    streamer = RRGraphStreamer(os.path.join(BASE_DIR, "simple.xml"))
+    streamer.write_rr_graph(tmp_path / "copy.xml", keep_edge=lambda edge: True)
+    ET.parse(os.path.join(BASE_DIR, "simple.xml")).write(tmp_path / "expected.xml")
+    assert (tmp_path / "copy.xml").read_text() == (tmp_path / "expected.xml").read_text()
+
+def test_write_drops_edges(tmp_path):
+    streamer = RRGraphStreamer(os.path.join(BASE_DIR, "simple.xml"))
+    streamer.write_rr_graph(tmp_path / "out.xml",
+                            keep_edge=lambda edge: edge.attrib['sink_node'] != "13")
+    mux_dict = RRGraphParser(tmp_path / "out.xml").get_mux_dict()
+    assert list(mux_dict) == [10]
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_same_defects_as_fault_simulator(rr_graph, cell_type):
+    for seed in range(5):
+        random.seed(seed)
+        fault_sim = FaultSimulator(cell_type, rr_graph, p=0.05)
+        fault_sim.run_simulation()
+        expected = RRGraphParser(fault_sim.get_faulty_rr_graph()).get_mux_dict()
+
+        random.seed(seed)
+        stream_sim = StreamingFaultSimulator(cell_type, rr_graph, p=0.05)
+        stream_sim.run_simulation()
+        mux_dict = RRGraphParser(stream_sim.get_faulty_rr_graph()).get_mux_dict()
+
+        assert stream_sim.defect_edges == fault_sim.defect_edges
+        assert stream_sim.unusable_count == fault_sim.unusable_count
+        assert stream_sim.defect_edge_count == fault_sim.defect_edge_count
+        assert stream_sim.cell_errors_counter == fault_sim.cell_errors_counter
+        assert {k: sorted(v) for k, v in mux_dict.items()} == \
+            {k: sorted(v) for k, v in expected.items()}
+
+def test_simulate_writes_nothing(rr_graph):
+    random.seed(3)
+    expected = FaultSimulator(MemCell, rr_graph, p=0.1).simulate()
+    random.seed(3)
+    stream_sim = StreamingFaultSimulator(MemCell, rr_graph, p=0.1)
+    assert stream_sim.simulate() == expected
+    assert stream_sim.defect_positions.size == stream_sim.defect_edge_count
+    assert not os.path.exists(stream_sim.faulty_rr_graph_file)
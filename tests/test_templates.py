@@ -0,0 +1,109 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the tile-template deduplication of muxes."""
+import os
+import shutil
+import numpy as np
+import pytest
+from fault_tolerant_routing_mux.bitsliced import cell_planes, sample_memristors, unpack_bits
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.edge_scanner import scan_rr_edges
+from fault_tolerant_routing_mux.memristor_errors import RandomErrorGen
+from fault_tolerant_routing_mux.mux import RoutingMux
+from fault_tolerant_routing_mux.rr_graph_parser import RRGraphParser
+from fault_tolerant_routing_mux.stats import SimulationStats
+from fault_tolerant_routing_mux.templates import TemplateFaultSimulator, evaluate_template, \
+    group_mux_edges, group_muxes
+
+BASE_DIR = "tests/sample_files"
+
+@pytest.fixture
+def rr_graph(tmp_path):
+    rr_graph = tmp_path / "simple.xml"
+    shutil.copy(os.path.join(BASE_DIR, "simple.xml"), rr_graph)
+    return rr_graph
+
+def test_group_muxes():
+    mux_dict = {10: [1, 2], 11: [3, 4, 5], 12: [6, 7], 13: [8, 9]}
+    switches = {10: "0", 11: "0", 12: "0", 13: "ipin_cblock"}
+    templates = group_muxes(mux_dict, switches)
+    assert [(t.switch, t.size, len(t)) for t in templates] == \
+        [("0", 2, 2), ("0", 3, 1), ("ipin_cblock", 2, 1)]
+    assert templates[0].sinks.tolist() == [10, 12]
+    assert templates[0].srcs.tolist() == [[1, 2], [6, 7]]
+    assert [len(t) for t in group_muxes(mux_dict)] == [3, 1]
+
+def test_group_parsed_muxes():
+    rrg = RRGraphParser(os.path.join(BASE_DIR, "simple.xml"))
+    templates = group_muxes(rrg.get_mux_dict(), rrg.get_mux_switches())
+    assert sum(len(t) for t in templates) == len(rrg.get_mux_dict())
+    for template in templates:
+        for sink, srcs in zip(template.sinks.tolist(), template.srcs.tolist()):
+            assert rrg.get_mux_dict()[sink] == srcs
+            assert rrg.get_mux_switches()[sink] == template.switch
+
+def test_group_mux_edges():
+    rr_graph = os.path.join(BASE_DIR, "simple.xml")
+    rrg = RRGraphParser(rr_graph)
+    expected = group_muxes(rrg.get_mux_dict(), rrg.get_mux_switches())
+    templates = group_mux_edges(scan_rr_edges(rr_graph, workers=0))
+    assert [(t.switch, t.size) for t in templates] == [(t.switch, t.size) for t in expected]
+    for template, other in zip(templates, expected):
+        assert np.array_equal(template.sinks, other.sinks)
+        assert np.array_equal(template.srcs, other.srcs)
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+@pytest.mark.parametrize("size", [2, 7, 12, 30])
+def test_evaluate_template_matches_routing_mux(cell_type, size):
+    mux_dict = {1000 + i: list(range(i * size, (i + 1) * size)) for i in range(200)}
+    template = group_muxes(mux_dict)[0]
+    reg = RandomErrorGen(pSA0=0.05, pSA1=0.05, pUD=0.02)
+    hi, lo = sample_memristors(np.random.default_rng(size), reg,
+                               template.num_cells * cell_type.num_memristors, len(template))
+    unusable, dead = evaluate_template(template, cell_planes(cell_type, hi, lo), len(template))
+    memristors = (unpack_bits(hi, len(template)) * 2 + unpack_bits(lo, len(template))).T
+    for t, (sink, srcs) in enumerate(mux_dict.items()):
+        mux = RoutingMux(sink, srcs, cell_type)
+        for m, error in enumerate(memristors[t].tolist()):
+            mux.cell_list[m // cell_type.num_memristors].set_memristor(
+                m % cell_type.num_memristors, error)
+        mux.compute_block_errors()
+        assert unusable[t] == mux.get_mux_unusable()
+        assert set(template.srcs[t][dead[t]].tolist()) == mux.get_defect_edges().get(sink, set())
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+def test_stats_match_expected_rates(rr_graph, cell_type):
+    fault_sim = TemplateFaultSimulator(cell_type, rr_graph, p=0.05, seed=1, batch_muxes=3)
+    total = SimulationStats()
+    for _ in range(300):
+        fault_sim.run_simulation(delta=True)
+        stats = fault_sim.stats
+        assert stats.unusable.total == fault_sim.num_muxes
+        assert stats.cell_errors.total() == sum(t.num_cells * len(t) for t in fault_sim.templates)
+        assert stats.defects.defect_edges() == fault_sim.defect_edge_count
+        total.merge(stats)
+    sizes = [t.size for t in fault_sim.templates for _ in range(len(t))]
+    unusable = np.mean([expected_rates(size, cell_type, p=0.05)[0] for size in sizes])
+    assert total.unusable.rate() == pytest.approx(unusable, abs=0.04)
+
+def test_faulty_rr_graph(rr_graph):
+    fault_sim = TemplateFaultSimulator(MemCell, rr_graph, p=0.2, seed=3)
+    fault_sim.run_simulation()
+    faulty = RRGraphParser(fault_sim.get_faulty_rr_graph())
+    assert faulty.get_total_num_edges() == \
+        fault_sim.total_edge_count - fault_sim.defect_edge_count
+    for sink, srcs in fault_sim.defect_edges.items():
+        assert not srcs & set(faulty.get_mux_dict().get(sink, []))
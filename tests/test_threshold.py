@@ -0,0 +1,69 @@
+# Copyright 2022 Lucas Gaia de Castro
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+"""Test suite for the maximum tolerable defect probability solver."""
+import pytest
+from fault_tolerant_routing_mux.control_cell import MemCell, ProtoVoterCell
+from fault_tolerant_routing_mux.distribution import expected_rates
+from fault_tolerant_routing_mux.threshold import EXACT, MAX_PROBABILITY, NOISY, exact_rate, \
+    max_tolerable_probability
+
+def test_exact_rate():
+    assert exact_rate(.01, MemCell, "unusable", 12) == expected_rates(12, MemCell, p=.01)[0]
+    u6, d6 = expected_rates(6, MemCell, p=.01)
+    u12, d12 = expected_rates(12, MemCell, p=.01)
+    assert exact_rate(.01, MemCell, "unusable", {6: 3, 12: 1}) == pytest.approx((3 * u6 + u12) / 4)
+    assert exact_rate(.01, MemCell, "defects", {6: 2, 12: 1}) == \
+        pytest.approx((12 * d6 + 12 * d12) / 24)
+
+@pytest.mark.parametrize("cell_type", [MemCell, ProtoVoterCell])
+@pytest.mark.parametrize("metric, target", [("unusable", .01), ("defects", .05),
+                                            ("unusable", .2)])
+
+def test_exact_threshold(cell_type, metric, target):
+    threshold = max_tolerable_probability(target, cell_type, metric, tolerance=1e-6)
+    assert threshold.method == EXACT and threshold.evaluations <= 20
+    assert threshold.low <= threshold.p <= threshold.high
+    assert threshold.high - threshold.low <= 1e-6
+    assert exact_rate(threshold.low, cell_type, metric) <= target
+    assert exact_rate(threshold.high, cell_type, metric) >= target
+
+def test_protovoter_tolerates_more_than_memcell():
+    assert max_tolerable_probability(.01, ProtoVoterCell).p > \
+        10 * max_tolerable_probability(.01, MemCell).p
+
+def test_unreachable_target():
+    threshold = max_tolerable_probability(.9999999, MemCell, "unusable")
+    assert threshold.p == MAX_PROBABILITY
+
+def test_noisy_threshold_brackets_exact():
+    exact = max_tolerable_probability(.02, ProtoVoterCell)
+    noisy = max_tolerable_probability(.02, ProtoVoterCell, method=NOISY, tolerance=5e-4,
+                                      num_trials=20000, seed=0)
+    assert noisy.method == NOISY
+    assert noisy.low - 5e-4 <= exact.p <= noisy.high + 5e-4
+
+def test_noisy_stops_when_unresolvable():
+    noisy = max_tolerable_probability(.05, MemCell, "defects", method=NOISY, tolerance=1e-9,
+                                      num_trials=2000, max_trials=8000, seed=1)
+    assert noisy.high - noisy.low > 1e-9
+    assert noisy.low <= noisy.p <= noisy.high
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        max_tolerable_probability(.01, MemCell, "latency")
+    with pytest.raises(ValueError):
+        max_tolerable_probability(0, MemCell)
+    with pytest.raises(ValueError):
+        max_tolerable_probability(.01, MemCell, method="brute")